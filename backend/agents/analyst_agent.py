@@ -1,22 +1,269 @@
-import google.generativeai as genai
+import asyncio
 import json
 import logging
-from typing import Dict, Any
+import os
+from typing import Dict, Any, List
+from .clients import get_model
+from .execution import run_cpu
+from .metrics import RETRIES, record_llm_response
+from .model_scheduler import ANALYST_PRIORITY, get_model_scheduler
+from .research_packer import estimate_tokens, pack_chapter_research
 
 logger = logging.getLogger(__name__)
 
+# "chapters": short outline call, then chapters written concurrently and retried one by one.
+# "single": the whole book in one call.
+ANALYST_MODE = os.getenv("EBOOK_ANALYST_MODE", "chapters")
+MAX_CONCURRENT_CHAPTERS = int(os.getenv("EBOOK_MAX_CONCURRENT_CHAPTERS", "4"))
+CHAPTER_ATTEMPTS = 2
+MIN_SECTIONS = 4
+
+class SectionStreamParser:
+    """Pull complete section objects out of a book JSON document as it streams in.
+
+    Tracks string/escape state and bracket depth so each element of the top-level
+    "sections" array can be handed off the moment its closing brace arrives.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None  # last string seen directly inside the top-level object
+        self._sections_depth = None  # depth of the objects inside the sections array
+        self._start = None
+        self._finished = False
+
+    def feed(self, text: str) -> List[dict]:
+        self._buffer += text
+        sections = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer) and not self._finished:
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = buffer[self._string_start + 1:i]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                if char == "[" and self._depth == 1 and self._last_key == "sections" and self._sections_depth is None:
+                    self._sections_depth = self._depth + 1
+                elif char == "{" and self._depth == self._sections_depth:
+                    self._start = i
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._sections_depth is not None:
+                    if char == "}" and self._depth == self._sections_depth and self._start is not None:
+                        try:
+                            sections.append(json.loads(buffer[self._start:i + 1]))
+                        except json.JSONDecodeError:
+                            pass
+                        self._start = None
+                    elif char == "]" and self._depth == self._sections_depth - 1:
+                        self._finished = True
+            i += 1
+        self._pos = i
+        return sections
+
+
+def _chunk_text(chunk) -> str:
+    # Chunks without text parts (e.g. the final finish-reason chunk) raise on .text
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
 class AnalystAgent:
-    def __init__(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, api_key: str, scheduler=None):
+        self.model = get_model(api_key)
+        self.scheduler = scheduler or get_model_scheduler()
 
-    async def analyze_and_structure(self, topic: str, raw_data: str) -> Dict[str, Any]:
+    async def analyze_and_structure(self, topic: str, raw_data: str, reporter=None, on_section=None) -> Dict[str, Any]:
+        """Write the book. ``on_section`` is called with each section as soon as it is
+        available, before the whole book is done, so later stages can start early."""
         logger.info(f"Analyzing topic '{topic}' and structuring ebook based on research data...")
-        
+        if ANALYST_MODE == "single":
+            return await self._analyze_single(topic, raw_data, on_section)
+        return await self._analyze_by_chapter(topic, raw_data, reporter, on_section)
+
+    async def _analyze_by_chapter(self, topic: str, raw_data: str, reporter=None, on_section=None) -> Dict[str, Any]:
+        outline = await self._generate_outline(topic, raw_data)
+        planned = outline["sections"]
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHAPTERS)
+        chapters = await asyncio.gather(
+            *(self._write_chapter(topic, raw_data, planned, index, semaphore, reporter, on_section)
+              for index in range(len(planned)))
+        )
+
+        # A chapter that failed all its attempts is dropped rather than failing the whole book
+        sections = [chapter for chapter in chapters if chapter is not None]
+        if len(sections) < MIN_SECTIONS:
+            raise Exception(f"Failed to generate content for '{topic}': only {len(sections)} chapters succeeded.")
+
+        logger.info(f"Chapters for '{topic}':")
+        for i, section in enumerate(sections):
+            logger.info(f"  {i+1}. {section['title']}")
+
+        return {
+            "title": outline.get("title") or f"Understanding {topic}",
+            "author": outline.get("author") or "AI Research Author",
+            "sections": sections,
+        }
+
+    async def rewrite_chapter(self, topic: str, raw_data: str, sections: List[dict], index: int, reporter=None) -> dict:
+        """Write a new draft of ``sections[index]``, keeping the book's other chapters as they are"""
+        planned = [{"title": s.get("title", ""), "summary": s.get("summary", "")} for s in sections]
+        logger.info(f"Rewriting chapter {index + 1} '{planned[index]['title']}' of '{topic}'")
+        section = await self._write_chapter(topic, raw_data, planned, index, asyncio.Semaphore(1), reporter)
+        if section is None:
+            raise Exception(f"Failed to rewrite chapter '{planned[index]['title']}' for '{topic}'.")
+        return section
+
+    async def _generate_outline(self, topic: str, raw_data: str) -> Dict[str, Any]:
+        prompt = f"""
+You are an expert researcher and author. Plan a comprehensive, topic-specific book about "{topic}" using the research data provided.
+
+TOPIC: {topic}
+
+RESEARCH DATA:
+{raw_data}
+
+INSTRUCTIONS:
+- Base chapter titles on ACTUAL concepts, processes and terminology from "{topic}" found in the research
+- DO NOT use generic names like "Introduction", "Basics", "Advanced"
+- Each chapter = one specific concept/process from "{topic}"
+- 6-8 chapters total, ordered so each builds on the previous ones
+- For each chapter give a 1-2 sentence summary of what it will explain
+
+OUTPUT (JSON):
+{{
+    "title": "Understanding {topic}",
+    "author": "AI Research Author",
+    "sections": [
+        {{"title": "[Specific concept from {topic}]", "summary": "[What this chapter covers]"}},
+        ... (6-8 sections total)
+    ]
+}}
+"""
+        for attempt in range(2):
+            try:
+                logger.info(f"Outline attempt {attempt + 1}/2 for topic '{topic}'")
+                if attempt:
+                    RETRIES.inc(step="outline")
+                response = await self.scheduler.generate(
+                    self.model,
+                    prompt,
+                    priority=ANALYST_PRIORITY,
+                    generation_config={
+                        "response_mime_type": "application/json",
+                        "temperature": 0.5,
+                        "max_output_tokens": 1024
+                    }
+                )
+                record_llm_response("analyst", response)
+                outline = json.loads(response.text)
+                planned = [s for s in outline.get("sections", []) if s.get("title")]
+                if len(planned) < MIN_SECTIONS:
+                    logger.warning(f"Outline for '{topic}' has only {len(planned)} chapters. Retrying...")
+                    continue
+                outline["sections"] = planned
+                logger.info(f"Outline for '{topic}' has {len(planned)} chapters")
+                return outline
+            except json.JSONDecodeError as e:
+                logger.error(f"Outline JSON parsing failed on attempt {attempt + 1} for '{topic}': {e}")
+            except Exception as e:
+                logger.error(f"Outline error on attempt {attempt + 1} for '{topic}': {e}")
+
+        raise Exception(f"Failed to generate an outline for '{topic}' after 2 attempts.")
+
+    async def _write_chapter(self, topic: str, raw_data: str, planned: List[dict], index: int,
+                             semaphore: asyncio.Semaphore, reporter=None, on_section=None):
+        """Write one chapter from the outline, retrying only this chapter on bad output"""
+        chapter = planned[index]
+        title = chapter["title"]
+        other_titles = "\n".join(f"- {s['title']}" for i, s in enumerate(planned) if i != index)
+        # Only the research relevant to this chapter: the outline call already saw all of it
+        research = await run_cpu(pack_chapter_research, raw_data, f"{topic} {title} {chapter.get('summary', '')}")
+        prompt = f"""
+You are an expert researcher and author writing one chapter of a book about "{topic}".
+
+CHAPTER TITLE: {title}
+CHAPTER SUMMARY: {chapter.get("summary", "")}
+
+OTHER CHAPTERS (do not repeat their material):
+{other_titles}
+
+RESEARCH FOR THIS CHAPTER:
+{research}
+
+INSTRUCTIONS:
+- 300-500 words of Markdown, specific to "{title}" within "{topic}"
+- Use specific information and terminology from the research
+- Include real examples and explain processes clearly
+- Add [IMAGE: specific description] only where a diagram truly helps
+- Keep JSON valid (escape quotes properly)
+
+OUTPUT (JSON):
+{{"content": "[300-500 words about {title}]"}}
+"""
+        async with semaphore:
+            for attempt in range(CHAPTER_ATTEMPTS):
+                if attempt:
+                    RETRIES.inc(step="chapter")
+                try:
+                    response = await self.scheduler.generate(
+                        self.model,
+                        prompt,
+                        priority=ANALYST_PRIORITY,
+                        generation_config={
+                            "response_mime_type": "application/json",
+                            "temperature": 0.6,
+                            "max_output_tokens": 2048
+                        }
+                    )
+                    record_llm_response("analyst", response)
+                    content = json.loads(response.text).get("content", "")
+                    if 'This guide covers' in content or len(content) < 150:
+                        logger.warning(f"Chapter '{title}' looks generic or short (attempt {attempt + 1}). Retrying...")
+                        continue
+                    if reporter:
+                        reporter.emit("chapter", "finished", index=index, title=title, attempts=attempt + 1)
+                    # The summary stays with the chapter so it can be rewritten on its own later
+                    section = {"title": title, "summary": chapter.get("summary", ""), "content": content}
+                    if on_section:
+                        on_section(section)
+                    return section
+                except json.JSONDecodeError as e:
+                    logger.error(f"Chapter '{title}' JSON parsing failed on attempt {attempt + 1}: {e}")
+                except Exception as e:
+                    logger.error(f"Chapter '{title}' failed on attempt {attempt + 1}: {e}")
+
+        logger.error(f"Giving up on chapter '{title}' after {CHAPTER_ATTEMPTS} attempts")
+        if reporter:
+            reporter.emit("chapter", "failed", index=index, title=title)
+        return None
+
+    async def _analyze_single(self, topic: str, raw_data: str, on_section=None) -> Dict[str, Any]:
         # Try up to 2 times (reduced from 3 for speed)
         for attempt in range(2):
             try:
                 logger.info(f"Attempt {attempt + 1}/2 for topic '{topic}'")
+                if attempt:
+                    RETRIES.inc(step="analysis")
                 
                 prompt = f"""
 You are an expert researcher and author. Analyze the topic "{topic}" using the research data provided and create a comprehensive, topic-specific book.
@@ -24,7 +271,7 @@ You are an expert researcher and author. Analyze the topic "{topic}" using the r
 TOPIC: {topic}
 
 RESEARCH DATA:
-{raw_data[:30000]}
+{raw_data}
 
 INSTRUCTIONS:
 
@@ -76,17 +323,36 @@ OUTPUT (JSON):
 CRITICAL: Use ONLY information and terminology from "{topic}". Make it specific, not generic.
 """
                 
-                response = self.model.generate_content(
-                    prompt, 
-                    generation_config={
-                        "response_mime_type": "application/json",
-                        "temperature": 0.6,
-                        "max_output_tokens": 6144  # Reduced for faster generation
-                    }
+                generation_config = {
+                    "response_mime_type": "application/json",
+                    "temperature": 0.6,
+                    "max_output_tokens": 6144  # Reduced for faster generation
+                }
+
+                async def stream_book():
+                    response = await self.model.generate_content_async(
+                        prompt, generation_config=generation_config, stream=True
+                    )
+                    # Hand each section downstream as soon as it is complete in the stream
+                    parser = SectionStreamParser()
+                    text = ""
+                    async for chunk in response:
+                        piece = _chunk_text(chunk)
+                        text += piece
+                        for section in parser.feed(piece):
+                            if on_section:
+                                on_section(section)
+                    return response, text
+
+                # The slot is held until the stream is fully consumed
+                response, text = await self.scheduler.run(
+                    stream_book, ANALYST_PRIORITY,
+                    estimate_tokens(prompt) + generation_config["max_output_tokens"],
                 )
+                record_llm_response("analyst", response, text)
                 
                 # Try to parse JSON
-                result = json.loads(response.text)
+                result = json.loads(text)
                 
                 # Validate the result
                 sections = result.get('sections', [])
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+from .metrics import ARTIFACT_EVICTIONS
+from .singleflight import normalize_topic
+from .verifier_agent import inspect_pdf
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DB_PATH = os.getenv("EBOOK_ARTIFACT_DB_PATH", "backend/data/artifacts.sqlite3")
+ARTIFACT_MAX_BYTES = int(os.getenv("EBOOK_ARTIFACT_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+PDF = "pdf"
+PREVIEW = "preview"
+MEDIA_TYPES = {PDF: "application/pdf", PREVIEW: "text/html; charset=utf-8"}
+
+# "<Topic>_<8 hex>.pdf" as written by PDFAgent
+GENERATED_NAME = re.compile(r"^(.*)_[0-9a-f]{8}$")
+
+
+def artifact_version(artifact: dict) -> str:
+    return artifact["sha256"][:16]
+
+
+def download_url(artifact: dict) -> str:
+    """Download link that changes whenever the file's content does, so it can be cached for good"""
+    return f"/api/artifacts/{artifact['id']}/download?v={artifact_version(artifact)}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """SQLite index of generated books and previews with a disk quota.
+
+    Each artifact records its topic, SHA-256 (served as its ETag), size, page
+    count and creation and last-access times. When the indexed files outgrow
+    ``max_bytes``, the least recently accessed ones are deleted. A book can also
+    keep its source (title and chapters) so single chapters can be rebuilt later.
+    """
+
+    def __init__(self, path: str = ARTIFACT_DB_PATH, max_bytes: int = ARTIFACT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                topic_key TEXT NOT NULL,
+                path TEXT NOT NULL UNIQUE,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                pages INTEGER,
+                job_id TEXT,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS artifacts_topic ON artifacts (topic_key, created_at);
+            CREATE INDEX IF NOT EXISTS artifacts_lru ON artifacts (last_accessed);
+            CREATE TABLE IF NOT EXISTS sources (
+                artifact_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def _to_dict(self, row) -> dict:
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "topic": row["topic"],
+            "path": row["path"],
+            "filename": os.path.basename(row["path"]),
+            "sha256": row["sha256"],
+            "size": row["size"],
+            "pages": row["pages"],
+            "job_id": row["job_id"],
+            "created_at": row["created_at"],
+            "last_accessed": row["last_accessed"],
+        }
+
+    def add(self, path: str, topic: str, kind: str = PDF, job_id: str = None, pages: int = None) -> dict:
+        """Index a finished file (re-indexing it if it was rewritten in place) and enforce the quota.
+
+        Reads the whole file to hash it, so call it off the event loop. The page count
+        of a PDF is read from its page tree unless the caller already knows it.
+        """
+        sha256 = file_sha256(path)
+        if kind == PDF and pages is None:
+            pages = inspect_pdf(path)["pages"]
+        size = os.path.getsize(path)
+        now = time.time()
+        with self._lock:
+            # A file rewritten in place keeps its id and creation time; only its content fields change
+            self._conn.execute(
+                "INSERT INTO artifacts "
+                "(id, kind, topic, topic_key, path, sha256, size, pages, job_id, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET sha256 = excluded.sha256, size = excluded.size, "
+                "pages = excluded.pages, last_accessed = excluded.last_accessed",
+                (uuid.uuid4().hex, kind, topic, normalize_topic(topic), path, sha256, size, pages, job_id, now, now),
+            )
+            artifact_id = self._conn.execute("SELECT id FROM artifacts WHERE path = ?", (path,)).fetchone()["id"]
+            self._conn.commit()
+            self._evict(keep=artifact_id)
+        return self.get(artifact_id)
+
+    def get(self, artifact_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def touch(self, artifact_id: str):
+        """Record a download so the artifact moves to the back of the eviction order"""
+        with self._lock:
+            self._conn.execute("UPDATE artifacts SET last_accessed = ? WHERE id = ?", (time.time(), artifact_id))
+            self._conn.commit()
+
+    def find(self, topic: str, kind: str = PDF, limit: int = 20) -> list:
+        """Artifacts generated for ``topic`` (case and whitespace insensitive), newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM artifacts WHERE topic_key = ? AND kind = ? ORDER BY created_at DESC LIMIT ?",
+                (normalize_topic(topic), kind, limit),
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def save_source(self, artifact_id: str, source: dict):
+        """Keep the structured book an artifact was rendered from"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (artifact_id, data) VALUES (?, ?)", (artifact_id, json.dumps(source))
+            )
+            self._conn.commit()
+
+    def load_source(self, artifact_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sources WHERE artifact_id = ?", (artifact_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def remove(self, artifact_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+            if row is not None:
+                self._delete(artifact_id, row["path"])
+                self._conn.commit()
+
+    def _delete(self, artifact_id: str, path: str):
+        self._conn.execute("DELETE FROM artifacts WHERE id = ?", (artifact_id,))
+        self._conn.execute("DELETE FROM sources WHERE artifact_id = ?", (artifact_id,))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete artifact file {path}: {e}")
+
+    def _evict(self, keep: str = None):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT id, path, size FROM artifacts ORDER BY last_accessed").fetchall()
+        for row in rows:
+            if total <= self.max_bytes:
+                break
+            if row["id"] == keep:
+                continue
+            logger.info(f"Evicting artifact {row['path']} ({row['size']} bytes) to stay under the quota")
+            self._delete(row["id"], row["path"])
+            total -= row["size"]
+            self.evictions += 1
+            ARTIFACT_EVICTIONS.inc()
+        self._conn.commit()
+
+    def reconcile(self, directories: dict):
+        """Drop index rows whose files are gone and index files written before the store existed.
+
+        ``directories`` maps a directory to the artifact kind of its files.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT id, path FROM artifacts").fetchall()
+            missing = [row["id"] for row in rows if not os.path.exists(row["path"])]
+            self._conn.executemany("DELETE FROM artifacts WHERE id = ?", [(i,) for i in missing])
+            self._conn.executemany("DELETE FROM sources WHERE artifact_id = ?", [(i,) for i in missing])
+            self._conn.commit()
+            known = {row["path"] for row in rows}
+        adopted = 0
+        for directory, kind in directories.items():
+            if not os.path.isdir(directory):
+                continue
+            extension = ".pdf" if kind == PDF else ".html"
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if not name.endswith(extension) or path in known:
+                    continue
+                stem = name[:-len(extension)]
+                match = GENERATED_NAME.match(stem)
+                topic = (match.group(1) if match else stem).replace("_", " ")
+                try:
+                    self.add(path, topic, kind)
+                    adopted += 1
+                except OSError as e:
+                    logger.warning(f"Could not index {path}: {e}")
+        if missing or adopted:
+            logger.info(f"Artifact index: dropped {len(missing)} missing files, indexed {adopted} existing ones")
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM artifacts GROUP BY kind"
+            ).fetchall()
+        return {
+            "entries": {row[0]: row[1] for row in rows},
+            "bytes": sum(row[2] for row in rows),
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Process-wide index of generated books"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+        return _default_store
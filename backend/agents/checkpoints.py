@@ -0,0 +1,66 @@
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.getenv("EBOOK_CHECKPOINT_DIR", "backend/data/checkpoints")
+CHECKPOINT_MAX_AGE = float(os.getenv("EBOOK_CHECKPOINT_MAX_AGE", str(7 * 24 * 3600)))
+
+# Workflow stages whose output is persisted, in pipeline order
+STAGES = ("research", "book", "book_with_images", "html")
+
+
+class CheckpointStore:
+    """Per-job JSON snapshots of each stage's output so retries and restarts resume."""
+
+    def __init__(self, directory: str = CHECKPOINT_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, job_id: str, stage: str) -> str:
+        return os.path.join(self.directory, job_id, f"{stage}.json")
+
+    def load(self, job_id: str, stage: str) -> Optional[Any]:
+        try:
+            with open(self._path(job_id, stage), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {stage} for job {job_id}: {e}")
+            return None
+
+    def save(self, job_id: str, stage: str, value: Any):
+        path = self._path(job_id, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    def discard(self, job_id: str, *stages: str):
+        for stage in stages:
+            try:
+                os.remove(self._path(job_id, stage))
+            except FileNotFoundError:
+                pass
+
+    def clear(self, job_id: str):
+        shutil.rmtree(os.path.join(self.directory, job_id), ignore_errors=True)
+
+    def prune(self, max_age: float = CHECKPOINT_MAX_AGE) -> int:
+        """Remove checkpoints of jobs untouched for longer than ``max_age`` seconds"""
+        cutoff = time.time() - max_age
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} stale checkpoint directories")
+        return removed
@@ -0,0 +1,49 @@
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.5-flash"
+
+# Modules that dominate cold start; imported on first use or by warm_up()
+HEAVY_MODULES = ("google.generativeai", "bs4", "duckduckgo_search")
+
+_models = {}  # (api key, model name) -> GenerativeModel
+_configured_key = None
+_lock = threading.Lock()
+
+
+def get_model(api_key: str, name: str = MODEL_NAME):
+    """Process-wide Gemini model client, configured once per API key"""
+    global _configured_key
+    with _lock:
+        model = _models.get((api_key, name))
+        if model is None:
+            import google.generativeai as genai
+            if _configured_key != api_key:
+                genai.configure(api_key=api_key)
+                _configured_key = api_key
+            model = genai.GenerativeModel(name)
+            _models[(api_key, name)] = model
+        return model
+
+
+def warm_up() -> float:
+    """Import the heavy client libraries now (e.g. from a background thread) and return the seconds spent"""
+    start = time.monotonic()
+    for module in HEAVY_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"Warm-up could not import {module}: {e}")
+    elapsed = time.monotonic() - start
+    logger.info(f"Warmed up client libraries in {elapsed:.2f}s")
+    return elapsed
+
+
+def start_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="ebook-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StageReporter:
+    """Structured progress events for one generation.
+
+    Events are plain dicts (``seq``, ``stage``, ``event``, ``time``, ``elapsed`` plus
+    stage-specific fields) kept in order so late subscribers can replay them.
+    Emit only from the event loop thread.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self._started = time.monotonic()
+        self._listeners = []
+        self._waiters = set()
+
+    def emit(self, stage: str, event: str, **data) -> dict:
+        record = {
+            "seq": len(self.events),
+            "stage": stage,
+            "event": event,
+            "time": time.time(),
+            "elapsed": round(time.monotonic() - self._started, 3),
+            **data,
+        }
+        self.events.append(record)
+        for listener in list(self._listeners):
+            try:
+                listener(record)
+            except Exception as e:
+                logger.warning(f"Progress listener failed: {e}")
+        self._wake()
+        return record
+
+    @contextmanager
+    def stage(self, name: str, **data):
+        """Emit started/finished (or failed) events with the stage duration.
+
+        The yielded dict can be filled with extra fields for the finished event.
+        """
+        self.emit(name, "started", **data)
+        start = time.monotonic()
+        info = {}
+        try:
+            yield info
+        except BaseException as e:
+            self.emit(name, "failed", duration=round(time.monotonic() - start, 3), error=str(e) or type(e).__name__)
+            raise
+        self.emit(name, "finished", duration=round(time.monotonic() - start, 3), **info)
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def follow(self, other: "StageReporter"):
+        """Mirror another reporter's pipeline events (used when joining an in-flight run).
+
+        Job lifecycle events are not mirrored; each job reports its own.
+        """
+        def forward(record):
+            if record["stage"] == "job":
+                return
+            extra = {k: v for k, v in record.items() if k not in ("seq", "stage", "event", "time", "elapsed")}
+            self.emit(record["stage"], record["event"], **extra)
+
+        for record in other.events:
+            forward(record)
+        other.subscribe(forward)
+
+    def close(self, status: str, **data):
+        if self.closed:
+            return
+        self.emit("job", status, **data)
+        self.closed = True
+        self._listeners.clear()
+        self._wake()
+
+    def _wake(self):
+        for waiter in self._waiters:
+            waiter.set()
+
+    async def wait_for_events(self, index: int, timeout: float) -> list:
+        """Return events from ``index`` on, waiting up to ``timeout`` seconds for new ones"""
+        if index < len(self.events) or self.closed:
+            return self.events[index:]
+        waiter = asyncio.Event()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+        return self.events[index:]
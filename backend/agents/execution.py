@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# CPU-bound stages (HTML parsing, Markdown, PDF rendering) share a small pool so
+# a burst of generations cannot starve the event loop or oversubscribe the host.
+CPU_WORKERS = int(os.getenv("EBOOK_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Blocking network clients that have no async API (e.g. DDGS) get their own pool
+# so slow searches never queue behind renders.
+IO_WORKERS = int(os.getenv("EBOOK_IO_WORKERS", "16"))
+
+_cpu_executor = None
+_io_executor = None
+
+
+def _get_cpu_executor() -> ThreadPoolExecutor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        logger.info(f"Starting CPU executor with {CPU_WORKERS} workers")
+        _cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="ebook-cpu")
+    return _cpu_executor
+
+
+def _get_io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+    if _io_executor is None:
+        logger.info(f"Starting blocking I/O executor with {IO_WORKERS} workers")
+        _io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="ebook-io")
+    return _io_executor
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run a CPU-bound callable on the bounded CPU pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_cpu_executor(), partial(func, *args, **kwargs))
+
+
+async def run_blocking_io(func, *args, **kwargs):
+    """Run a blocking network call that has no async client, or a blocking disk or SQLite call, on the I/O pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_executor(), partial(func, *args, **kwargs))
+
+
+def shutdown_executors():
+    global _cpu_executor, _io_executor
+    for executor in (_cpu_executor, _io_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _cpu_executor = None
+    _io_executor = None
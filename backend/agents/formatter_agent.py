@@ -1,143 +1,211 @@
 import markdown
 import logging
-import base64
+import threading
+from string import Template
+from .fragment_cache import content_digest, get_chapter_cache
 
 logger = logging.getLogger(__name__)
 
+# Book stylesheet. The PDF renderer parses it once per worker process and applies
+# it to every document, so it is not inlined into the HTML by default.
+BOOK_CSS = """
+@page {
+    size: A4;
+    margin: 2cm;
+}
+body {
+    font-family: 'Helvetica', 'Arial', sans-serif;
+    line-height: 1.6;
+    color: #333;
+    font-size: 11pt;
+}
+h1, h2, h3 {
+    color: #2c3e50;
+    page-break-after: avoid;
+}
+h1 {
+    font-size: 24pt;
+    margin-bottom: 1rem;
+}
+h2 {
+    font-size: 18pt;
+    margin-top: 2rem;
+    margin-bottom: 1rem;
+}
+h3 {
+    font-size: 14pt;
+    margin-top: 1.5rem;
+    margin-bottom: 0.75rem;
+}
+.title-page {
+    text-align: center;
+    padding-top: 5cm;
+    page-break-after: always;
+}
+.chapter {
+    page-break-before: always;
+}
+.image-container {
+    margin: 2rem auto;
+    text-align: center;
+    page-break-inside: avoid;
+}
+.image-container svg {
+    max-width: 100%;
+    height: auto;
+    display: inline-block;
+    border: 1px solid #ddd;
+    border-radius: 4px;
+    padding: 10px;
+    background: white;
+}
+.caption {
+    text-align: center;
+    font-style: italic;
+    font-size: 9pt;
+    color: #666;
+    margin-top: 0.5rem;
+}
+pre {
+    background-color: #f4f4f4;
+    padding: 1rem;
+    border-radius: 5px;
+    overflow-x: auto;
+    font-size: 9pt;
+    page-break-inside: avoid;
+}
+code {
+    background-color: #f4f4f4;
+    padding: 0.2rem 0.4rem;
+    border-radius: 3px;
+    font-family: 'Courier New', monospace;
+    font-size: 9pt;
+}
+p {
+    margin-bottom: 0.75rem;
+    text-align: justify;
+}
+ul, ol {
+    margin-bottom: 1rem;
+    margin-left: 2rem;
+}
+li {
+    margin-bottom: 0.5rem;
+}
+"""
+
+# Added to the stylesheet when the HTML is read in a browser rather than paginated
+PREVIEW_CSS = """
+@media screen {
+    body {
+        max-width: 48rem;
+        margin: 2rem auto;
+        padding: 0 1rem;
+    }
+    .title-page {
+        padding-top: 2rem;
+    }
+}
+"""
+
+DOCUMENT_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>$title</title>$style
+</head>
+<body>
+    <div class="title-page">
+        <h1 style="font-size: 3rem; margin-bottom: 1rem;">$title</h1>
+        <p style="font-size: 1.5rem;">By $author</p>
+    </div>
+$chapters
+</body>
+</html>
+""")
+
+# Separates chapters in the document so the renderer can lay each one out (and reuse it) on its own
+CHAPTER_MARKER = "<!-- ebook:chapter -->"
+
+CHAPTER_TEMPLATE = Template("""
+    <!-- ebook:chapter -->
+    <div class="chapter">
+        <h2>$title</h2>
+        <div class="content">
+            $body
+        </div>
+    </div>
+""")
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'nl2br']
+
+# Markdown converters are stateful, so each formatting thread keeps its own and resets it
+_converters = threading.local()
+
+
+def _get_converter() -> markdown.Markdown:
+    converter = getattr(_converters, "markdown", None)
+    if converter is None:
+        converter = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        _converters.markdown = converter
+    return converter
+
+
+def split_document(html_content: str) -> list:
+    """Split ``format_to_html`` output into stand-alone documents: the title page, then one per chapter.
+
+    Every chapter starts on a new page, so laying the parts out separately and
+    concatenating their pages gives the same book. Documents without chapter
+    markers come back whole.
+    """
+    head, separator, rest = html_content.partition("<body>")
+    if not separator or CHAPTER_MARKER not in rest:
+        return [html_content]
+    body = rest.rpartition("</body>")[0]
+    return [f"{head}<body>{part}</body>\n</html>\n" for part in body.split(CHAPTER_MARKER)]
+
+
 class FormatterAgent:
-    def __init__(self):
-        pass
+    def __init__(self, chapter_cache=None):
+        self.chapter_cache = chapter_cache or get_chapter_cache()
 
-    def format_to_html(self, book_data: dict) -> str:
+    def format_to_html(self, book_data: dict, inline_css: bool = False) -> str:
         logger.info("Formatting book to HTML...")
         
         title = book_data.get("title", "Untitled Book")
         author = book_data.get("author", "AI Author")
         sections = book_data.get("sections", [])
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>{title}</title>
-            <style>
-                @page {{
-                    size: A4;
-                    margin: 2cm;
-                }}
-                body {{
-                    font-family: 'Helvetica', 'Arial', sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    font-size: 11pt;
-                }}
-                h1, h2, h3 {{
-                    color: #2c3e50;
-                    page-break-after: avoid;
-                }}
-                h1 {{
-                    font-size: 24pt;
-                    margin-bottom: 1rem;
-                }}
-                h2 {{
-                    font-size: 18pt;
-                    margin-top: 2rem;
-                    margin-bottom: 1rem;
-                }}
-                h3 {{
-                    font-size: 14pt;
-                    margin-top: 1.5rem;
-                    margin-bottom: 0.75rem;
-                }}
-                .title-page {{
-                    text-align: center;
-                    padding-top: 5cm;
-                    page-break-after: always;
-                }}
-                .chapter {{
-                    page-break-before: always;
-                }}
-                .image-container {{
-                    margin: 2rem auto;
-                    text-align: center;
-                    page-break-inside: avoid;
-                }}
-                .image-container svg {{
-                    max-width: 100%;
-                    height: auto;
-                    display: inline-block;
-                    border: 1px solid #ddd;
-                    border-radius: 4px;
-                    padding: 10px;
-                    background: white;
-                }}
-                .caption {{
-                    text-align: center;
-                    font-style: italic;
-                    font-size: 9pt;
-                    color: #666;
-                    margin-top: 0.5rem;
-                }}
-                pre {{
-                    background-color: #f4f4f4;
-                    padding: 1rem;
-                    border-radius: 5px;
-                    overflow-x: auto;
-                    font-size: 9pt;
-                    page-break-inside: avoid;
-                }}
-                code {{
-                    background-color: #f4f4f4;
-                    padding: 0.2rem 0.4rem;
-                    border-radius: 3px;
-                    font-family: 'Courier New', monospace;
-                    font-size: 9pt;
-                }}
-                p {{
-                    margin-bottom: 0.75rem;
-                    text-align: justify;
-                }}
-                ul, ol {{
-                    margin-bottom: 1rem;
-                    margin-left: 2rem;
-                }}
-                li {{
-                    margin-bottom: 0.5rem;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="title-page">
-                <h1 style="font-size: 3rem; margin-bottom: 1rem;">{title}</h1>
-                <p style="font-size: 1.5rem;">By {author}</p>
-            </div>
-        """
-        
+        converter = _get_converter()
+        chapters = []
+        converted = 0
         for section in sections:
-            sec_title = section.get("title", "")
-            sec_content = section.get("content", "")
-            
-            # Convert markdown content to HTML
-            # The content already has SVG embedded from ImageAgent
-            html_body = markdown.markdown(
-                sec_content,
-                extensions=['fenced_code', 'tables', 'nl2br']
-            )
-            
-            html_content += f"""
-            <div class="chapter">
-                <h2>{sec_title}</h2>
-                <div class="content">
-                    {html_body}
-                </div>
-            </div>
-            """
-            
-        html_content += """
-        </body>
-        </html>
-        """
+            # Chapters are memoized by their content, so a rebuild only converts the ones that changed
+            chapter_title = section.get("title", "")
+            content = section.get("content", "")
+            key = content_digest(chapter_title, content)
+            chapter = self.chapter_cache.get(key)
+            if chapter is None:
+                # Convert markdown content to HTML
+                # The content already has SVG embedded from ImageAgent
+                converter.reset()
+                html_body = converter.convert(content)
+                chapter = CHAPTER_TEMPLATE.substitute(title=chapter_title, body=html_body)
+                self.chapter_cache.put(key, chapter)
+                converted += 1
+            chapters.append(chapter)
+        converter.reset()
+
+        html_content = DOCUMENT_TEMPLATE.substitute(
+            title=title,
+            author=author,
+            chapters="".join(chapters),
+            style=f"\n    <style>{BOOK_CSS}</style>" if inline_css else "",
+        )
         
-        logger.info("HTML formatting complete")
+        logger.info(f"HTML formatting complete ({converted} of {len(sections)} chapters converted, the rest reused)")
         return html_content
+
+    def preview_html(self, html_content: str) -> str:
+        """Stand-alone copy of ``format_to_html`` output with the stylesheet inlined for browsers"""
+        return html_content.replace("</head>", f"    <style>{BOOK_CSS}{PREVIEW_CSS}</style>\n</head>", 1)
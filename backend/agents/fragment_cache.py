@@ -0,0 +1,80 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+from .metrics import CACHE_LOOKUPS
+
+CHAPTER_CACHE_SIZE = int(os.getenv("EBOOK_CHAPTER_CACHE_SIZE", "512"))  # formatted chapters kept in memory
+
+
+def content_digest(*parts: str) -> str:
+    """SHA-256 of ``parts``, separated so that ("ab", "c") and ("a", "bc") differ"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class FragmentCache:
+    """In-memory LRU of values derived from content, keyed by the content's digest.
+
+    A changed input gets a new key, so entries never go stale; they only age out
+    once more than ``max_entries`` are held.
+    """
+
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> value, least recently used first
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+            return value
+
+    def put(self, key: str, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_chapter_cache = None
+_chapter_cache_lock = threading.Lock()
+
+
+def get_chapter_cache() -> FragmentCache:
+    """Process-wide cache of chapters converted from Markdown, shared by every FormatterAgent"""
+    global _chapter_cache
+    with _chapter_cache_lock:
+        if _chapter_cache is None:
+            _chapter_cache = FragmentCache("chapter_html", CHAPTER_CACHE_SIZE)
+        return _chapter_cache
@@ -1,81 +1,215 @@
-import google.generativeai as genai
+import asyncio
 import logging
+import os
 import re
+import time
+from .clients import get_model
+from .svg_cache import get_svg_cache
+from .execution import run_cpu, run_blocking_io
+from .svg_optimizer import optimize_svg
+from .metrics import record_llm_response
+from .model_scheduler import IMAGE_PRIORITY, get_model_scheduler
 
 logger = logging.getLogger(__name__)
 
+MAX_CONCURRENT_IMAGES = int(os.getenv("EBOOK_MAX_CONCURRENT_IMAGES", "4"))
+IMAGE_TIMEOUT = float(os.getenv("EBOOK_IMAGE_TIMEOUT", "60"))  # seconds per diagram, including waiting for a diagram slot, model queueing and retries
+
+# Bump whenever the diagram prompt or SVG post-processing changes so stale cached SVGs are not reused
+PROMPT_VERSION = "2"
+
+PLACEHOLDER_PATTERN = re.compile(r'\[IMAGE: (.*?)\]')
+
+
+def normalize_description(desc: str) -> str:
+    """Collapse case and whitespace so trivially different descriptions share a diagram"""
+    return " ".join(desc.split()).casefold()
+
+
 class ImageAgent:
-    def __init__(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, api_key: str, svg_cache=None, scheduler=None):
+        self.model = get_model(api_key)
+        self.svg_cache = svg_cache or get_svg_cache()
+        self.scheduler = scheduler or get_model_scheduler()
+
+    def start_pipeline(self, reporter=None) -> "DiagramPipeline":
+        """Begin a diagram batch that sections can be fed into as soon as they are written"""
+        return DiagramPipeline(self, reporter)
 
-    async def generate_images(self, book_data: dict) -> dict:
+    async def generate_images(self, book_data: dict, reporter=None) -> dict:
         logger.info("Generating images/diagrams...")
-        
-        for section in book_data.get("sections", []):
-            content = section.get("content", "")
-            # Find all image placeholders
-            placeholders = re.findall(r'\[IMAGE: (.*?)\]', content)
-            
-            for desc in placeholders:
-                logger.info(f"Generating image for: {desc}")
-                # We will generate an SVG for diagrams/graphs
-                # For realistic images, we might need a different model, but SVG is safe for "graphs, diagrams"
-                
-                prompt = f"""
-                Create a simple, professional SVG diagram for: "{desc}"
-                
-                Requirements:
-                - Return ONLY the SVG code, no markdown, no explanations
-                - Use viewBox for responsiveness
-                - Set width="600" height="400" for consistent sizing
-                - Use clear, readable fonts (Arial, sans-serif)
-                - Use a professional color scheme (blues, grays, black text)
-                - Make it simple and clear
-                - Include labels and text where appropriate
-                
-                Example format:
-                <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 600 400" width="600" height="400">
-                  <!-- Your diagram here -->
-                </svg>
-                """
-                
-                try:
-                    response = self.model.generate_content(prompt)
-                    svg_code = response.text.strip()
-                    
-                    # Clean up the SVG code
-                    svg_code = svg_code.replace("```svg", "").replace("```", "").strip()
-                    
-                    # Ensure it's valid SVG
-                    if "<svg" in svg_code and "</svg>" in svg_code:
-                        # Extract just the SVG part
-                        svg_start = svg_code.find("<svg")
-                        svg_end = svg_code.find("</svg>") + 6
-                        svg_code = svg_code[svg_start:svg_end]
-                        
-                        # Ensure xmlns is present for PDF rendering
-                        if 'xmlns=' not in svg_code:
-                            svg_code = svg_code.replace('<svg', '<svg xmlns="http://www.w3.org/2000/svg"')
-                        
-                        # Replace placeholder with properly formatted SVG
-                        svg_html = f"""
+        return await self.start_pipeline(reporter).apply(book_data)
+
+    async def _report_figure(self, desc: str, semaphore: asyncio.Semaphore, reporter=None) -> str:
+        start = time.monotonic()
+        info = {}
+        figure = await self._generate_figure(desc, semaphore, info)
+        if reporter:
+            reporter.emit(
+                "image",
+                "finished" if figure else "failed",
+                description=desc,
+                duration=round(time.monotonic() - start, 3),
+                **info,
+            )
+        return figure
+
+    async def _generate_figure(self, desc: str, semaphore: asyncio.Semaphore, info: dict = None) -> str:
+        """Generate one diagram and return its figure HTML, or "" if it failed or timed out.
+
+        ``info`` is filled with the SVG size before and after optimization.
+        """
+        cache_key = f"{PROMPT_VERSION}:{normalize_description(desc)}"
+        # The cache is a file per entry: lookups read and touch it, stores write and may evict
+        svg_code = await run_blocking_io(self.svg_cache.get, cache_key)
+        if svg_code:
+            logger.info(f"Using cached SVG for: {desc}")
+            return self._figure_html(svg_code, desc)
+
+        try:
+            # Diagrams queue behind each other and behind chapter text, so the deadline covers all
+            # of that waiting and every retry: a starved diagram is dropped instead of holding up the book
+            svg_code = await asyncio.wait_for(self._generate_svg_in_turn(desc, semaphore), IMAGE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Image generation timed out after {IMAGE_TIMEOUT}s for: {desc}")
+            return ""
+        except Exception as e:
+            logger.error(f"Image generation failed for {desc}: {e}")
+            return ""
+
+        if not svg_code:
+            # Failed to generate valid SVG, remove placeholder
+            logger.warning(f"Invalid SVG generated for: {desc}")
+            return ""
+
+        try:
+            optimized, stats = await run_cpu(optimize_svg, svg_code)
+        except Exception as e:
+            # An optimizer bug should cost the book this diagram, not fail it; unsanitized SVG is never embedded
+            logger.warning(f"SVG optimization failed for {desc}, dropping the diagram: {e}")
+            return ""
+        svg_code = optimized
+        if info is not None:
+            info.update(stats)
+        if not svg_code:
+            logger.warning(f"Rejected SVG for {desc}: {stats['rejected']}")
+            return ""
+
+        logger.info(f"Successfully generated SVG for: {desc} ({stats['original_bytes']} -> {stats['optimized_bytes']} bytes)")
+        await run_blocking_io(self.svg_cache.put, cache_key, svg_code)
+        return self._figure_html(svg_code, desc)
+
+    def _figure_html(self, svg_code: str, desc: str) -> str:
+        return f"""
 <div class="image-container">
     {svg_code}
 </div>
 <p class="caption">Figure: {desc}</p>
 """
-                        content = content.replace(f"[IMAGE: {desc}]", svg_html)
-                        logger.info(f"Successfully generated SVG for: {desc}")
-                    else:
-                        # Failed to generate valid SVG, remove placeholder
-                        logger.warning(f"Invalid SVG generated for: {desc}")
-                        content = content.replace(f"[IMAGE: {desc}]", "")
-                        
-                except Exception as e:
-                    logger.error(f"Image generation failed for {desc}: {e}")
-                    content = content.replace(f"[IMAGE: {desc}]", "")
-            
-            section["content"] = content
-            
+
+    async def _generate_svg_in_turn(self, desc: str, semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            logger.info(f"Generating image for: {desc}")
+            return await self._generate_svg(desc)
+
+    async def _generate_svg(self, desc: str) -> str:
+        # We will generate an SVG for diagrams/graphs
+        # For realistic images, we might need a different model, but SVG is safe for "graphs, diagrams"
+        prompt = f"""
+        Create a simple, professional SVG diagram for: "{desc}"
+
+        Requirements:
+        - Return ONLY the SVG code, no markdown, no explanations
+        - Use viewBox for responsiveness
+        - Set width="600" height="400" for consistent sizing
+        - Use clear, readable fonts (Arial, sans-serif)
+        - Use a professional color scheme (blues, grays, black text)
+        - Make it simple and clear
+        - Include labels and text where appropriate
+
+        Example format:
+        <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 600 400" width="600" height="400">
+          <!-- Your diagram here -->
+        </svg>
+        """
+
+        response = await self.scheduler.generate(self.model, prompt, priority=IMAGE_PRIORITY)
+        record_llm_response("image", response)
+        svg_code = response.text.strip()
+
+        # Clean up the SVG code
+        svg_code = svg_code.replace("```svg", "").replace("```", "").strip()
+
+        # Ensure it's valid SVG
+        if "<svg" not in svg_code or "</svg>" not in svg_code:
+            return ""
+
+        # Extract just the SVG part
+        svg_start = svg_code.find("<svg")
+        svg_end = svg_code.find("</svg>") + 6
+        svg_code = svg_code[svg_start:svg_end]
+
+        # Ensure xmlns is present for PDF rendering
+        if 'xmlns=' not in svg_code:
+            svg_code = svg_code.replace('<svg', '<svg xmlns="http://www.w3.org/2000/svg"', 1)
+
+        return svg_code
+
+
+class DiagramPipeline:
+    """One book's diagram jobs, deduplicated by normalized description.
+
+    ``submit_section`` starts generation for a section's placeholders right away,
+    so diagrams can be drawn while later chapters are still being written.
+    ``apply`` waits for the diagrams the final book needs and splices them in.
+    """
+
+    def __init__(self, agent: ImageAgent, reporter=None):
+        self.agent = agent
+        self.reporter = reporter
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_IMAGES)
+        self._tasks = {}  # normalized description -> asyncio.Task returning figure HTML
+
+    def submit_section(self, section: dict):
+        for desc in PLACEHOLDER_PATTERN.findall(section.get("content", "")):
+            key = normalize_description(desc)
+            if key not in self._tasks:
+                self._tasks[key] = asyncio.ensure_future(
+                    self.agent._report_figure(desc, self._semaphore, self.reporter)
+                )
+
+    async def apply(self, book_data: dict) -> dict:
+        sections = book_data.get("sections", [])
+        needed = set()
+        total = 0
+        for section in sections:
+            self.submit_section(section)
+            for desc in PLACEHOLDER_PATTERN.findall(section.get("content", "")):
+                total += 1
+                needed.add(normalize_description(desc))
+
+        # Diagrams started for text that did not make it into the final book are not waited for
+        for key, task in self._tasks.items():
+            if key not in needed:
+                task.cancel()
+
+        if not needed:
+            logger.info("No image placeholders found")
+            return book_data
+
+        logger.info(f"Waiting for {len(needed)} unique diagrams for {total} placeholders")
+        await asyncio.gather(*(self._tasks[key] for key in needed))
+        figures = {key: self._tasks[key].result() for key in needed}
+
+        # Splice figures back in; failed diagrams simply drop their placeholder
+        for section in sections:
+            section["content"] = PLACEHOLDER_PATTERN.sub(
+                lambda m: figures.get(normalize_description(m.group(1)), ""),
+                section.get("content", ""),
+            )
+
         return book_data
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
@@ -0,0 +1,228 @@
+import bisect
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans one cached page fetch up to a slow whole-book analysis
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000, 20_000_000)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self):
+        """(name, formatted labels, value) for every series, in exposition order"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; ``set_function`` makes it read a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                return [(self.name, "", self._function())]
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} callback failed: {e}")
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # bucket counts, sum, count
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, 'le="+Inf"'), count))
+            samples.append((f"{self.name}_sum", _format_labels(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _format_labels(self.labelnames, key), count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "ebook_stage_duration_seconds", "Duration of workflow stages, per URL scraped and per diagram",
+    ("stage", "outcome"),
+))
+RETRIES = REGISTRY.register(Counter(
+    "ebook_retries_total", "Retried attempts by the step that was retried", ("step",),
+))
+FALLBACKS = REGISTRY.register(Counter(
+    "ebook_research_fallbacks_total", "Books written from fallback content because research found nothing", ("reason",),
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "ebook_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"),
+))
+LLM_CALLS = REGISTRY.register(Counter(
+    "ebook_llm_calls_total", "Model calls by calling agent", ("agent",),
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "ebook_llm_tokens_total", "Model tokens reported by the API", ("agent", "direction"),
+))
+LLM_RESPONSE_BYTES = REGISTRY.register(Counter(
+    "ebook_llm_response_bytes_total", "Bytes of model output text", ("agent",),
+))
+PDF_BYTES = REGISTRY.register(Histogram(
+    "ebook_pdf_size_bytes", "Size of rendered PDFs", buckets=SIZE_BUCKETS,
+))
+JOBS_QUEUED = REGISTRY.register(Gauge("ebook_jobs_queued", "Jobs waiting for a worker"))
+JOBS_RUNNING = REGISTRY.register(Gauge("ebook_jobs_running", "Jobs currently being generated"))
+GENERATIONS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "ebook_generations_in_flight", "Distinct topics being generated (after coalescing)",
+))
+MODEL_CONCURRENCY_LIMIT = REGISTRY.register(Gauge(
+    "ebook_model_concurrency_limit", "Current adaptive limit on concurrent model calls",
+))
+MODEL_CALLS_WAITING = REGISTRY.register(Gauge(
+    "ebook_model_calls_waiting", "Model calls queued for a slot or quota",
+))
+MODEL_THROTTLED = REGISTRY.register(Counter(
+    "ebook_model_throttled_total", "Model calls rejected with a quota or server error", ("status",),
+))
+ARTIFACT_BYTES = REGISTRY.register(Gauge("ebook_artifact_bytes", "Disk used by indexed books and previews"))
+ARTIFACT_EVICTIONS = REGISTRY.register(Counter(
+    "ebook_artifact_evictions_total", "Books and previews deleted to stay under the disk quota",
+))
+
+
+def observe_stage_event(record: dict):
+    """StageReporter listener feeding stage latencies into the stage histogram"""
+    if record.get("event") in ("finished", "failed") and "duration" in record:
+        STAGE_SECONDS.observe(record["duration"], stage=record["stage"], outcome=record["event"])
+
+
+def record_llm_response(agent: str, response, text: str = None):
+    """Count one model call with its token usage and output size"""
+    LLM_CALLS.inc(agent=agent)
+    try:
+        if text is None:
+            text = response.text
+        LLM_RESPONSE_BYTES.inc(len(text.encode("utf-8")), agent=agent)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            LLM_TOKENS.inc(getattr(usage, "prompt_token_count", 0) or 0, agent=agent, direction="prompt")
+            LLM_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, agent=agent, direction="output")
+    except Exception as e:
+        # Blocked or empty responses have no text; the caller reports those itself
+        logger.debug(f"Could not read usage from {agent} response: {e}")
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
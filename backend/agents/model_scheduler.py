@@ -0,0 +1,226 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable
+from .metrics import MODEL_CONCURRENCY_LIMIT, MODEL_CALLS_WAITING, MODEL_THROTTLED, RETRIES
+from .research_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MODEL_RPM = float(os.getenv("EBOOK_MODEL_RPM", "1000"))  # requests per minute; 0 disables the limit
+MODEL_TPM = float(os.getenv("EBOOK_MODEL_TPM", "1000000"))  # tokens per minute; 0 disables the limit
+MODEL_MAX_CONCURRENCY = int(os.getenv("EBOOK_MODEL_MAX_CONCURRENCY", "16"))
+MODEL_MAX_RETRIES = int(os.getenv("EBOOK_MODEL_MAX_RETRIES", "5"))
+MODEL_BACKOFF_BASE = float(os.getenv("EBOOK_MODEL_BACKOFF_BASE", "1.0"))  # seconds
+MODEL_BACKOFF_MAX = 30.0
+
+# Lower runs first: a book cannot progress without its text, diagrams can wait
+ANALYST_PRIORITY = 0
+IMAGE_PRIORITY = 10
+
+DEFAULT_OUTPUT_TOKENS = 2048
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "BadGateway", "GatewayTimeout", "DeadlineExceeded",
+}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Quota (429) and server-side (5xx) failures are worth retrying; anything else is not"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class TokenBucket:
+    """Continuously refilled allowance of ``per_minute`` units; non-positive means unlimited"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken (requests above capacity wait for a full bucket)"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """Charge (positive) or refund (negative) the difference between estimated and actual use"""
+        if self.capacity > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class ModelScheduler:
+    """Process-wide admission control for model calls.
+
+    Calls wait in a priority queue until a concurrency slot and enough request and
+    token allowance are free. The concurrency limit adapts AIMD-style: it grows by
+    about one per window of successful calls and halves on a quota or server error,
+    after which the call is retried with full-jitter exponential backoff.
+    All methods must be used from the event loop thread.
+    """
+
+    def __init__(self, requests_per_minute: float = MODEL_RPM, tokens_per_minute: float = MODEL_TPM,
+                 max_concurrency: int = MODEL_MAX_CONCURRENCY, max_retries: int = MODEL_MAX_RETRIES,
+                 backoff_base: float = MODEL_BACKOFF_BASE, backoff_max: float = MODEL_BACKOFF_MAX):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.limit = max(1.0, max_concurrency / 2)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.in_flight = 0
+        self._waiters = []  # heap of (priority, sequence, future, tokens)
+        self._sequence = itertools.count()
+        self._timer = None
+        self._last_decrease = 0.0
+        self._loop = None
+
+    def waiting(self) -> int:
+        return sum(1 for _, _, future, _ in self._waiters if not future.done())
+
+    async def generate(self, model, prompt: str, priority: int = ANALYST_PRIORITY, timeout: float = None, **kwargs):
+        """``model.generate_content_async(prompt, **kwargs)`` under the scheduler's limits"""
+        config = kwargs.get("generation_config") or {}
+        estimated = estimate_tokens(prompt) + config.get("max_output_tokens", DEFAULT_OUTPUT_TOKENS)
+        response = await self.run(lambda: model.generate_content_async(prompt, **kwargs), priority, estimated, timeout)
+        if not kwargs.get("stream"):
+            self._reconcile(response, estimated)
+        return response
+
+    async def run(self, call: Callable[[], Awaitable], priority: int = ANALYST_PRIORITY,
+                  estimated_tokens: int = 0, timeout: float = None):
+        """Run ``call()`` once admitted, retrying quota and server errors with backoff.
+
+        ``timeout`` bounds each attempt, not the time spent queueing; timeouts are not retried.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, estimated_tokens)
+            try:
+                result = await (asyncio.wait_for(call(), timeout) if timeout else call())
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                self._on_throttle(e)
+            else:
+                self._on_success()
+                return result
+            finally:
+                self._release()
+
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            logger.warning(f"Model call throttled (attempt {attempt + 1}); retrying in {delay:.1f}s "
+                           f"with concurrency limit {int(self.limit)}")
+            RETRIES.inc(step="model_call")
+            await asyncio.sleep(delay)
+
+    def _reconcile(self, response, estimated: int):
+        try:
+            usage = response.usage_metadata
+            actual = (usage.prompt_token_count or 0) + (usage.candidates_token_count or 0)
+        except (AttributeError, TypeError):
+            return
+        if isinstance(actual, int) and actual:
+            self.tokens.adjust(actual - estimated)
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters and timers from a previous event loop can never be woken; start over
+            self._loop = loop
+            self._waiters = []
+            self._timer = None
+            self.in_flight = 0
+        return loop
+
+    async def _acquire(self, priority: int, tokens: int):
+        loop = self._bind()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future, tokens))
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # admitted just as the caller was cancelled
+            else:
+                future.cancel()
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._pump()
+
+    def _on_timer(self):
+        self._timer = None
+        self._pump()
+
+    def _pump(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future, tokens = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)  # cancelled while waiting
+                continue
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait > 0:
+                # Strict priority: lower-priority calls do not overtake a head waiting for quota
+                if self._timer is None:
+                    self._timer = self._loop.call_later(wait, self._on_timer)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _on_success(self):
+        self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def _on_throttle(self, error: Exception):
+        status = getattr(error, "code", None)
+        MODEL_THROTTLED.inc(status=str(status if isinstance(status, int) else type(error).__name__))
+        now = time.monotonic()
+        # Concurrent failures from one overload count once, so the limit halves per episode
+        if now - self._last_decrease >= self.backoff_base:
+            self.limit = max(1.0, self.limit / 2)
+            self._last_decrease = now
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_model_scheduler() -> ModelScheduler:
+    """Process-wide scheduler shared by every agent that calls the model"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = ModelScheduler()
+            MODEL_CONCURRENCY_LIMIT.set_function(lambda: int(_default_scheduler.limit))
+            MODEL_CALLS_WAITING.set_function(_default_scheduler.waiting)
+        return _default_scheduler
@@ -1,26 +1,35 @@
-from weasyprint import HTML
 import os
 import logging
 import uuid
+from .render_pool import get_render_pool
+from .metrics import PDF_BYTES
 
 logger = logging.getLogger(__name__)
 
+OUTPUT_DIR = "backend/static"
+
 class PDFAgent:
-    def __init__(self):
-        self.output_dir = "backend/static"
+    def __init__(self, render_pool=None):
+        self.output_dir = OUTPUT_DIR
         os.makedirs(self.output_dir, exist_ok=True)
+        self.render_pool = render_pool or get_render_pool()
 
-    def create_pdf(self, html_content: str, topic: str) -> str:
+    async def create_pdf(self, html_content: str, topic: str, filepath: str = None) -> str:
+        """Render to ``filepath``, or to a new file named after the topic when none is given"""
         logger.info("Converting HTML to PDF...")
         
-        # Sanitize filename
-        safe_topic = "".join([c for c in topic if c.isalnum() or c in (' ', '-', '_')]).strip().replace(' ', '_')
-        filename = f"{safe_topic}_{uuid.uuid4().hex[:8]}.pdf"
-        filepath = os.path.join(self.output_dir, filename)
+        if filepath is None:
+            # Sanitize filename
+            safe_topic = "".join([c for c in topic if c.isalnum() or c in (' ', '-', '_')]).strip().replace(' ', '_')
+            filename = f"{safe_topic}_{uuid.uuid4().hex[:8]}.pdf"
+            filepath = os.path.join(self.output_dir, filename)
         
         try:
-            HTML(string=html_content).write_pdf(filepath)
-            logger.info(f"PDF saved to {filepath}")
+            # Rendering runs in the warm WeasyPrint worker pool, not in this process
+            await self.render_pool.render(html_content, filepath)
+            size = os.path.getsize(filepath)
+            PDF_BYTES.observe(size)
+            logger.info(f"PDF saved to {filepath} ({size} bytes)")
             return filepath
         except Exception as e:
             logger.error(f"PDF creation failed: {e}")
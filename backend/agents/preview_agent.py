@@ -0,0 +1,29 @@
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR = "backend/static/previews"
+
+
+class PreviewAgent:
+    """Publishes a book's formatted HTML under /static so it can be read before the PDF exists."""
+
+    def __init__(self, output_dir: str = PREVIEW_DIR):
+        self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def publish(self, html_content: str, name: str) -> str:
+        """Write ``<name>.html`` atomically, replacing an earlier preview of the same run, and return its path"""
+        filepath = os.path.join(self.output_dir, f"{name}.html")
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(html_content)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.info(f"Preview published to {filepath}")
+        return filepath
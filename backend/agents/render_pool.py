@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .formatter_agent import split_document
+from .fragment_cache import FragmentCache
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.getenv("EBOOK_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+RENDER_QUEUE_SIZE = int(os.getenv("EBOOK_RENDER_QUEUE_SIZE", "16"))  # renders waiting beyond the busy workers
+RENDER_TIMEOUT = float(os.getenv("EBOOK_RENDER_TIMEOUT", "180"))  # seconds per render, counted once a worker runs it
+# Laid-out chapters each worker keeps so an unchanged chapter is not laid out again
+RENDER_FRAGMENT_CACHE_SIZE = int(os.getenv("EBOOK_RENDER_FRAGMENT_CACHE_SIZE", "64"))
+
+
+class RenderQueueFull(Exception):
+    pass
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+_stylesheet = None
+_layouts = None
+
+
+def _get_stylesheet():
+    """The book stylesheet, parsed once per worker process and shared by every render"""
+    global _stylesheet
+    if _stylesheet is None:
+        from weasyprint import CSS
+        from .formatter_agent import BOOK_CSS
+        _stylesheet = CSS(string=BOOK_CSS)
+    return _stylesheet
+
+
+def _warm_worker():
+    """Process initializer: import WeasyPrint, parse the stylesheet and lay out a tiny
+    document so fonts and Pango are loaded before the first real book arrives."""
+    from weasyprint import HTML
+    HTML(string="<html><body><h1>Warm-up</h1><p>Text</p></body></html>").write_pdf(stylesheets=[_get_stylesheet()])
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _render(fragments: list, filepath: str):
+    """Lay out each (digest, html) fragment, reusing layouts this worker already has, and
+    write their pages as one PDF. Returns the path and how many fragments were reused."""
+    global _layouts
+    from weasyprint import HTML
+    if _layouts is None:
+        _layouts = FragmentCache("render_layout", RENDER_FRAGMENT_CACHE_SIZE)
+    documents = []
+    reused = 0
+    for digest, html_content in fragments:
+        document = _layouts.get(digest)
+        if document is None:
+            document = HTML(string=html_content).render(stylesheets=[_get_stylesheet()])
+            _layouts.put(digest, document)
+        else:
+            reused += 1
+        documents.append(document)
+    # The first fragment (the title page) supplies the document metadata
+    pages = [page for document in documents for page in document.pages]
+    documents[0].copy(pages).write_pdf(filepath)
+    return filepath, reused
+
+
+class RenderPool:
+    """Pre-warmed worker processes that turn HTML into PDF files off the API process.
+
+    A book is laid out as its title page plus one fragment per chapter, and each
+    worker memoizes layouts by fragment digest. Renders of the same book (same
+    title page) go to the same worker when it is idle, so re-rendering a book with
+    one changed chapter only lays out that chapter; otherwise they take any idle
+    worker. A render is never queued on a busy worker.
+
+    At most ``workers + queue_size`` renders are admitted at once; later callers wait
+    for a slot and give up with RenderQueueFull after the render timeout. Admitted
+    renders wait here until a worker is idle, and only then is one submitted, so the
+    render timeout never counts time spent queued. A render that exceeds it gets its
+    worker recycled, since a stuck worker process cannot be interrupted any other
+    way; nothing else is running on that worker at the time.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, queue_size: int = RENDER_QUEUE_SIZE,
+                 timeout: float = RENDER_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.fragments_reused = 0
+        self.fragments_rendered = 0
+        self._executors = [None] * workers  # one single-process executor per worker
+        self._busy = [False] * workers  # whether each worker is running a render
+        self._lock = threading.Lock()
+        self._slots = None
+        self._idle = None  # one permit per worker with nothing submitted to it
+        self._slots_loop = None
+
+    def _get_executor(self, worker: int) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executors[worker] is None:
+                logger.info(f"Starting render worker {worker + 1}/{self.workers}")
+                self._executors[worker] = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                )
+            return self._executors[worker]
+
+    def _pick_worker(self, digest: str) -> int:
+        """The worker that rendered this book before if it is idle, else the first idle one.
+
+        Only called while holding an idle permit, so some worker is always free.
+        """
+        preferred = int(digest[:8], 16) % self.workers
+        if not self._busy[preferred]:
+            return preferred
+        return next(worker for worker in range(self.workers) if not self._busy[worker])
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+            self._idle = asyncio.Semaphore(self.workers)
+            self._slots_loop = loop
+        return self._slots
+
+    def start(self):
+        """Spawn and warm every worker now rather than on the first render"""
+        for worker in range(self.workers):
+            self._get_executor(worker).submit(_ping)
+
+    async def render(self, html_content: str, filepath: str) -> str:
+        fragments = [(hashlib.sha256(part.encode("utf-8")).hexdigest(), part) for part in split_document(html_content)]
+        slots = self._get_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise RenderQueueFull(f"Render queue is full ({self.workers + self.queue_size} renders in progress)")
+
+        idle = self._idle
+        try:
+            # Queued renders wait here, not inside an executor, so their wait is never timed
+            await idle.acquire()
+        except BaseException:
+            slots.release()
+            raise
+        worker = self._pick_worker(fragments[0][0])
+        self._busy[worker] = True
+        try:
+            executor = self._get_executor(worker)
+            future = asyncio.wrap_future(executor.submit(_render, fragments, filepath))
+            try:
+                filepath, reused = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Render exceeded {self.timeout}s; recycling render worker {worker + 1}")
+                self._recycle(worker, executor)
+                raise RenderTimeout(f"PDF rendering timed out after {self.timeout}s")
+            except BrokenProcessPool:
+                logger.error(f"Render worker {worker + 1} died; recycling it")
+                self._recycle(worker, executor)
+                raise
+        finally:
+            self._busy[worker] = False
+            idle.release()
+            slots.release()
+
+        self.fragments_reused += reused
+        self.fragments_rendered += len(fragments) - reused
+        CACHE_LOOKUPS.inc(reused, cache="render_layout", result="hit")
+        CACHE_LOOKUPS.inc(len(fragments) - reused, cache="render_layout", result="miss")
+        logger.info(f"Rendered {filepath}: laid out {len(fragments) - reused} of {len(fragments)} fragments, reused the rest")
+        return filepath
+
+    def _recycle(self, worker: int, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executors[worker] is not executor:
+                return  # someone else already replaced it
+            self._executors[worker] = None
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "fragments_reused": self.fragments_reused,
+            "fragments_rendered": self.fragments_rendered,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executors, self._executors = self._executors, [None] * self.workers
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> RenderPool:
+    """Process-wide render pool shared by every PDFAgent"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = RenderPool()
+        return _default_pool
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+RESEARCH_CACHE_PATH = os.getenv("EBOOK_RESEARCH_CACHE_PATH", "backend/cache/research.sqlite3")
+SEARCH_CACHE_TTL = float(os.getenv("EBOOK_SEARCH_CACHE_TTL", str(6 * 3600)))
+PAGE_CACHE_TTL = float(os.getenv("EBOOK_PAGE_CACHE_TTL", str(24 * 3600)))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+class CachedPage:
+    def __init__(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str], fetched_at: float):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.fetched_at < PAGE_CACHE_TTL
+
+    def validators(self) -> dict:
+        """Conditional request headers for revalidating a stale entry"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResearchCache:
+    """SQLite-backed cache of search results per query and extracted text per URL.
+
+    Stale search results are still returned so callers can fall back to them when
+    a fresh search fails; stale pages carry their ETag/Last-Modified validators so
+    unchanged pages can be revalidated without re-downloading and re-parsing them.
+    """
+
+    def __init__(self, path: str = RESEARCH_CACHE_PATH):
+        self.path = path
+        self.search_hits = 0
+        self.search_misses = 0
+        self.page_hits = 0
+        self.page_misses = 0
+        self.page_stale = 0
+        self.page_revalidations = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS searches (
+                query TEXT PRIMARY KEY,
+                urls TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def get_search(self, query: str, num_results: int):
+        """Return (urls, fresh) for a cached query, or (None, False) on a miss"""
+        key = f"{normalize_query(query)}|{num_results}"
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT urls, fetched_at FROM searches WHERE query = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.search_misses += 1
+                CACHE_LOOKUPS.inc(cache="search", result="miss")
+                return None, False
+            fresh = time.time() - row[1] < SEARCH_CACHE_TTL
+            if fresh:
+                self.search_hits += 1
+            else:
+                self.search_misses += 1
+            CACHE_LOOKUPS.inc(cache="search", result="hit" if fresh else "stale")
+            return json.loads(row[0]), fresh
+
+    def put_search(self, query: str, num_results: int, urls: list):
+        key = f"{normalize_query(query)}|{num_results}"
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (query, urls, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(urls), time.time()),
+            )
+            self._conn.commit()
+
+    def get_page(self, url: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            self.page_misses += 1
+            CACHE_LOOKUPS.inc(cache="page", result="miss")
+            return None
+        page = CachedPage(url, *row)
+        fresh = page.fresh
+        if fresh:
+            self.page_hits += 1
+        else:
+            self.page_stale += 1
+        CACHE_LOOKUPS.inc(cache="page", result="hit" if fresh else "stale")
+        return page
+
+    def put_page(self, url: str, text: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, text, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, text, etag, last_modified, time.time()),
+            )
+            self._conn.commit()
+
+    def mark_revalidated(self, url: str):
+        """Record a 304 Not Modified: the cached text is good for another TTL"""
+        with self._lock:
+            self.page_revalidations += 1
+            self._conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            searches = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {
+            "searches": searches,
+            "pages": pages,
+            "search_hits": self.search_hits,
+            "search_misses": self.search_misses,
+            "page_hits": self.page_hits,
+            "page_misses": self.page_misses,
+            "page_stale": self.page_stale,
+            "page_revalidations": self.page_revalidations,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_research_cache() -> ResearchCache:
+    """Process-wide cache shared by every SearchAgent"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResearchCache()
+        return _default_cache
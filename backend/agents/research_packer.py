@@ -0,0 +1,171 @@
+import logging
+import math
+import os
+import re
+import zlib
+from collections import Counter
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESEARCH_TOKEN_BUDGET = int(os.getenv("EBOOK_RESEARCH_TOKEN_BUDGET", "7500"))
+CHAPTER_RESEARCH_TOKEN_BUDGET = int(os.getenv("EBOOK_CHAPTER_RESEARCH_TOKEN_BUDGET", "2000"))
+CHUNK_WORDS = int(os.getenv("EBOOK_RESEARCH_CHUNK_WORDS", "120"))
+DUPLICATE_THRESHOLD = float(os.getenv("EBOOK_RESEARCH_DUPLICATE_THRESHOLD", "0.7"))  # estimated Jaccard similarity
+
+CHARS_PER_TOKEN = 4  # rough average for English prose; good enough for budgeting
+PAGE_CHAR_LIMIT = 100_000  # bound the work spent on any single page
+MIN_LINE_WORDS = 3  # shorter lines are mostly menus, buttons and bylines
+
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 bands of 4 rows: pairs above ~0.5 similarity become candidates
+MERSENNE_PRIME = (1 << 61) - 1
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+WORD_PATTERN = re.compile(r"\w+")
+SOURCE_HEADER = re.compile(r"^--- Source: (.*) ---$", re.MULTILINE)
+
+# Fixed coefficients so signatures are comparable across calls and processes
+_PERMUTATIONS = [
+    (zlib.crc32(f"a{i}".encode()) * 2654435761 % MERSENNE_PRIME | 1, zlib.crc32(f"b{i}".encode()) * 40503 % MERSENNE_PRIME)
+    for i in range(MINHASH_PERMUTATIONS)
+]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _words(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.casefold())
+
+
+def chunk_source(text: str, chunk_words: int = CHUNK_WORDS) -> List[str]:
+    """Group a page's lines into chunks of roughly ``chunk_words`` words, dropping menu-like lines"""
+    chunks = []
+    current, count = [], 0
+    for line in text[:PAGE_CHAR_LIMIT].splitlines():
+        line = line.strip()
+        words = len(line.split())
+        if words < MIN_LINE_WORDS:
+            continue
+        if current and count + words > chunk_words:
+            chunks.append("\n".join(current))
+            current, count = [], 0
+        current.append(line)
+        count += words
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _minhash(words: List[str]) -> Tuple[int, ...]:
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def _bm25_scores(query: List[str], documents: List[List[str]]) -> List[float]:
+    n = len(documents)
+    average_length = sum(len(d) for d in documents) / n or 1
+    document_frequency = Counter()
+    for document in documents:
+        document_frequency.update(set(document))
+
+    terms = set(query)
+    scores = []
+    for document in documents:
+        frequencies = Counter(document)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(document) / average_length)
+        score = 0.0
+        for term in terms:
+            tf = frequencies.get(term)
+            if tf:
+                idf = math.log(1 + (n - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        scores.append(score)
+    return scores
+
+
+def pack_research(topic: str, sources: List[Tuple[str, str]], token_budget: int = RESEARCH_TOKEN_BUDGET) -> Tuple[str, dict]:
+    """Compact scraped pages into the most relevant, non-repetitive text that fits the budget.
+
+    ``sources`` are ``(url, text)`` pairs in search-rank order. Pages are chunked,
+    chunks are ranked against the topic with BM25, near-duplicates of a better
+    ranked chunk are dropped (MinHash with LSH banding) and the best chunks are
+    packed greedily. Returns the packed text, grouped by source in the original
+    order, and stats about what was kept.
+    """
+    chunks = []  # (source index, position in source, text)
+    for source_index, (_, text) in enumerate(sources):
+        for position, chunk in enumerate(chunk_source(text)):
+            chunks.append((source_index, position, chunk))
+
+    stats = {"sources": len(sources), "chunks": len(chunks), "duplicates": 0, "kept": 0, "tokens": 0}
+    if not chunks:
+        return "", stats
+
+    tokenized = [_words(chunk) for _, _, chunk in chunks]
+    scores = _bm25_scores(_words(topic), tokenized)
+    # Ties (including "no topic words at all") fall back to search rank and page order
+    ranking = sorted(range(len(chunks)), key=lambda i: (-scores[i], chunks[i][0], chunks[i][1]))
+
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    buckets = {}  # (band, band values) -> indexes of kept chunks
+    signatures = {}
+    selected = []
+    remaining = token_budget
+    for i in ranking:
+        cost = estimate_tokens(chunks[i][2])
+        if cost > remaining:
+            continue
+
+        signature = _minhash(tokenized[i])
+        bands = [(band, signature[band * rows:(band + 1) * rows]) for band in range(LSH_BANDS)]
+        candidates = {j for key in bands for j in buckets.get(key, ())}
+        if any(
+            sum(x == y for x, y in zip(signature, signatures[j])) / MINHASH_PERMUTATIONS >= DUPLICATE_THRESHOLD
+            for j in candidates
+        ):
+            stats["duplicates"] += 1
+            continue
+
+        signatures[i] = signature
+        for key in bands:
+            buckets.setdefault(key, []).append(i)
+        selected.append(i)
+        remaining -= cost
+
+    stats["kept"] = len(selected)
+    stats["tokens"] = token_budget - remaining
+
+    parts = []
+    current_source = None
+    for i in sorted(selected, key=lambda i: (chunks[i][0], chunks[i][1])):
+        source_index, _, chunk = chunks[i]
+        if source_index != current_source:
+            parts.append(f"\n\n--- Source: {sources[source_index][0]} ---")
+            current_source = source_index
+        parts.append(chunk)
+    return "\n".join(parts), stats
+
+
+def split_sources(packed: str) -> List[Tuple[str, str]]:
+    """``(url, text)`` pairs back out of ``pack_research`` output; text without source headers is one source"""
+    parts = SOURCE_HEADER.split(packed)
+    sources = [("", parts[0])] if parts[0].strip() else []
+    sources.extend(zip(parts[1::2], parts[2::2]))
+    return sources
+
+
+def pack_chapter_research(packed: str, query: str, token_budget: int = CHAPTER_RESEARCH_TOKEN_BUDGET) -> str:
+    """The part of a book's packed research most relevant to one chapter, within ``token_budget``"""
+    text, _ = pack_research(query, split_sources(packed), token_budget)
+    # Research too fragmented to chunk (e.g. fallback content) is cut rather than sent whole
+    return text or packed[:token_budget * CHARS_PER_TOKEN]
@@ -1,25 +1,155 @@
-from duckduckgo_search import DDGS
-import requests
-from bs4 import BeautifulSoup
+import httpx
+import asyncio
 import logging
+import os
 import time
+from urllib.parse import urlparse
+from .execution import run_cpu, run_blocking_io
+from .research_cache import get_research_cache
+from .research_packer import pack_research
+from .metrics import FALLBACKS, RETRIES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Concurrent scraping settings
+MAX_CONCURRENT_FETCHES = int(os.getenv("EBOOK_MAX_CONCURRENT_FETCHES", "8"))
+PER_HOST_DELAY = float(os.getenv("EBOOK_PER_HOST_DELAY", "1.0"))  # seconds between requests to one host
+FETCH_TIMEOUT = float(os.getenv("EBOOK_FETCH_TIMEOUT", "15"))
+RESEARCH_DEADLINE = float(os.getenv("EBOOK_RESEARCH_DEADLINE", "25"))  # whole search + scrape stage
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
 class SearchAgent:
-    def __init__(self):
-        pass
+    def __init__(self, research_cache=None):
+        self.research_cache = research_cache or get_research_cache()
+        self._client = None
+        self._client_loop = None
+        self._fetch_slots = None
+        self._host_locks = {}
+        self._host_last_request = {}
+        self._inflight = {}  # search query or URL -> task shared by concurrent jobs
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the pooled HTTP client, recreating it if the event loop changed"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                headers=HEADERS,
+                timeout=FETCH_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONCURRENT_FETCHES,
+                    max_keepalive_connections=MAX_CONCURRENT_FETCHES,
+                ),
+            )
+            self._client_loop = loop
+            self._fetch_slots = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+            self._host_locks = {}
+            self._inflight = {}
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
 
-    def search_and_scrape(self, topic: str, num_results: int = 5) -> str:
+    async def search_and_scrape(self, topic: str, num_results: int = 5, reporter=None, context: str = None) -> str:
+        """Research ``topic``; with ``context``, pages found for that shared subject are
+        ranked alongside the topic's own, so related books reuse one set of fetches."""
         logger.info(f"Searching for: {topic}")
-        urls = []
+        self._get_client()
+        deadline = time.monotonic() + RESEARCH_DEADLINE
+        urls = await self._search_until(topic, num_results, deadline)
+        if context:
+            context_urls = await self._search_until(context, num_results, deadline)
+            urls = urls + [url for url in context_urls if url not in urls]
+
+        logger.info(f"Found {len(urls)} URLs: {urls[:3] if urls else 'none'}...")
+        
+        # If no URLs found, return fallback content
+        if not urls:
+            logger.warning("No URLs found after all attempts. Using fallback content.")
+            FALLBACKS.inc(reason="no_results")
+            return self._generate_fallback_content(topic)
+
+        if reporter:
+            reporter.emit("search", "results", urls=urls)
+
+        pages = await self._scrape_all(urls, deadline, reporter)
+
+        sources = [(url, pages[url]) for url in urls if pages.get(url)]
+        logger.info(f"Successfully scraped {len(sources)}/{len(urls)} URLs")
+
+        # Keep the most relevant, non-repeated passages that fit the analyst's prompt budget
+        combined_content, stats = await run_cpu(pack_research, topic, sources)
+        logger.info(
+            f"Packed research: kept {stats['kept']}/{stats['chunks']} chunks "
+            f"({stats['duplicates']} near-duplicates dropped), ~{stats['tokens']} tokens"
+        )
+        if reporter:
+            reporter.emit("search", "packed", **stats)
+
+        # If we got some content, return it
+        if combined_content.strip():
+            return combined_content
         
+        # Otherwise, use fallback
+        logger.warning("No content scraped. Using fallback content.")
+        FALLBACKS.inc(reason="no_content")
+        return self._generate_fallback_content(topic)
+    
+    async def _shared(self, key, factory):
+        """Await the in-flight task for ``key`` or start one, so concurrent jobs
+        researching overlapping topics search and fetch each thing once"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # Shield so one job hitting its research deadline does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter gave up before it finished
+
+    async def _search_until(self, query: str, num_results: int, deadline: float) -> list:
+        """Result URLs for ``query``, or none if the search is still running at ``deadline``.
+
+        The shared search keeps going for other jobs and fills the cache when it lands.
+        """
+        try:
+            return await asyncio.wait_for(
+                self._shared(("search", query), lambda: self._search(query, num_results)),
+                max(0.0, deadline - time.monotonic()),
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Research deadline reached while searching for: {query}")
+            return []
+
+    async def _search(self, topic: str, num_results: int) -> list:
+        """Return result URLs for a topic, served from the research cache when fresh"""
+        cached_urls, fresh = await run_blocking_io(self.research_cache.get_search, topic, num_results)
+        if cached_urls and fresh:
+            logger.info(f"Using cached search results for: {topic}")
+            return cached_urls
+
+        urls = []
+
         # Try DuckDuckGo search with retry
         for attempt in range(3):
             try:
                 logger.info(f"Search attempt {attempt + 1}/3")
-                results = DDGS().text(topic, max_results=num_results)
+                if attempt:
+                    RETRIES.inc(step="search")
+                from duckduckgo_search import DDGS  # imported lazily; it is slow to load
+                results = await run_blocking_io(DDGS().text, topic, max_results=num_results)
                 if results:
                     for r in results:
                         if 'href' in r:
@@ -27,70 +157,125 @@ class SearchAgent:
                     break
                 else:
                     logger.warning(f"No results on attempt {attempt + 1}")
-                    time.sleep(2)  # Wait before retry
+                    await asyncio.sleep(2)  # Wait before retry
             except Exception as e:
                 logger.error(f"Search attempt {attempt + 1} failed: {e}")
                 if attempt < 2:
-                    time.sleep(2)  # Wait before retry
+                    await asyncio.sleep(2)  # Wait before retry
                 continue
 
-        logger.info(f"Found {len(urls)} URLs: {urls[:3] if urls else 'none'}...")
-        
-        # If no URLs found, return fallback content
-        if not urls:
-            logger.warning("No URLs found after all attempts. Using fallback content.")
-            return self._generate_fallback_content(topic)
+        if urls:
+            await run_blocking_io(self.research_cache.put_search, topic, num_results, urls)
+        elif cached_urls:
+            logger.warning("Search failed; falling back to stale cached results")
+            return cached_urls
+        return urls
 
-        combined_content = ""
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
+    async def _scrape_all(self, urls: list, deadline: float, reporter=None) -> dict:
+        """Fetch all URLs concurrently and return {url: text} for pages done before the deadline"""
+        client = self._get_client()
+        tasks = {asyncio.ensure_future(self._scrape(client, url, reporter)): url for url in urls}
+        timeout = max(0.0, deadline - time.monotonic())
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
 
-        successful_scrapes = 0
-        for url in urls:
+        if pending:
+            logger.warning(f"Research deadline reached; abandoning {len(pending)} unfinished fetches")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        pages = {}
+        for task in done:
+            url = tasks[task]
             try:
-                logger.info(f"Scraping: {url}")
-                response = requests.get(url, headers=headers, timeout=15)
-                
-                if response.status_code != 200:
-                    logger.warning(f"Failed to fetch {url}: Status {response.status_code}")
-                    continue
-
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Remove script and style elements
-                for script in soup(["script", "style", "nav", "footer", "header"]):
-                    script.decompose()
-                
-                # Extract text from paragraphs and headings
-                text_elements = soup.find_all(['p', 'h1', 'h2', 'h3', 'li'])
-                text = "\n".join([elem.get_text().strip() for elem in text_elements if elem.get_text().strip()])
-                
-                if not text.strip():
-                    logger.warning(f"No text found in {url}")
-                    continue
-
-                # Limit content per URL
-                combined_content += f"\n\n--- Source: {url} ---\n{text[:3000]}"
-                successful_scrapes += 1
-                
-                # Add small delay to avoid rate limiting
-                time.sleep(1)
-                
+                text = task.result()
             except Exception as e:
                 logger.error(f"Failed to scrape {url}: {e}")
                 continue
-        
-        logger.info(f"Successfully scraped {successful_scrapes}/{len(urls)} URLs")
-        
-        # If we got some content, return it
-        if combined_content.strip():
-            return combined_content
-        
-        # Otherwise, use fallback
-        logger.warning("No content scraped. Using fallback content.")
-        return self._generate_fallback_content(topic)
-    
+            if text:
+                pages[url] = text
+        return pages
+
+    async def _scrape(self, client: httpx.AsyncClient, url: str, reporter=None) -> str:
+        start = time.monotonic()
+        try:
+            text = await self._shared(url, lambda: self._fetch_text(client, url))
+        except Exception as e:
+            if reporter:
+                reporter.emit("scrape", "failed", url=url, duration=round(time.monotonic() - start, 3), error=str(e))
+            raise
+        if reporter:
+            reporter.emit("scrape", "finished", url=url, duration=round(time.monotonic() - start, 3), chars=len(text))
+        return text
+
+    async def _fetch_text(self, client: httpx.AsyncClient, url: str) -> str:
+        # The research cache is SQLite with a commit per write, so it stays off the event loop
+        cached = await run_blocking_io(self.research_cache.get_page, url)
+        if cached is not None and cached.fresh:
+            logger.info(f"Using cached page: {url}")
+            return cached.text
+
+        await self._acquire_fetch_slot(url)
+        try:
+            logger.info(f"Scraping: {url}")
+            response = await client.get(url, headers=cached.validators() if cached else None)
+        finally:
+            self._fetch_slots.release()
+
+        if response.status_code == 304 and cached is not None:
+            logger.info(f"Page not modified, reusing cached text: {url}")
+            await run_blocking_io(self.research_cache.mark_revalidated, url)
+            return cached.text
+
+        if response.status_code != 200:
+            logger.warning(f"Failed to fetch {url}: Status {response.status_code}")
+            return cached.text if cached is not None else ""
+
+        text = await run_cpu(self._extract_text, response.content)
+        if not text.strip():
+            logger.warning(f"No text found in {url}")
+            return text
+
+        await run_blocking_io(
+            self.research_cache.put_page,
+            url,
+            text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return text
+
+    async def _acquire_fetch_slot(self, url: str):
+        """Take a global fetch slot once requests to the same host are PER_HOST_DELAY seconds apart.
+
+        The politeness wait happens before the slot is taken, so a host being waited on
+        never keeps other hosts from being fetched. The caller releases the slot.
+        """
+        host = urlparse(url).netloc.lower()
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            last = self._host_last_request.get(host)
+            if last is not None:
+                wait = last + PER_HOST_DELAY - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await self._fetch_slots.acquire()
+            # Stamped once the request can really start, so waiting for a slot never shortens the spacing
+            self._host_last_request[host] = time.monotonic()
+
+    def _extract_text(self, html: bytes) -> str:
+        """Strip boilerplate from a fetched page and return its readable text"""
+        from bs4 import BeautifulSoup  # imported lazily; it is slow to load
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # Remove script and style elements
+        for script in soup(["script", "style", "nav", "footer", "header"]):
+            script.decompose()
+
+        # Extract text from paragraphs and headings
+        text_elements = soup.find_all(['p', 'h1', 'h2', 'h3', 'li'])
+        return "\n".join([elem.get_text().strip() for elem in text_elements if elem.get_text().strip()])
+
     def _generate_fallback_content(self, topic: str) -> str:
         """Generate basic fallback content when search fails"""
         return f"""
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from .events import StageReporter
+
+logger = logging.getLogger(__name__)
+
+# Seconds a finished book stays eligible to be served again for the same topic; 0 disables reuse
+REUSE_WINDOW = float(os.getenv("EBOOK_REUSE_WINDOW", "0"))
+REUSE_MAX_ENTRIES = int(os.getenv("EBOOK_REUSE_MAX_ENTRIES", "256"))  # finished books remembered for reuse
+
+
+def normalize_topic(topic: str) -> str:
+    return " ".join(topic.split()).casefold()
+
+
+class GenerationCoalescer:
+    """Collapse concurrent generations of the same topic into one in-flight run.
+
+    Callers asking for a topic (and shared context) that is already being generated
+    await the same task instead of starting another pipeline. Within the reuse window a recent
+    successful result is returned directly, as long as its PDF still exists.
+    At most ``max_recent`` results are remembered, least recently finished first out.
+    """
+
+    def __init__(self, reuse_window: float = REUSE_WINDOW, max_recent: int = REUSE_MAX_ENTRIES):
+        self.reuse_window = reuse_window
+        self.max_recent = max_recent
+        self._inflight = {}  # (normalized topic, normalized context) -> asyncio.Task
+        self._reporters = {}  # same key -> reporter of the in-flight run
+        self._recent = OrderedDict()  # same key -> (finished_at, result), oldest first
+
+    async def run(
+        self,
+        topic: str,
+        generate: Callable[[], Awaitable[dict]],
+        reporter: StageReporter = None,
+        context: str = None,
+    ) -> dict:
+        """Run ``generate`` for ``topic`` unless an equivalent run is in flight or recent.
+
+        Runs only coalesce when they share ``context`` too, since it shapes the book.
+        ``reporter`` should be the one ``generate`` reports to; callers that join an
+        in-flight run get a ``generation joined`` event and then mirror the leader's events.
+        """
+        key = (normalize_topic(topic), normalize_topic(context or ""))
+
+        recent = self._recent_result(key)
+        if recent is not None:
+            logger.info(f"Reusing recently generated book for '{topic}': {recent.get('filename')}")
+            if reporter:
+                reporter.emit("generation", "reused", filename=recent.get("filename"))
+            return dict(recent, reused=True)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(generate())
+            self._inflight[key] = task
+            if reporter:
+                self._reporters[key] = reporter
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            logger.info(f"Joining in-flight generation for '{topic}'")
+            leader = self._reporters.get(key)
+            if reporter:
+                # The leader may have no reporter (or be past research); this caller does none of its own
+                reporter.emit("generation", "joined")
+                if leader:
+                    reporter.follow(leader)
+
+        # Shield so one caller disconnecting does not cancel the run for everyone else
+        result = await asyncio.shield(task)
+        return dict(result)
+
+    def _finish(self, key: tuple, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        self._reporters.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self.reuse_window <= 0 or self.max_recent <= 0:
+            return
+        now = time.monotonic()
+        self._recent[key] = (now, task.result())
+        self._recent.move_to_end(key)
+        # Entries are in finishing order, so expired ones are all at the front
+        while self._recent:
+            finished_at, _ = next(iter(self._recent.values()))
+            if now - finished_at <= self.reuse_window and len(self._recent) <= self.max_recent:
+                break
+            self._recent.popitem(last=False)
+
+    def _recent_result(self, key: tuple):
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        finished_at, result = entry
+        pdf_path = os.path.join("backend", result.get("pdf_path", ""))
+        if time.monotonic() - finished_at > self.reuse_window or not os.path.exists(pdf_path):
+            del self._recent[key]
+            return None
+        return result
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
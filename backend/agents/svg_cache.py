@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+SVG_CACHE_DIR = os.getenv("EBOOK_SVG_CACHE_DIR", "backend/cache/svg")
+SVG_CACHE_MAX_BYTES = int(os.getenv("EBOOK_SVG_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+class SVGCache:
+    """On-disk, content-addressed store of validated SVGs with LRU eviction.
+
+    Entries are files named by the SHA-256 of their key. Recency is tracked in
+    memory and persisted through file modification times, so the LRU order
+    survives a restart.
+    """
+
+    def __init__(self, directory: str = SVG_CACHE_DIR, max_bytes: int = SVG_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> size, least recently used first
+        self._total_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".svg"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, digest, size in sorted(files):
+            self._entries[digest] = size
+            self._total_bytes += size
+        logger.info(f"SVG cache loaded {len(self._entries)} entries ({self._total_bytes} bytes) from {self.directory}")
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.svg")
+
+    @staticmethod
+    def digest(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        digest = self.digest(key)
+        with self._lock:
+            if digest not in self._entries:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="svg", result="miss")
+                return None
+            try:
+                with open(self._path(digest), "r", encoding="utf-8") as f:
+                    svg_code = f.read()
+                os.utime(self._path(digest))
+            except OSError as e:
+                logger.warning(f"Dropping unreadable SVG cache entry {digest}: {e}")
+                self._total_bytes -= self._entries.pop(digest)
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="svg", result="miss")
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="svg", result="hit")
+            return svg_code
+
+    def put(self, key: str, svg_code: str):
+        digest = self.digest(key)
+        data = svg_code.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            path = self._path(digest)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Failed to write SVG cache entry {digest}: {e}")
+                return
+            self._total_bytes -= self._entries.pop(digest, 0)
+            self._entries[digest] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            digest, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_svg_cache() -> SVGCache:
+    """Process-wide cache shared by every ImageAgent"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SVGCache()
+        return _default_cache
@@ -0,0 +1,214 @@
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+SVG_MAX_NODES = int(os.getenv("EBOOK_SVG_MAX_NODES", "2000"))
+SVG_MAX_BYTES = int(os.getenv("EBOOK_SVG_MAX_BYTES", str(200 * 1024)))
+SVG_PRECISION = int(os.getenv("EBOOK_SVG_PRECISION", "2"))  # decimals kept in coordinates
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+ET.register_namespace("xlink", XLINK_NS)
+
+# Documents this far over the byte budget are not worth parsing at all
+PARSE_LIMIT_FACTOR = 4
+
+# Elements that never affect the rendered diagram, or that we refuse to render
+DROPPED_TAGS = {"metadata", "script", "foreignObject", "font", "font-face", "color-profile"}
+
+# Attributes holding numbers worth rounding
+GEOMETRY_ATTRIBUTES = {
+    "d", "points", "x", "y", "x1", "y1", "x2", "y2", "cx", "cy", "r", "rx", "ry",
+    "dx", "dy", "width", "height", "transform", "viewBox", "stroke-width",
+    "font-size", "offset", "fx", "fy",
+}
+
+# Presentation attributes whose value is already the default
+DEFAULT_ATTRIBUTES = {
+    "opacity": "1", "fill-opacity": "1", "stroke-opacity": "1", "stroke-width": "1",
+    "stroke-dasharray": "none", "stroke-linecap": "butt", "stroke-linejoin": "miter",
+    "fill-rule": "nonzero", "visibility": "visible", "display": "inline", "version": None,
+}
+
+# Inside these, whitespace is text the reader sees
+TEXT_TAGS = {"text", "tspan", "textPath", "title", "desc", "style"}
+
+# Only numbers with a fraction or exponent are rewritten; bare integers may be packed arc flags
+NUMBER_PATTERN = re.compile(r"-?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?|-?\d+[eE][-+]?\d+")
+FONT_FACE_PATTERN = re.compile(r"@font-face\s*\{[^}]*\}", re.IGNORECASE)
+CSS_COMMENT_PATTERN = re.compile(r"/\*.*?\*/", re.DOTALL)
+URL_REF_PATTERN = re.compile(r"url\(\s*#([^)\s]+)\s*\)")
+# "&" not starting an XML entity, as in a label like "A & B"; the most common reason generated SVG fails to parse
+STRAY_AMPERSAND_PATTERN = re.compile(r"&(?!(?:amp|lt|gt|quot|apos|#\d+|#x[0-9a-fA-F]+);)")
+
+
+def _local(name: str) -> str:
+    return name.rsplit("}", 1)[-1]
+
+
+def _round_numbers(value: str, precision: int) -> str:
+    def shorten(match):
+        number = round(float(match.group(0)), precision)
+        text = f"{number:.{precision}f}".rstrip("0").rstrip(".") if precision > 0 else str(int(number))
+        if text in ("-0", ""):
+            text = "0"
+        # Path data may pack numbers like "1.5.5"; keep them apart once the second gains a leading digit
+        start = match.start()
+        if start and match.string[start - 1] in "0123456789." and not text.startswith("-"):
+            text = " " + text
+        return text
+    return NUMBER_PATTERN.sub(shorten, value)
+
+
+def _strip(root: ET.Element):
+    """Drop metadata, scripts, embedded fonts, editor attributes and external references"""
+    for parent in list(root.iter()):
+        for child in list(parent):
+            foreign = not child.tag.startswith(f"{{{SVG_NS}}}")  # editor namespaces, stray HTML
+            if foreign or _local(child.tag) in DROPPED_TAGS:
+                if child.tail and parent.text is None:
+                    parent.text = child.tail
+                parent.remove(child)
+
+    for element in root.iter():
+        for name in list(element.attrib):
+            value = element.attrib[name]
+            local = _local(name)
+            foreign = name.startswith("{") and not name.startswith(f"{{{XLINK_NS}}}")
+            if foreign or local.startswith("on"):
+                del element.attrib[name]
+            elif local == "href" and not value.startswith(("#", "data:image/")):
+                del element.attrib[name]  # the renderer would fetch it over the network
+            elif local in DEFAULT_ATTRIBUTES and DEFAULT_ATTRIBUTES[local] in (None, value.strip()):
+                del element.attrib[name]
+
+        if _local(element.tag) == "style" and element.text:
+            css = CSS_COMMENT_PATTERN.sub("", element.text)
+            element.text = FONT_FACE_PATTERN.sub("", css).strip()
+
+
+def _collapse_whitespace(root: ET.Element):
+    for element in root.iter():
+        if _local(element.tag) in TEXT_TAGS:
+            continue
+        if element.text and not element.text.strip():
+            element.text = None
+        for child in element:
+            if child.tail and not child.tail.strip():
+                child.tail = None
+
+
+def _round_coordinates(root: ET.Element, precision: int):
+    for element in root.iter():
+        for name, value in element.attrib.items():
+            if _local(name) in GEOMETRY_ATTRIBUTES:
+                element.set(name, _round_numbers(value, precision))
+
+
+def _dedupe_defs(root: ET.Element):
+    """Merge every <defs> into the first one and drop definitions that repeat another one"""
+    defs_blocks = [(parent, child) for parent in root.iter() for child in parent if _local(child.tag) == "defs"]
+    if not defs_blocks:
+        return
+    target = defs_blocks[0][1]
+    for parent, block in defs_blocks[1:]:
+        for child in list(block):
+            target.append(child)
+        parent.remove(block)
+
+    seen = {}  # serialized definition without its id -> kept id
+    renamed = {}  # dropped id -> kept id
+    ids = set()
+    for child in list(target):
+        child_id = child.get("id")
+        if child_id in ids:
+            target.remove(child)  # later definitions with a taken id are unreachable
+            continue
+        attributes = {k: v for k, v in child.attrib.items() if k != "id"}
+        signature = ET.tostring(ET.Element(child.tag, attributes), encoding="unicode") + "".join(
+            ET.tostring(grandchild, encoding="unicode") for grandchild in child
+        )
+        if child_id and signature in seen:
+            renamed[child_id] = seen[signature]
+            target.remove(child)
+            continue
+        if child_id:
+            seen[signature] = child_id
+            ids.add(child_id)
+
+    if not renamed:
+        return
+    for element in root.iter():
+        for name, value in element.attrib.items():
+            if _local(name) == "href" and value[1:] in renamed and value.startswith("#"):
+                element.set(name, "#" + renamed[value[1:]])
+            elif "url(" in value:
+                element.set(name, URL_REF_PATTERN.sub(lambda m: f"url(#{renamed.get(m.group(1), m.group(1))})", value))
+
+
+def _serialize(root: ET.Element) -> str:
+    # ElementTree's default_namespace option rejects plain attributes, so write the
+    # SVG namespace as an ordinary xmlns attribute on unprefixed tags instead
+    for element in root.iter():
+        element.tag = _local(element.tag)
+    root.set("xmlns", SVG_NS)
+    # ">" is always escaped inside attributes and text, so this only touches empty tags
+    return ET.tostring(root, encoding="unicode").replace(" />", "/>")
+
+
+def optimize_svg(svg_code: str, max_nodes: int = SVG_MAX_NODES, max_bytes: int = SVG_MAX_BYTES,
+                 precision: int = SVG_PRECISION) -> Tuple[str, dict]:
+    """Shrink and sanitize a generated SVG so it renders in bounded time.
+
+    Returns the optimized SVG and size stats. Documents still over the byte budget
+    after optimization are simplified by rounding coordinates to whole units; if
+    that is not enough, or there are too many nodes, the SVG is rejected and ""
+    is returned. Input is never returned as is: an SVG that cannot be parsed, even
+    after escaping stray ampersands, cannot be sanitized and is rejected too.
+    """
+    stats = {"original_bytes": len(svg_code.encode("utf-8"))}
+
+    if stats["original_bytes"] > max_bytes * PARSE_LIMIT_FACTOR:
+        stats.update(optimized_bytes=0, rejected="too large to parse")
+        return "", stats
+
+    try:
+        root = ET.fromstring(svg_code)  # comments and processing instructions are discarded here
+    except ET.ParseError:
+        try:
+            root = ET.fromstring(STRAY_AMPERSAND_PATTERN.sub("&amp;", svg_code))
+            stats["repaired"] = True
+        except ET.ParseError as e:
+            logger.warning(f"Could not parse generated SVG: {e}")
+            stats.update(optimized_bytes=0, rejected="unparseable")
+            return "", stats
+
+    if root.tag != f"{{{SVG_NS}}}svg":
+        stats.update(optimized_bytes=0, rejected="root element is not svg")
+        return "", stats
+
+    _round_coordinates(root, precision)
+    _strip(root)
+    _dedupe_defs(root)
+    _collapse_whitespace(root)
+
+    nodes = sum(1 for _ in root.iter())
+    optimized = _serialize(root)
+
+    if nodes <= max_nodes and len(optimized.encode("utf-8")) > max_bytes and precision > 0:
+        _round_coordinates(root, 0)
+        optimized = _serialize(root)
+        stats["simplified"] = True
+
+    stats.update(optimized_bytes=len(optimized.encode("utf-8")), nodes=nodes)
+    if nodes > max_nodes:
+        stats["rejected"] = f"{nodes} nodes exceeds the budget of {max_nodes}"
+        return "", stats
+    if stats["optimized_bytes"] > max_bytes:
+        stats["rejected"] = f"{stats['optimized_bytes']} bytes exceeds the budget of {max_bytes}"
+        return "", stats
+    return optimized, stats
@@ -1,23 +1,347 @@
 import os
 import logging
+import mmap
+import re
+import time
+import zlib
 
 logger = logging.getLogger(__name__)
 
+# Where the spec lets the header and the end-of-file trailer sit
+HEADER_WINDOW = 1024
+TAIL_WINDOW = 2048
+
+HEADER = re.compile(rb"%PDF-(\d\.\d)")
+STARTXREF = re.compile(rb"startxref\s+(\d+)")
+OBJECT_START = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\b")
+XREF_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n")
+XREF_ENTRY = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+REFERENCE = rb"/%s\s+(\d+)\s+(\d+)\s+R"
+INTEGER = rb"/%s\s+(\d+)(?![\d.])"
+ARRAY = rb"/%s\s*\[([^\]]*)\]"
+
+
+class PDFStructureError(Exception):
+    pass
+
+
+class _PDFReader:
+    """Just enough of a PDF parser to follow the cross-reference table to the page tree.
+
+    Reads through a memory map and only touches the tail, the xref sections, the
+    catalog and the page tree root (plus the object stream holding them), so the
+    cost does not grow with the size of the page content.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.entries = {}  # object number -> (1, offset) for plain objects, (2, stream number, index) for compressed ones
+        self.trailer = b""
+        self._object_streams = {}
+
+    def read_xref(self, offset: int) -> str:
+        """Read the xref section at ``offset`` and every older one its trailer chains to
+        through ``/Prev``; entries from newer sections win. Returns the newest section's kind.
+        """
+        kind = trailer = None
+        visited = set()
+        while offset is not None:
+            if offset in visited:
+                raise PDFStructureError(f"Xref /Prev chain loops back to byte {offset}")
+            visited.add(offset)
+            section = self._read_xref_section(offset)
+            if kind is None:
+                kind, trailer = section, self.trailer
+            offset = _integer(self.trailer, b"Prev", required=False)
+        self.trailer = trailer
+        # Free entries only served to shadow older sections
+        self.entries = {number: entry for number, entry in self.entries.items() if entry is not None}
+        return kind
+
+    def _add_entry(self, number: int, entry):
+        """Record an xref entry unless a newer section already defined (or freed) the object"""
+        self.entries.setdefault(number, entry)
+
+    def _read_xref_section(self, offset: int) -> str:
+        if offset >= self.size:
+            raise PDFStructureError(f"startxref offset {offset} is past the end of the file ({self.size} bytes)")
+        if self.data[offset:offset + 4] == b"xref":
+            self._read_xref_table(offset + 4)
+            return "table"
+        self._read_xref_stream(offset)
+        return "stream"
+
+    def _read_xref_table(self, position: int):
+        while True:
+            match = XREF_SUBSECTION.match(self.data, position)
+            if match is None:
+                break
+            first, count = int(match.group(1)), int(match.group(2))
+            position = match.end()
+            for number in range(first, first + count):
+                entry = XREF_ENTRY.match(self.data, position)
+                if entry is None:
+                    raise PDFStructureError(f"Malformed xref entry for object {number} at byte {position}")
+                self._add_entry(number, (1, int(entry.group(1))) if entry.group(3) == b"n" else None)
+                position = entry.end()
+                # Entries are 20 bytes; the end of line is two characters, often a space and a newline
+                while position < self.size and self.data[position:position + 1] in b" \r\n":
+                    position += 1
+        trailer_start = self.data.find(b"trailer", position, position + 64)
+        if trailer_start < 0:
+            raise PDFStructureError("No trailer after the xref table")
+        trailer_end = self.data.find(b"startxref", trailer_start)
+        self.trailer = self.data[trailer_start:trailer_end if trailer_end > 0 else trailer_start + 1024]
+
+    def _read_xref_stream(self, offset: int):
+        dictionary, stream = self._stream_object_at(offset)
+        if not re.search(rb"/Type\s*/XRef", dictionary):
+            raise PDFStructureError(f"startxref points at byte {offset}, which is neither an xref table nor an xref stream")
+        self.trailer = dictionary
+        widths = [int(w) for w in _array(dictionary, b"W").split()]
+        if len(widths) != 3:
+            raise PDFStructureError("Xref stream has an invalid /W array")
+        index = _array(dictionary, b"Index")
+        numbers = [int(n) for n in index.split()] if index is not None else [0, _integer(dictionary, b"Size")]
+        data = self._decode(dictionary, stream, columns=sum(widths))
+        row = sum(widths)
+        position = 0
+        for first, count in zip(numbers[::2], numbers[1::2]):
+            for number in range(first, first + count):
+                if position + row > len(data):
+                    raise PDFStructureError("Xref stream is shorter than its /Index says")
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[position:position + width], "big") if width else None)
+                    position += width
+                kind = 1 if fields[0] is None else fields[0]
+                if kind == 1:
+                    self._add_entry(number, (1, fields[1]))
+                elif kind == 2:
+                    self._add_entry(number, (2, fields[1], fields[2]))
+                else:
+                    self._add_entry(number, None)
+
+    def _stream_object_at(self, offset: int):
+        """Dictionary and raw stream bytes of the stream object starting at ``offset``"""
+        if OBJECT_START.match(self.data, offset) is None:
+            raise PDFStructureError(f"No object starts at byte {offset}")
+        start = self.data.find(b"stream", offset)
+        if start < 0:
+            raise PDFStructureError(f"Object at byte {offset} has no stream")
+        dictionary = self.data[offset:start]
+        start += len(b"stream")
+        if self.data[start:start + 2] == b"\r\n":
+            start += 2
+        elif self.data[start:start + 1] in (b"\n", b"\r"):
+            start += 1
+        length = _integer(dictionary, b"Length", required=False)
+        if length is None or re.search(REFERENCE % b"Length", dictionary):
+            # Indirect /Length: fall back to scanning for the end of the stream
+            end = self.data.find(b"endstream", start)
+            if end < 0:
+                raise PDFStructureError(f"Stream at byte {offset} never ends")
+        else:
+            end = start + length
+            if end > self.size:
+                raise PDFStructureError(f"Stream at byte {offset} runs past the end of the file")
+        return dictionary, self.data[start:end]
+
+    def _decode(self, dictionary: bytes, stream: bytes, columns: int = 0) -> bytes:
+        if re.search(rb"/Filter\s*\[?\s*/FlateDecode", dictionary):
+            try:
+                stream = zlib.decompress(stream)
+            except zlib.error as e:
+                raise PDFStructureError(f"Corrupt compressed stream: {e}")
+        elif re.search(rb"/Filter", dictionary):
+            raise PDFStructureError("Unsupported stream filter")
+        predictor = _integer(dictionary, b"Predictor", required=False)
+        if predictor and predictor >= 10:
+            stream = _undo_png_predictor(stream, _integer(dictionary, b"Columns", required=False) or columns)
+        return stream
+
+    def check_offsets(self) -> list:
+        """Every uncompressed object must start where the xref says it does"""
+        errors = []
+        for number, entry in self.entries.items():
+            if entry[0] != 1 or number == 0:
+                continue
+            match = OBJECT_START.match(self.data, entry[1]) if entry[1] < self.size else None
+            if match is None or int(match.group(1)) != number:
+                errors.append(f"Object {number} is not at byte {entry[1]} as the xref says")
+                if len(errors) >= 5:
+                    errors.append("Further xref mismatches not listed")
+                    break
+        return errors
+
+    def object(self, number: int) -> bytes:
+        """The body (between ``obj`` and ``endobj``) of an object, uncompressed"""
+        entry = self.entries.get(number)
+        if entry is None:
+            raise PDFStructureError(f"Object {number} is not in the xref")
+        if entry[0] == 1:
+            match = OBJECT_START.match(self.data, entry[1])
+            if match is None:
+                raise PDFStructureError(f"Object {number} is not at byte {entry[1]}")
+            end = self.data.find(b"endobj", match.end())
+            if end < 0:
+                raise PDFStructureError(f"Object {number} never ends")
+            return self.data[match.end():end]
+        return self._compressed_object(entry[1], entry[2])
+
+    def _compressed_object(self, stream_number: int, index: int) -> bytes:
+        objects = self._object_streams.get(stream_number)
+        if objects is None:
+            entry = self.entries.get(stream_number)
+            if entry is None or entry[0] != 1:
+                raise PDFStructureError(f"Object stream {stream_number} is not in the xref")
+            dictionary, stream = self._stream_object_at(entry[1])
+            data = self._decode(dictionary, stream)
+            count, first = _integer(dictionary, b"N"), _integer(dictionary, b"First")
+            header = [int(n) for n in data[:first].split()]
+            if len(header) < 2 * count:
+                raise PDFStructureError(f"Object stream {stream_number} has a truncated header")
+            offsets = [first + header[2 * i + 1] for i in range(count)] + [len(data)]
+            objects = [data[offsets[i]:offsets[i + 1]] for i in range(count)]
+            self._object_streams[stream_number] = objects
+        if index >= len(objects):
+            raise PDFStructureError(f"Object stream {stream_number} has no object {index}")
+        return objects[index]
+
+
+def _integer(dictionary: bytes, key: bytes, required: bool = True):
+    match = re.search(INTEGER % key, dictionary)
+    if match is None:
+        if required:
+            raise PDFStructureError(f"Missing /{key.decode()}")
+        return None
+    return int(match.group(1))
+
+
+def _array(dictionary: bytes, key: bytes):
+    match = re.search(ARRAY % key, dictionary)
+    return match.group(1) if match else None
+
+
+def _reference(dictionary: bytes, key: bytes) -> int:
+    match = re.search(REFERENCE % key, dictionary)
+    if match is None:
+        raise PDFStructureError(f"Missing /{key.decode()} reference")
+    return int(match.group(1))
+
+
+def _undo_png_predictor(data: bytes, columns: int) -> bytes:
+    """Reverse the PNG row filters (None, Sub, Up) some writers apply to xref streams"""
+    rows = []
+    previous = bytearray(columns)
+    for start in range(0, len(data), columns + 1):
+        kind, row = data[start], bytearray(data[start + 1:start + 1 + columns])
+        if kind == 1:
+            for i in range(1, len(row)):
+                row[i] = (row[i] + row[i - 1]) & 0xFF
+        elif kind == 2:
+            for i in range(len(row)):
+                row[i] = (row[i] + previous[i]) & 0xFF
+        elif kind != 0:
+            raise PDFStructureError(f"Unsupported PNG predictor {kind} in xref stream")
+        rows.append(bytes(row))
+        previous = row
+    return b"".join(rows)
+
+
+def inspect_pdf(filepath: str, min_pages: int = 1) -> dict:
+    """Structural check of a PDF without reading it all: header, %%EOF, xref and
+    trailer, object offsets, and the page count from the page tree.
+
+    Returns a report dict; ``ok`` is False when any ``errors`` were found.
+    """
+    start = time.perf_counter()
+    report = {
+        "ok": False,
+        "path": filepath,
+        "size": None,
+        "version": None,
+        "xref": None,
+        "objects": None,
+        "pages": None,
+        "errors": [],
+    }
+    errors = report["errors"]
+    try:
+        with open(filepath, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            report["size"] = size
+            if size == 0:
+                errors.append("File is empty")
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    _inspect(data, report, min_pages)
+    except FileNotFoundError:
+        errors.append("File does not exist")
+    except (OSError, ValueError) as e:
+        errors.append(f"Could not read file: {e}")
+    report["ok"] = not errors
+    report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return report
+
+
+def _inspect(data, report: dict, min_pages: int):
+    errors = report["errors"]
+    size = len(data)
+
+    header = HEADER.search(data[:HEADER_WINDOW])
+    if header is None:
+        errors.append("No %PDF- header in the first 1024 bytes")
+    else:
+        report["version"] = header.group(1).decode()
+
+    tail = data[max(0, size - TAIL_WINDOW):]
+    if tail.rfind(b"%%EOF") < 0:
+        errors.append("No %%EOF marker at the end; the file is probably truncated")
+    startxref = None
+    for match in STARTXREF.finditer(tail):
+        startxref = int(match.group(1))
+    if startxref is None:
+        errors.append("No startxref at the end of the file")
+        return
+
+    reader = _PDFReader(data)
+    try:
+        report["xref"] = reader.read_xref(startxref)
+        report["objects"] = len(reader.entries)
+        offset_errors = reader.check_offsets()
+        errors.extend(offset_errors)
+        if offset_errors:
+            return
+
+        catalog = reader.object(_reference(reader.trailer, b"Root"))
+        if not re.search(rb"/Type\s*/Catalog", catalog):
+            errors.append("/Root is not a /Catalog")
+            return
+        pages = reader.object(_reference(catalog, b"Pages"))
+        report["pages"] = _integer(pages, b"Count")
+        if report["pages"] < min_pages:
+            errors.append(f"Document has {report['pages']} pages, expected at least {min_pages}")
+    except PDFStructureError as e:
+        errors.append(str(e))
+
+
 class VerifierAgent:
     def __init__(self):
         pass
 
-    def verify_pdf(self, filepath: str) -> bool:
+    def inspect_pdf(self, filepath: str, min_pages: int = 1) -> dict:
         logger.info(f"Verifying PDF: {filepath}")
-        
-        if not os.path.exists(filepath):
-            logger.error("PDF file does not exist.")
-            return False
-            
-        size = os.path.getsize(filepath)
-        if size == 0:
-            logger.error("PDF file is empty.")
-            return False
-            
-        logger.info(f"PDF verified successfully. Size: {size} bytes.")
-        return True
+        report = inspect_pdf(filepath, min_pages)
+        if report["ok"]:
+            logger.info(
+                f"PDF verified successfully. Size: {report['size']} bytes, {report['pages']} pages "
+                f"({report['elapsed_ms']}ms)."
+            )
+        else:
+            logger.error(f"PDF failed verification: {'; '.join(report['errors'])}")
+        return report
+
+    def verify_pdf(self, filepath: str) -> bool:
+        return self.inspect_pdf(filepath)["ok"]
@@ -1,10 +1,21 @@
+import asyncio
 import logging
+import os
+import threading
+import uuid
+import weakref
 from .search_agent import SearchAgent
 from .analyst_agent import AnalystAgent
 from .image_agent import ImageAgent
 from .formatter_agent import FormatterAgent
 from .pdf_agent import PDFAgent
+from .preview_agent import PreviewAgent
 from .verifier_agent import VerifierAgent
+from .execution import run_cpu, run_blocking_io
+from .events import StageReporter
+from .checkpoints import CheckpointStore
+from .metrics import RETRIES, observe_stage_event
+from .artifact_store import PDF, PREVIEW, download_url, get_artifact_store
 
 logger = logging.getLogger(__name__)
 
@@ -15,49 +26,294 @@ class EbookWorkflow:
         self.image_agent = ImageAgent(api_key)
         self.formatter_agent = FormatterAgent()
         self.pdf_agent = PDFAgent()
+        self.preview_agent = PreviewAgent()
         self.verifier_agent = VerifierAgent()
+        self.checkpoints = CheckpointStore()
+        self.artifacts = get_artifact_store()
+
+    async def aclose(self):
+        """Release pooled network clients held by the agents"""
+        await self.search_agent.aclose()
+
+    async def run(self, topic: str, reporter: StageReporter = None, job_id: str = None, context: str = None) -> dict:
+        """Generate a book for ``topic``.
 
-    async def run(self, topic: str) -> dict:
+        Each stage's output is checkpointed under ``job_id`` (a throwaway id when none
+        is given), so a retry or a restarted job resumes after the last stage that
+        succeeded instead of paying for search and analysis again. ``context`` is a
+        subject shared by related books (e.g. a course); its research is pooled with
+        the topic's own.
+        """
         logger.info(f"Starting workflow for topic: {topic}")
-        
+        reporter = reporter or StageReporter()
+        reporter.subscribe(observe_stage_event)
+        persistent = job_id is not None
+        job_id = job_id or f"run-{uuid.uuid4().hex}"
+        try:
+            return await self._generate(topic, reporter, job_id, persistent, context)
+        finally:
+            # Nothing can resume a throwaway run, so its checkpoints go whichever way it ends
+            if not persistent:
+                await run_blocking_io(self.checkpoints.clear, job_id)
+
+    async def _generate(self, topic: str, reporter: StageReporter, job_id: str, persistent: bool, context: str) -> dict:
         # Step 1: Search
-        raw_data = self.search_agent.search_and_scrape(topic)
-        if not raw_data:
-            raise Exception("Search failed to gather data.")
+        raw_data = await self._resume(job_id, "research", reporter)
+        if raw_data is None:
+            with reporter.stage("search") as info:
+                raw_data = await self.search_agent.search_and_scrape(topic, reporter=reporter, context=context)
+                info["chars"] = len(raw_data or "")
+            if not raw_data:
+                raise Exception("Search failed to gather data.")
+            await run_blocking_io(self.checkpoints.save, job_id, "research", raw_data)
 
         # Retry loop for generation and verification
         max_retries = 3
+        preview_path = None
+        published_html = None
         for attempt in range(max_retries):
             logger.info(f"Generation attempt {attempt + 1}/{max_retries}")
-            
-            # Step 2: Analyze
-            book_data = await self.analyst_agent.analyze_and_structure(topic, raw_data)
-            
-            # Step 3: Images
-            book_data_with_images = await self.image_agent.generate_images(book_data)
-            
-            # Step 4: Format
-            html_content = self.formatter_agent.format_to_html(book_data_with_images)
+            reporter.emit("generation", "attempt", attempt=attempt + 1, max_attempts=max_retries)
+            if attempt:
+                RETRIES.inc(step="generation")
+
+            html_content = await self._resume(job_id, "html", reporter)
+            if html_content is None:
+                book_data_with_images = await self._resume(job_id, "book_with_images", reporter)
+                if book_data_with_images is None:
+                    book_data_with_images = await self._write_book(topic, raw_data, job_id, reporter)
+                
+                # Step 4: Format (CPU-bound, off the event loop)
+                with reporter.stage("format"):
+                    html_content = await run_cpu(self.formatter_agent.format_to_html, book_data_with_images)
+                await run_blocking_io(self.checkpoints.save, job_id, "html", html_content)
+
+            # Readers get the book as HTML now; the PDF follows when the render lands
+            if html_content is not published_html:
+                preview_path = await self._publish_preview(job_id, topic, html_content, reporter) or preview_path
+                published_html = html_content
             
             # Step 5: PDF
             try:
-                pdf_path = self.pdf_agent.create_pdf(html_content, topic)
+                with reporter.stage("render"):
+                    pdf_path = await self.pdf_agent.create_pdf(html_content, topic)
             except Exception as e:
                 logger.error(f"PDF creation failed: {e}")
+                await self._escalate(job_id, attempt)
                 continue # Retry
             
-            # Step 6: Verify
-            if self.verifier_agent.verify_pdf(pdf_path):
+            # Step 6: Verify the file's structure (header, xref, trailer, page tree)
+            with reporter.stage("verify") as info:
+                report = await run_cpu(self.verifier_agent.inspect_pdf, pdf_path)
+                info.update(verified=report["ok"], pages=report["pages"], errors=report["errors"],
+                            check_ms=report["elapsed_ms"])
+            if report["ok"]:
                 # Success!
+                source = await run_blocking_io(self.checkpoints.load, job_id, "book_with_images")
+                await run_blocking_io(self.checkpoints.clear, job_id)
                 # Return relative path for frontend
                 relative_path = pdf_path.replace("backend/", "")
-                return {
+                result = {
                     "status": "success",
                     "pdf_path": relative_path,
-                    "filename": os.path.basename(pdf_path)
+                    "filename": os.path.basename(pdf_path),
+                    "preview_path": preview_path,
+                    "pages": report["pages"],
                 }
+                book = await self._index(pdf_path, topic, PDF, job_id if persistent else None, pages=report["pages"])
+                if book:
+                    result["book_id"] = book["id"]
+                    result["download_url"] = download_url(book)
+                    if source is not None:
+                        await self._save_source(book["id"], topic, context, raw_data, source)
+                return result
             else:
-                logger.warning("Verification failed. Retrying...")
+                # A structurally broken file is a bad render, not bad content: render the same HTML again
+                logger.warning(f"Verification failed ({'; '.join(report['errors'])}). Re-rendering...")
+                self._discard_pdf(pdf_path)
                 
         raise Exception("Failed to generate a valid PDF after 3 attempts.")
-import os
+
+    async def _write_book(self, topic: str, raw_data: str, job_id: str, reporter: StageReporter) -> dict:
+        """Analysis and diagrams, resuming from a checkpointed book when there is one"""
+        diagrams = self.image_agent.start_pipeline(reporter)
+        book_data = await self._resume(job_id, "book", reporter)
+        if book_data is None:
+            # Step 2: Analyze, starting each section's diagrams as soon as it is written
+            try:
+                with reporter.stage("analysis") as info:
+                    book_data = await self.analyst_agent.analyze_and_structure(
+                        topic, raw_data, reporter=reporter, on_section=diagrams.submit_section
+                    )
+                    info["sections"] = len(book_data.get("sections", []))
+            except BaseException:
+                diagrams.cancel()
+                raise
+            await run_blocking_io(self.checkpoints.save, job_id, "book", book_data)
+        
+        # Step 3: Images (waits only for diagrams still in flight)
+        with reporter.stage("images"):
+            book_data_with_images = await diagrams.apply(book_data)
+        await run_blocking_io(self.checkpoints.save, job_id, "book_with_images", book_data_with_images)
+        return book_data_with_images
+
+    async def _publish_preview(self, job_id: str, topic: str, html_content: str, reporter: StageReporter):
+        """Publish the HTML preview and return its path relative to backend/, or None if it failed"""
+        try:
+            with reporter.stage("preview") as info:
+                preview_html = await run_cpu(self.formatter_agent.preview_html, html_content)
+                filepath = await run_cpu(self.preview_agent.publish, preview_html, job_id)
+                info["preview_path"] = filepath.replace("backend/", "")
+                preview = await self._index(filepath, topic, PREVIEW, job_id)
+                if preview:
+                    info["preview_url"] = f"/api/artifacts/{preview['id']}/download"
+        except Exception as e:
+            # The PDF is still on its way; a missing preview should not fail the book
+            logger.warning(f"Could not publish preview for job {job_id}: {e}")
+            return None
+        return info["preview_path"]
+
+    async def _index(self, path: str, topic: str, kind: str, job_id: str = None, pages: int = None):
+        """Add a finished file to the artifact index; the file is still usable if that fails"""
+        try:
+            return await run_blocking_io(self.artifacts.add, path, topic, kind, job_id, pages)
+        except Exception as e:
+            logger.warning(f"Could not index {path}: {e}")
+            return None
+
+    async def regenerate_chapter(self, book_id: str, index: int, reporter: StageReporter = None) -> dict:
+        """Rewrite chapter ``index`` of a finished book and replace its PDF in place.
+
+        The book keeps its id and path. The chapter is rewritten from the research the
+        book was written with, and only it is illustrated and converted; the other
+        chapters' HTML and layouts come from the fragment caches.
+        """
+        reporter = reporter or StageReporter()
+        reporter.subscribe(observe_stage_event)
+        async with _book_lock(book_id):
+            book = await run_blocking_io(self.artifacts.get, book_id)
+            source = await run_blocking_io(self.artifacts.load_source, book_id)
+            if book is None or source is None:
+                raise Exception(f"Book {book_id} cannot be regenerated: it or its source is gone.")
+            topic = source["topic"]
+            sections = source["sections"]
+            if not 0 <= index < len(sections):
+                raise Exception(f"Book {book_id} has no chapter {index} (it has {len(sections)}).")
+            logger.info(f"Regenerating chapter {index + 1}/{len(sections)} of book {book_id} ('{topic}')")
+
+            raw_data = source.get("research")
+            if raw_data:
+                reporter.emit("research", "resumed")
+            else:
+                # Sources stored before the research was kept with them
+                logger.info(f"Book {book_id} has no stored research; searching again")
+                with reporter.stage("search") as info:
+                    raw_data = await self.search_agent.search_and_scrape(topic, reporter=reporter, context=source.get("context"))
+                    info["chars"] = len(raw_data or "")
+                if not raw_data:
+                    raise Exception("Search failed to gather data.")
+            with reporter.stage("analysis") as info:
+                section = await self.analyst_agent.rewrite_chapter(topic, raw_data, sections, index, reporter)
+                info["sections"] = 1
+            with reporter.stage("images"):
+                await self.image_agent.generate_images({"sections": [section]}, reporter)
+            sections[index] = section
+
+            with reporter.stage("format"):
+                html_content = await run_cpu(self.formatter_agent.format_to_html, source)
+            # Render next to the book and swap it in only once it verifies, so readers never see a partial file
+            tmp_path = f"{book['path']}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                with reporter.stage("render"):
+                    await self.pdf_agent.create_pdf(html_content, topic, filepath=tmp_path)
+                with reporter.stage("verify") as info:
+                    report = await run_cpu(self.verifier_agent.inspect_pdf, tmp_path)
+                    info.update(verified=report["ok"], pages=report["pages"], errors=report["errors"],
+                                check_ms=report["elapsed_ms"])
+                if not report["ok"]:
+                    raise Exception(f"Regenerated PDF failed verification: {'; '.join(report['errors'])}")
+                os.replace(tmp_path, book["path"])
+            finally:
+                self._discard_pdf(tmp_path)
+
+            book = await run_blocking_io(self.artifacts.add, book["path"], book["topic"], PDF, book["job_id"], report["pages"])
+            await self._save_source(book_id, topic, source.get("context"), raw_data, source)
+            return {
+                "status": "success",
+                "pdf_path": book["path"].replace("backend/", ""),
+                "filename": book["filename"],
+                "book_id": book_id,
+                "download_url": download_url(book),
+                "pages": report["pages"],
+                "chapter": {"index": index, "title": section["title"]},
+            }
+
+    async def _save_source(self, book_id: str, topic: str, context: str, research: str, book_data: dict):
+        """Keep the finished book's chapters and packed research so one chapter can be regenerated later"""
+        source = {
+            "topic": topic,
+            "context": context,
+            "research": research,
+            "title": book_data.get("title"),
+            "author": book_data.get("author"),
+            "sections": book_data.get("sections", []),
+        }
+        try:
+            await run_blocking_io(self.artifacts.save_source, book_id, source)
+        except Exception as e:
+            logger.warning(f"Could not save the source of book {book_id}: {e}")
+
+    def _discard_pdf(self, pdf_path: str):
+        try:
+            os.remove(pdf_path)
+        except OSError:
+            pass
+
+    async def _resume(self, job_id: str, stage: str, reporter: StageReporter):
+        value = await run_blocking_io(self.checkpoints.load, job_id, stage)
+        if value is not None:
+            logger.info(f"Resuming job {job_id} from checkpointed {stage}")
+            reporter.emit(stage, "resumed")
+        return value
+
+    async def _escalate(self, job_id: str, attempt: int):
+        """After a render error, the first retry re-renders the same HTML; after that, redo diagrams and formatting too"""
+        if attempt >= 1:
+            await run_blocking_io(self.checkpoints.discard, job_id, "book_with_images", "html")
+
+
+_book_locks = weakref.WeakValueDictionary()  # book id -> asyncio.Lock held while it is regenerated
+
+
+def _book_lock(book_id: str) -> asyncio.Lock:
+    lock = _book_locks.get(book_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _book_locks[book_id] = lock
+    return lock
+
+
+_workflows = {}  # api key -> EbookWorkflow
+_workflows_lock = threading.Lock()
+
+
+def get_workflow(api_key: str) -> EbookWorkflow:
+    """Process-wide workflow for an API key.
+
+    Its agents, model clients and HTTP connection pool are built on first use and
+    shared by every request; runs keep their state in the reporter and checkpoints.
+    """
+    with _workflows_lock:
+        workflow = _workflows.get(api_key)
+        if workflow is None:
+            workflow = EbookWorkflow(api_key)
+            _workflows[api_key] = workflow
+        return workflow
+
+
+async def close_workflows():
+    with _workflows_lock:
+        workflows = list(_workflows.values())
+        _workflows.clear()
+    for workflow in workflows:
+        await workflow.aclose()
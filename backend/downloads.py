@@ -0,0 +1,120 @@
+import os
+from typing import Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+
+CHUNK_SIZE = 64 * 1024
+# For URLs that name one exact version of a file, so clients may keep the download for good
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Previews are HTML built from model output and scraped pages, served from the API's own origin;
+# sandbox them so nothing in them can run scripts or load anything
+SANDBOXED_HTML_HEADERS = {
+    "Content-Security-Policy": "sandbox; default-src 'none'; style-src 'unsafe-inline'; img-src data:",
+    "X-Content-Type-Options": "nosniff",
+}
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single ``bytes=`` range, or None to send the whole file.
+
+    Multiple ranges and malformed headers are ignored, which RFC 9110 allows;
+    a well-formed range that lies past the end raises RangeNotSatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start:
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        first = int(start)
+        last = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable()
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored"""
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def _read_chunks(f, start: int, length: int):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_file(request: Request, path: str, sha256: str, media_type: str,
+               filename: str = None, cache_control: str = IMMUTABLE) -> Response:
+    """Send ``path`` with a strong ETag, conditional GET (304) and single-range (206) support.
+
+    Raises FileNotFoundError if the file is gone.
+    """
+    etag = f'"{sha256}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    f = open(path, "rb")
+    size = os.fstat(f.fileno()).st_size
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # A Range is only honoured against the representation the client already has part of
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            f.close()
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    status = 200
+    start, length = 0, size
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        f.close()
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(_read_chunks(f, start, length), status_code=status, headers=headers, media_type=media_type)
+
+
+class SandboxedStaticFiles(StaticFiles):
+    """StaticFiles that serves HTML (the previews) with SANDBOXED_HTML_HEADERS"""
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if path.endswith(".html"):
+            response.headers.update(SANDBOXED_HTML_HEADERS)
+        return response
@@ -0,0 +1,406 @@
+import asyncio
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from backend.agents.events import StageReporter
+from backend.agents.execution import run_blocking_io
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("EBOOK_JOB_DB_PATH", "backend/data/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("EBOOK_JOB_WORKERS", "2"))
+# Jobs allowed in the research stage at once; the rest of the workers are writing or rendering,
+# so a busy queue staggers its jobs across the search, model and render resources
+JOB_RESEARCH_SLOTS = int(os.getenv("EBOOK_JOB_RESEARCH_SLOTS", str(max(1, JOB_WORKERS // 2))))
+BATCH_MAX_TOPICS = int(os.getenv("EBOOK_BATCH_MAX_TOPICS", "500"))
+MAX_TRACKED_REPORTERS = 256  # progress streams kept in memory for recent jobs
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Job kinds: a whole book for a topic, or one chapter of an existing book rewritten in place
+BOOK = "book"
+CHAPTER = "chapter"
+
+
+def parse_topics_csv(text: str) -> list:
+    """``topic[,priority]`` rows (an optional ``topic,priority`` header is skipped) as ``(topic, priority)`` pairs"""
+    topics = []
+    for line_number, row in enumerate(csv.reader(io.StringIO(text)), start=1):
+        if not row or not row[0].strip():
+            continue
+        topic = row[0].strip()
+        priority = row[1].strip() if len(row) > 1 else ""
+        if line_number == 1 and topic.lower() == "topic":
+            continue
+        try:
+            topics.append((topic, int(priority) if priority else 0))
+        except ValueError:
+            raise ValueError(f"Line {line_number}: priority must be an integer, got '{priority}'")
+    return topics
+
+
+def summarize_batch(batch: dict) -> dict:
+    """Progress of a batch: job counts by status, fraction done and a rough time remaining"""
+    jobs = batch["jobs"]
+    counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    done = counts[SUCCEEDED] + counts[FAILED]
+    finished = [job["finished_at"] for job in jobs if job["finished_at"]]
+    elapsed = (max(finished) if done == len(jobs) and finished else time.time()) - batch["created_at"]
+    # Books finish at a steady rate once the pipeline is full, so extrapolate from the rate so far
+    remaining = elapsed / done * (len(jobs) - done) if done else None
+    return {
+        "batch_id": batch["batch_id"],
+        "name": batch["name"],
+        "total": len(jobs),
+        "counts": counts,
+        "progress": round(done / len(jobs), 4) if jobs else 1.0,
+        "finished": done == len(jobs),
+        "elapsed_seconds": round(elapsed, 3),
+        "eta_seconds": round(remaining, 1) if remaining is not None else None,
+    }
+
+
+def batch_manifest(batch: dict) -> dict:
+    """Per-topic results of a batch, in priority order"""
+    items = []
+    for job in batch["jobs"]:
+        result = job["result"] or {}
+        items.append({
+            "job_id": job["job_id"],
+            "topic": job["topic"],
+            "priority": job["priority"],
+            "status": job["status"],
+            "pdf_path": result.get("pdf_path"),
+            "filename": result.get("filename"),
+            "error": job["error"],
+            "duration_seconds": round(job["finished_at"] - job["started_at"], 3)
+            if job["finished_at"] and job["started_at"] else None,
+        })
+    return dict(summarize_batch(batch), context=batch["context"], items=items)
+
+
+class JobStore:
+    """SQLite persistence for generation jobs so queued and finished work survives restarts."""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+            CREATE TABLE IF NOT EXISTS batches (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                context TEXT,
+                created_at REAL NOT NULL
+            );
+        """)
+        # Databases created before priorities, batches, previews and job kinds existed
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "priority" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        if "batch_id" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+        if "preview_path" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN preview_path TEXT")
+        if "kind" not in columns:
+            self._conn.execute(f"ALTER TABLE jobs ADD COLUMN kind TEXT NOT NULL DEFAULT '{BOOK}'")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN params TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, created_at)")
+        self._conn.commit()
+
+    def _to_dict(self, row) -> dict:
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "topic": row["topic"],
+            "params": json.loads(row["params"]) if row["params"] else None,
+            "status": row["status"],
+            "priority": row["priority"],
+            "batch_id": row["batch_id"],
+            "preview_path": row["preview_path"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    def create(self, topic: str, priority: int = 0, kind: str = BOOK, params: dict = None) -> dict:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, topic, params, status, priority, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, topic, json.dumps(params) if params else None, QUEUED, priority, time.time()),
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def create_batch(self, topics: list, name: str = None, context: str = None) -> dict:
+        """Create a batch and one queued job per ``(topic, priority)`` in a single transaction"""
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO batches (id, name, context, created_at) VALUES (?, ?, ?, ?)",
+                    (batch_id, name, context, now),
+                )
+                self._conn.executemany(
+                    "INSERT INTO jobs (id, topic, status, priority, batch_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(uuid.uuid4().hex, topic, QUEUED, priority, batch_id, now) for topic, priority in topics],
+                )
+        return self.get_batch(batch_id)
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        """The batch with its jobs, highest priority first"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+            if row is None:
+                return None
+            jobs = self._conn.execute(
+                "SELECT * FROM jobs WHERE batch_id = ? ORDER BY priority DESC, rowid", (batch_id,)
+            ).fetchall()
+        return {
+            "batch_id": row["id"],
+            "name": row["name"],
+            "context": row["context"],
+            "created_at": row["created_at"],
+            "jobs": [self._to_dict(job) for job in jobs],
+        }
+
+    def batch_context(self, batch_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT context FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        return row["context"] if row else None
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def mark_running(self, job_id: str):
+        self._update(job_id, status=RUNNING, started_at=time.time())
+
+    def set_preview(self, job_id: str, preview_path: str):
+        self._update(job_id, preview_path=preview_path)
+
+    def mark_succeeded(self, job_id: str, result: dict):
+        self._update(job_id, status=SUCCEEDED, result=json.dumps(result), finished_at=time.time())
+
+    def mark_failed(self, job_id: str, error: str):
+        self._update(job_id, status=FAILED, error=error, finished_at=time.time())
+
+    def _update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def recover(self) -> list:
+        """Requeue jobs interrupted by a restart and return every queued ``(job id, priority)``, oldest first"""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT id, priority FROM jobs WHERE status = ? ORDER BY created_at, rowid", (QUEUED,)
+            ).fetchall()
+        return [(row["id"], row["priority"]) for row in rows]
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+
+class JobQueue:
+    """Fixed-size pool of asyncio workers draining persisted generation jobs.
+
+    Higher-priority jobs are taken first, then oldest first. A worker only takes a
+    job once a research slot is free, and the slot is handed back as soon as that
+    job's research is done, so jobs enter the pipeline staggered: while some
+    search, others are writing or rendering.
+
+    Every store call commits to SQLite, so it runs on the blocking I/O pool. Without
+    a ``store`` one is opened at JOB_DB_PATH when the queue starts.
+    """
+
+    def __init__(self, store: Optional[JobStore], runner: Callable[[dict, StageReporter], Awaitable[dict]],
+                 workers: int = JOB_WORKERS, research_slots: int = JOB_RESEARCH_SLOTS):
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        self.research_slots = max(1, min(research_slots, workers))
+        self._queue = None
+        self._slots = None
+        self._sequence = itertools.count()
+        self._tasks = []
+        self._reporters = OrderedDict()  # job id -> StageReporter
+        self._writes = set()  # store updates scheduled from event listeners
+        self.running = 0
+
+    def reporter(self, job_id: str) -> Optional[StageReporter]:
+        return self._reporters.get(job_id)
+
+    def _track_reporter(self, job_id: str) -> StageReporter:
+        reporter = self._reporters.get(job_id)
+        if reporter is None:
+            reporter = StageReporter()
+            self._reporters[job_id] = reporter
+            while len(self._reporters) > MAX_TRACKED_REPORTERS:
+                oldest_id, oldest = next(iter(self._reporters.items()))
+                if not oldest.closed:
+                    break
+                del self._reporters[oldest_id]
+        return reporter
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._slots = asyncio.Semaphore(self.research_slots)
+        if self.store is None:
+            self.store = await run_blocking_io(JobStore, JOB_DB_PATH)
+        recovered = await run_blocking_io(self.store.recover)
+        for job_id, priority in recovered:
+            self._track_reporter(job_id).emit("job", "queued")
+            self._enqueue(job_id, priority)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} queued jobs from {self.store.path}")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Job queue started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _enqueue(self, job_id: str, priority: int):
+        self._queue.put_nowait((-priority, next(self._sequence), job_id))
+
+    async def submit(self, topic: str, priority: int = 0, kind: str = BOOK, params: dict = None) -> dict:
+        job = await run_blocking_io(self.store.create, topic, priority, kind, params)
+        self._track_reporter(job["job_id"]).emit("job", "queued")
+        self._enqueue(job["job_id"], priority)
+        logger.info(f"Queued {kind} job {job['job_id']} for topic: {topic}")
+        return job
+
+    async def submit_batch(self, topics: list, name: str = None, context: str = None) -> dict:
+        """Queue one job per ``(topic, priority)`` under a new batch and return the batch"""
+        batch = await run_blocking_io(self.store.create_batch, topics, name=name, context=context)
+        for job in batch["jobs"]:
+            self._track_reporter(job["job_id"]).emit("job", "queued", batch_id=batch["batch_id"])
+            self._enqueue(job["job_id"], job["priority"])
+        logger.info(f"Queued batch {batch['batch_id']} with {len(batch['jobs'])} jobs")
+        return batch
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _on_preview(self, job_id: str, record: dict):
+        """Persist the preview as soon as it is published so pollers see it before the PDF lands.
+
+        Listeners run inside ``emit`` on the event loop, so the write is scheduled, not done here.
+        """
+        if record["stage"] == "preview" and record["event"] == "finished" and record.get("preview_path"):
+            write = asyncio.ensure_future(run_blocking_io(self.store.set_preview, job_id, record["preview_path"]))
+            self._writes.add(write)
+            write.add_done_callback(self._write_done)
+
+    def _write_done(self, write: asyncio.Future):
+        self._writes.discard(write)
+        if not write.cancelled() and write.exception() is not None:
+            logger.warning(f"Could not save job preview: {write.exception()}")
+
+    async def _worker(self, index: int):
+        while True:
+            # Wait for a research slot first so the job taken is the best one at the moment it can start
+            await self._slots.acquire()
+            slot = _ResearchSlot(self._slots)
+            try:
+                _, _, job_id = await self._queue.get()
+            except BaseException:
+                slot.release()
+                raise
+            try:
+                job = await run_blocking_io(self.store.get, job_id)
+                if job is None or job["status"] != QUEUED:
+                    continue
+                await run_blocking_io(self.store.mark_running, job_id)
+                reporter = self._track_reporter(job_id)
+                reporter.subscribe(slot.on_event)
+                reporter.subscribe(lambda record, job_id=job_id: self._on_preview(job_id, record))
+                reporter.emit("job", "running")
+                logger.info(f"Worker {index} running job {job_id} ({job['topic']})")
+                self.running += 1
+                try:
+                    result = await self.runner(job, reporter)
+                except asyncio.CancelledError:
+                    # Shutdown mid-job: leave it running so recover() requeues it next start
+                    raise
+                except Exception as e:
+                    logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+                    await run_blocking_io(self.store.mark_failed, job_id, str(e))
+                    reporter.close(FAILED, error=str(e))
+                else:
+                    await run_blocking_io(self.store.mark_succeeded, job_id, result)
+                    reporter.close(SUCCEEDED, result=result)
+                    logger.info(f"Job {job_id} succeeded: {result.get('filename')}")
+                finally:
+                    self.running -= 1
+            finally:
+                slot.release()
+                self._queue.task_done()
+
+
+class _ResearchSlot:
+    """A job's hold on a research slot, given back once, when its research stage ends"""
+
+    RESEARCH_DONE = {
+        ("search", "finished"),
+        ("search", "failed"),
+        ("research", "resumed"),
+        ("generation", "reused"),
+        ("generation", "joined"),
+    }
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self._semaphore = semaphore
+        self._held = True
+
+    def on_event(self, record: dict):
+        if (record["stage"], record["event"]) in self.RESEARCH_DONE:
+            self.release()
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._semaphore.release()
@@ -0,0 +1,93 @@
+import os
+from typing import Optional
+
+BLOCK_SIZE = 8192
+MAX_READ_BYTES = 256 * 1024  # cap per call so one request never reads an unbounded backlog
+
+
+def _file_id(stat: os.stat_result) -> str:
+    return f"{stat.st_dev}-{stat.st_ino}"
+
+
+def _parse_cursor(cursor: Optional[str]):
+    """Cursors look like '<file id>:<byte offset>'; anything else means 'start from the tail'"""
+    if not cursor or ":" not in cursor:
+        return None, None
+    file_id, _, offset = cursor.rpartition(":")
+    try:
+        return file_id, int(offset)
+    except ValueError:
+        return None, None
+
+
+def _read_last_lines(f, size: int, lines: int) -> bytes:
+    """Read backwards from the end of the file in blocks until enough newlines are seen"""
+    data = b""
+    position = size
+    while position > 0 and data.count(b"\n") <= lines and len(data) < MAX_READ_BYTES:
+        step = min(BLOCK_SIZE, position)
+        position -= step
+        f.seek(position)
+        data = f.read(step) + data
+    chunk = data.splitlines(keepends=True)
+    # Drop a trailing partial line; it will be returned once it is complete
+    if chunk and not chunk[-1].endswith(b"\n"):
+        chunk = chunk[:-1]
+    return b"".join(chunk[-lines:]) if lines > 0 else b""
+
+
+def tail_log(path: str, cursor: Optional[str] = None, lines: int = 100) -> dict:
+    """Return log lines written since ``cursor`` plus a cursor for the next call.
+
+    Without a cursor the last ``lines`` lines are returned. A cursor from a rotated or
+    truncated file restarts at the beginning of the new file, so nothing written since
+    the rotation is skipped; ``more`` pages through the rest. Cost depends on the amount
+    of new data, not on log size.
+    """
+    stat = os.stat(path)
+    file_id = _file_id(stat)
+    size = stat.st_size
+    cursor_file_id, offset = _parse_cursor(cursor)
+    rotated = cursor_file_id is not None and (cursor_file_id != file_id or offset > size)
+    if rotated:
+        offset = 0
+
+    with open(path, "rb") as f:
+        if cursor_file_id is None:
+            data = _read_last_lines(f, size, lines)
+            # The cursor points just past the last complete line we returned
+            end = _complete_lines_end(f, size)
+            more = False
+        else:
+            f.seek(offset)
+            chunk = f.read(min(size - offset, MAX_READ_BYTES))
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            new_lines = complete.splitlines(keepends=True)
+            if len(new_lines) > lines:
+                new_lines = new_lines[:lines]
+            data = b"".join(new_lines)
+            end = offset + len(data)
+            more = end < offset + len(complete) or offset + len(chunk) < size
+
+    log_lines = [line.rstrip("\r\n") for line in data.decode("utf-8", errors="replace").splitlines()]
+    return {
+        "logs": log_lines,
+        "showing": len(log_lines),
+        "cursor": f"{file_id}:{end}",
+        "rotated": rotated,
+        "more": more,
+    }
+
+
+def _complete_lines_end(f, size: int) -> int:
+    """Offset just after the last newline in the file, scanning back from the end"""
+    position = size
+    while position > 0:
+        step = min(BLOCK_SIZE, position)
+        position -= step
+        f.seek(position)
+        block = f.read(step)
+        newline = block.rfind(b"\n")
+        if newline != -1:
+            return position + newline + 1
+    return 0
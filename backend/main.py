@@ -1,13 +1,35 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import os
+import json
 import asyncio
 import logging
+from typing import List, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime
 from dotenv import load_dotenv
-from backend.agents.workflow import EbookWorkflow
+from backend.agents.workflow import get_workflow, close_workflows
+from backend.agents.clients import start_warm_up
+from backend.agents.execution import shutdown_executors
+from backend.agents.svg_cache import get_svg_cache
+from backend.agents.research_cache import get_research_cache
+from backend.agents.singleflight import GenerationCoalescer
+from backend.agents.checkpoints import CheckpointStore
+from backend.agents.render_pool import get_render_pool
+from backend.agents.artifact_store import PDF, PREVIEW, MEDIA_TYPES, artifact_version, download_url, get_artifact_store
+from backend.agents.fragment_cache import get_chapter_cache
+from backend.agents.pdf_agent import OUTPUT_DIR
+from backend.agents.preview_agent import PREVIEW_DIR
+from backend.agents.execution import run_cpu, run_blocking_io
+from backend.agents.metrics import ARTIFACT_BYTES, GENERATIONS_IN_FLIGHT, JOBS_QUEUED, JOBS_RUNNING, render_metrics
+from backend.jobs import (
+    JobQueue, SUCCEEDED, FAILED, CHAPTER, BATCH_MAX_TOPICS,
+    parse_topics_csv, summarize_batch, batch_manifest,
+)
+from backend.log_tail import tail_log
+from backend.downloads import IMMUTABLE, REVALIDATE, SANDBOXED_HTML_HEADERS, SandboxedStaticFiles, serve_file
 
 load_dotenv(dotenv_path="backend/.env")
 
@@ -18,10 +40,56 @@ logging.basicConfig(
     handlers=[
         logging.FileHandler('backend/ebook_generator.log'),
         logging.StreamHandler()
-    ]
+    ],
+    force=True  # agents call basicConfig at import time, which would otherwise win
 )
 
-app = FastAPI()
+# Concurrent requests for the same topic share one pipeline run
+coalescer = GenerationCoalescer()
+
+async def _run_workflow(api_key: str, topic: str, reporter=None, job_id: str = None, context: str = None) -> dict:
+    return await get_workflow(api_key).run(topic, reporter=reporter, job_id=job_id, context=context)
+
+async def _run_job(job: dict, reporter) -> dict:
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise Exception("API Key not configured on server.")
+    if job["kind"] == CHAPTER:
+        # Regenerations of one book are serialized by the workflow, not coalesced
+        params = job["params"]
+        return await get_workflow(api_key).regenerate_chapter(params["book_id"], params["index"], reporter)
+    context = await run_blocking_io(job_queue.store.batch_context, job["batch_id"]) if job["batch_id"] else None
+    return await coalescer.run(
+        job["topic"],
+        lambda: _run_workflow(api_key, job["topic"], reporter, job["job_id"], context),
+        reporter=reporter,
+        context=context,
+    )
+
+# The job database is opened when the queue starts, not when this module is imported
+job_queue = JobQueue(None, _run_job)
+
+JOBS_QUEUED.set_function(job_queue.pending)
+JOBS_RUNNING.set_function(lambda: job_queue.running)
+GENERATIONS_IN_FLIGHT.set_function(coalescer.in_flight)
+ARTIFACT_BYTES.set_function(lambda: get_artifact_store().total_bytes())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Import the model, search and scraping libraries in the background while we start serving
+    start_warm_up()
+    CheckpointStore().prune()
+    # Forget books deleted by hand and index any written before the artifact store existed
+    await run_cpu(get_artifact_store().reconcile, {OUTPUT_DIR: PDF, PREVIEW_DIR: PREVIEW})
+    get_render_pool().start()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await close_workflows()
+    get_render_pool().shutdown()
+    shutdown_executors()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,8 +102,24 @@ app.add_middleware(
 class GenerateRequest(BaseModel):
     topic: str
 
-# Mount static directory for serving generated PDFs
-app.mount("/static", StaticFiles(directory="backend/static"), name="static")
+class JobRequest(GenerateRequest):
+    priority: int = 0  # higher runs sooner
+
+class RegenerateRequest(BaseModel):
+    priority: int = 0
+
+class BatchTopic(BaseModel):
+    topic: str
+    priority: int = 0
+
+class BatchRequest(BaseModel):
+    topics: List[BatchTopic] = []
+    csv: Optional[str] = None  # "topic,priority" rows, alternative to `topics`
+    name: Optional[str] = None
+    context: Optional[str] = None  # subject shared by the topics, researched once for all of them
+
+# Mount static directory for serving generated PDFs (and previews, sandboxed)
+app.mount("/static", SandboxedStaticFiles(directory="backend/static"), name="static")
 
 @app.post("/api/generate")
 async def generate_ebook(request: GenerateRequest):
@@ -46,35 +130,239 @@ async def generate_ebook(request: GenerateRequest):
     logger = logging.getLogger(__name__)
     logger.info(f"Starting ebook generation for topic: {request.topic}")
     
-    workflow = EbookWorkflow(api_key)
     try:
-        result = await workflow.run(request.topic)
+        result = await coalescer.run(request.topic, lambda: _run_workflow(api_key, request.topic))
         logger.info(f"Ebook generation completed successfully: {result.get('filename')}")
         return result
     except Exception as e:
         logger.error(f"Ebook generation failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """Queue an ebook generation and return its job id immediately."""
+    if not os.getenv("GEMINI_API_KEY"):
+        raise HTTPException(status_code=500, detail="API Key not configured on server.")
+    job = await job_queue.submit(request.topic, request.priority)
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@app.post("/api/batches", status_code=202)
+async def submit_batch(request: BatchRequest):
+    """Queue one job per topic, given as a list or as CSV, and return the batch id immediately."""
+    if not os.getenv("GEMINI_API_KEY"):
+        raise HTTPException(status_code=500, detail="API Key not configured on server.")
+    topics = [(item.topic.strip(), item.priority) for item in request.topics if item.topic.strip()]
+    if request.csv:
+        try:
+            topics += parse_topics_csv(request.csv)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not topics:
+        raise HTTPException(status_code=400, detail="No topics given.")
+    if len(topics) > BATCH_MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_TOPICS} topics per batch.")
+    batch = await job_queue.submit_batch(topics, name=request.name, context=request.context)
+    return {
+        "batch_id": batch["batch_id"],
+        "total": len(batch["jobs"]),
+        "jobs": [{"job_id": job["job_id"], "topic": job["topic"], "priority": job["priority"]} for job in batch["jobs"]],
+    }
+
+@app.get("/api/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    """Batch progress: job counts by status, fraction done and estimated time remaining."""
+    batch = await run_blocking_io(job_queue.store.get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return summarize_batch(batch)
+
+@app.get("/api/batches/{batch_id}/manifest")
+async def get_batch_manifest(batch_id: str):
+    """Every topic in the batch with its status and PDF (or error)."""
+    batch = await run_blocking_io(job_queue.store.get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch_manifest(batch)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_blocking_io(job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await run_blocking_io(job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job["result"]
+
+@app.get("/api/jobs/{job_id}/preview")
+async def get_job_preview(job_id: str):
+    """The book as HTML, available once formatting is done and before the PDF is rendered."""
+    job = await run_blocking_io(job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    preview_path = job["preview_path"]
+    if not preview_path or not os.path.exists(os.path.join("backend", preview_path)):
+        raise HTTPException(status_code=409, detail=f"No preview yet; job is {job['status']}")
+    return FileResponse(os.path.join("backend", preview_path), media_type="text/html", headers=SANDBOXED_HTML_HEADERS)
+
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Server-sent events with per-stage progress for a job.
+
+    Each event's `data` is a JSON object with `stage`, `event`, timings and
+    stage-specific fields. Reconnecting clients resume via `Last-Event-ID`.
+    """
+    job = await run_blocking_io(job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    reporter = job_queue.reporter(job_id)
+    last_event_id = request.headers.get("last-event-id")
+    index = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    async def event_stream():
+        nonlocal index
+        if reporter is None:
+            # Progress of jobs from before a restart is gone; report the final state only
+            yield f"data: {json.dumps({'stage': 'job', 'event': job['status'], 'error': job['error'], 'result': job['result']})}\n\n"
+            return
+        while not await request.is_disconnected():
+            events = await reporter.wait_for_events(index, timeout=SSE_KEEPALIVE_SECONDS)
+            if not events:
+                if reporter.closed:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+                index = event["seq"] + 1
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/books")
+async def find_books(topic: str, limit: int = 20):
+    """Books already generated for a topic (case and whitespace insensitive), newest first."""
+    books = await run_blocking_io(get_artifact_store().find, topic, PDF, limit)
+    return {"books": [dict(book, download_url=download_url(book)) for book in books]}
+
+async def _book_source(book_id: str) -> dict:
+    store = get_artifact_store()
+    book = await run_blocking_io(store.get, book_id)
+    if book is None or book["kind"] != PDF:
+        raise HTTPException(status_code=404, detail="Book not found")
+    source = await run_blocking_io(store.load_source, book_id)
+    if source is None:
+        raise HTTPException(status_code=409, detail="This book was generated without a stored source and cannot be edited")
+    return source
+
+@app.get("/api/books/{book_id}/chapters")
+async def list_chapters(book_id: str):
+    """The book's chapters in order, with the indexes used to regenerate them."""
+    source = await _book_source(book_id)
+    return {
+        "book_id": book_id,
+        "title": source["title"],
+        "chapters": [{"index": i, "title": section.get("title", "")} for i, section in enumerate(source["sections"])],
+    }
+
+@app.post("/api/books/{book_id}/chapters/{index}/regenerate", status_code=202)
+async def regenerate_chapter(book_id: str, index: int, request: RegenerateRequest = RegenerateRequest()):
+    """Queue a rewrite of one chapter of a generated book and return its job id immediately.
+
+    The job replaces the PDF in place; unchanged chapters are neither converted nor laid
+    out again. The book keeps its id, and the job result carries the new `download_url`.
+    """
+    if not os.getenv("GEMINI_API_KEY"):
+        raise HTTPException(status_code=500, detail="API Key not configured on server.")
+    source = await _book_source(book_id)
+    if not 0 <= index < len(source["sections"]):
+        raise HTTPException(status_code=404, detail=f"Book has no chapter {index}")
+    job = await job_queue.submit(source["topic"], request.priority, CHAPTER, {"book_id": book_id, "index": index})
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@app.get("/api/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str):
+    artifact = await run_blocking_io(get_artifact_store().get, artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return dict(artifact, download_url=download_url(artifact))
+
+@app.api_route("/api/artifacts/{artifact_id}/download", methods=["GET", "HEAD"])
+async def download_artifact(artifact_id: str, request: Request):
+    """Send a book or preview with a strong ETag, `If-None-Match` (304) and byte-range (206) support."""
+    # The index is SQLite behind one lock; its reads and writes stay off the event loop
+    store = get_artifact_store()
+    artifact = await run_blocking_io(store.get, artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    # A versioned book link names these exact bytes; anything else may change (retries, regenerated chapters)
+    versioned = artifact["kind"] == PDF and request.query_params.get("v") == artifact_version(artifact)
+    try:
+        response = serve_file(
+            request,
+            artifact["path"],
+            artifact["sha256"],
+            MEDIA_TYPES[artifact["kind"]],
+            # Books download as files; previews open in the browser
+            filename=artifact["filename"] if artifact["kind"] == PDF else None,
+            cache_control=IMMUTABLE if versioned else REVALIDATE,
+        )
+    except FileNotFoundError:
+        await run_blocking_io(store.remove, artifact_id)
+        raise HTTPException(status_code=410, detail="Artifact was deleted")
+    if artifact["kind"] == PREVIEW:
+        response.headers.update(SANDBOXED_HTML_HEADERS)
+    await run_blocking_io(store.touch, artifact_id)
+    return response
+
 @app.get("/api/logs")
-async def get_logs(lines: int = 100):
-    """Get the last N lines from the log file."""
+async def get_logs(lines: int = 100, cursor: Optional[str] = None):
+    """Get log lines written since `cursor`, or the last N lines when no cursor is given.
+
+    Pass the returned `cursor` back on the next call to receive only new lines.
+    """
     log_file = "backend/ebook_generator.log"
     
     if not os.path.exists(log_file):
         return {"logs": [], "message": "No logs available yet"}
     
     try:
-        with open(log_file, 'r') as f:
-            all_lines = f.readlines()
-            recent_logs = all_lines[-lines:] if len(all_lines) > lines else all_lines
-            return {
-                "logs": [line.strip() for line in recent_logs],
-                "total_lines": len(all_lines),
-                "showing": len(recent_logs)
-            }
+        return tail_log(log_file, cursor=cursor, lines=lines)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read logs: {str(e)}")
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the shared generation caches, and disk used by generated books."""
+    # The SVG cache, research cache and artifact index all read disk or SQLite for their stats
+    return {
+        "svg": await run_blocking_io(get_svg_cache().stats),
+        "research": await run_blocking_io(get_research_cache().stats),
+        "chapters": get_chapter_cache().stats(),
+        "render_fragments": get_render_pool().stats(),
+        "artifacts": await run_blocking_io(get_artifact_store().stats),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: stage latencies, retries, fallbacks, cache hits, model usage and job gauges."""
+    # Some gauges (disk used by artifacts) query SQLite when scraped
+    return PlainTextResponse(await run_blocking_io(render_metrics), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def read_root():
     return {"message": "AI Ebook Generator API. Frontend runs on port 3000."}
@@ -2,7 +2,9 @@ from mcp.server.fastmcp import FastMCP
 import os
 import asyncio
 from dotenv import load_dotenv
-from .agents.workflow import EbookWorkflow
+from .agents.workflow import get_workflow
+from .agents.clients import start_warm_up
+from .jobs import JOB_WORKERS
 
 # Load environment variables
 load_dotenv(dotenv_path="backend/.env")
@@ -25,10 +27,9 @@ async def generate_ebook(topic: str) -> str:
     if not api_key:
         return "Error: GEMINI_API_KEY not found in environment variables."
 
-    workflow = EbookWorkflow(api_key)
     try:
-        # Run the workflow
-        result = await workflow.run(topic)
+        # Run the workflow (agents and clients are shared across calls in this session)
+        result = await get_workflow(api_key).run(topic)
         
         # Return a user-friendly message
         pdf_path = result.get("pdf_path")
@@ -37,6 +38,60 @@ async def generate_ebook(topic: str) -> str:
     except Exception as e:
         return f"Error generating ebook: {str(e)}"
 
+@mcp.tool()
+async def generate_ebook_batch(topics: list[str], context: str = "") -> str:
+    """
+    Generates one PDF ebook per topic, several at a time.
+    
+    Args:
+        topics: The subjects to write about, in the order they should be started.
+        context: Optional subject the topics share (e.g. a course name); its research is reused by every book.
+        
+    Returns:
+        One line per topic with the path to its PDF or the error.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return "Error: GEMINI_API_KEY not found in environment variables."
+
+    workflow = get_workflow(api_key)
+    slots = asyncio.Semaphore(JOB_WORKERS)
+
+    async def generate(topic: str) -> str:
+        async with slots:
+            try:
+                result = await workflow.run(topic, context=context or None)
+                return f"{topic}: backend/{result.get('pdf_path')}"
+            except Exception as e:
+                return f"{topic}: Error: {str(e)}"
+
+    lines = await asyncio.gather(*(generate(topic) for topic in topics))
+    return "\n".join(lines)
+
+@mcp.tool()
+async def regenerate_ebook_chapter(book_id: str, chapter: int) -> str:
+    """
+    Rewrites one chapter of a previously generated ebook and updates its PDF in place.
+    
+    Args:
+        book_id: The id of the generated book (the `book_id` of a generation result).
+        chapter: Index of the chapter to rewrite, starting at 0.
+        
+    Returns:
+        A message with the path to the updated PDF.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return "Error: GEMINI_API_KEY not found in environment variables."
+
+    try:
+        result = await get_workflow(api_key).regenerate_chapter(book_id, chapter)
+        return f"Rewrote chapter '{result['chapter']['title']}'. Updated ebook at: backend/{result['pdf_path']}"
+    except Exception as e:
+        return f"Error regenerating chapter: {str(e)}"
+
 if __name__ == "__main__":
+    # Load the heavy client libraries while the client handshake is in progress
+    start_warm_up()
     # Run the MCP server
     mcp.run()
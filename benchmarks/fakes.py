@@ -0,0 +1,189 @@
+"""Deterministic stand-ins for the model, DuckDuckGo, page fetching and rendering.
+
+Each fake draws its latency from a seeded RNG and fails at a configurable rate,
+so runs with the same settings exercise the same code paths.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+import httpx
+
+
+class FakeProfile:
+    """Latency (mean seconds, jittered +/-50%) and failure rate for one fake dependency"""
+
+    def __init__(self, latency: float, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """Return (delay, should_fail) for one call"""
+        with self._lock:
+            delay = self.latency * self._rng.uniform(0.5, 1.5)
+            fail = self._rng.random() < self.failure_rate
+        return delay, fail
+
+
+def _words(rng: random.Random, count: int) -> str:
+    vocabulary = [
+        "process", "energy", "system", "structure", "signal", "model", "layer", "reaction",
+        "pattern", "network", "cycle", "function", "membrane", "protocol", "circuit", "data",
+        "transfer", "balance", "pressure", "response", "component", "interface", "sequence",
+    ]
+    return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+
+class FakeQuotaError(Exception):
+    """Shaped like the API's quota error so injected failures go through the scheduler's backoff"""
+    code = 429
+
+
+class FakeModel:
+    """Replacement for ``genai.GenerativeModel`` answering the analyst and image prompts"""
+
+    def __init__(self, profile: FakeProfile, chapters: int = 6, images_per_chapter: int = 1):
+        self.profile = profile
+        self.chapters = chapters
+        self.images_per_chapter = images_per_chapter
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, **kwargs):
+        self.calls += 1
+        delay, fail = self.profile.draw()
+        await asyncio.sleep(delay)
+        if fail:
+            raise FakeQuotaError("Injected model failure")
+
+        rng = random.Random(prompt)
+        if "SVG diagram" in prompt:
+            text = self._svg(rng)
+        elif "writing one chapter" in prompt:
+            text = json.dumps({"content": self._chapter(rng, prompt)})
+        elif "Plan a comprehensive" in prompt:
+            text = json.dumps({
+                "title": "Benchmark Book",
+                "author": "Benchmark",
+                "sections": [{"title": f"Chapter {i + 1}", "summary": _words(rng, 20)} for i in range(self.chapters)],
+            })
+        else:
+            text = json.dumps({
+                "title": "Benchmark Book",
+                "author": "Benchmark",
+                "sections": [
+                    {"title": f"Chapter {i + 1}", "content": self._chapter(rng, f"{prompt}{i}")}
+                    for i in range(self.chapters)
+                ],
+            })
+
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        if stream:
+            return _FakeStream(text, usage)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _chapter(self, rng: random.Random, seed: str) -> str:
+        paragraphs = [_words(rng, 80) for _ in range(4)]
+        for i in range(self.images_per_chapter):
+            paragraphs.insert(1 + i, f"[IMAGE: diagram {zlib.crc32(seed.encode()) % 100000} {i}]")
+        return "## Overview\n\n" + "\n\n".join(paragraphs)
+
+    def _svg(self, rng: random.Random) -> str:
+        shapes = "".join(
+            f'<rect x="{rng.uniform(0, 500):.6f}" y="{rng.uniform(0, 300):.6f}" width="80" height="40" fill="#3b82f6"/>'
+            f'<text x="{rng.uniform(0, 500):.6f}" y="{rng.uniform(0, 300):.6f}" font-family="Arial">{_words(rng, 2)}</text>'
+            for _ in range(12)
+        )
+        return f'```svg\n<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 600 400" width="600" height="400"><!-- generated -->{shapes}</svg>\n```'
+
+
+class _FakeStream:
+    """Async iterator over a response in small chunks, like a streamed Gemini reply"""
+
+    def __init__(self, text: str, usage, chunk_size: int = 400):
+        self.text = text
+        self.usage_metadata = usage
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(0)
+            yield SimpleNamespace(text=chunk)
+
+
+class FakeDDGS:
+    """Replacement for ``duckduckgo_search.DDGS``; called from the blocking I/O pool"""
+
+    profile = FakeProfile(0.3)
+
+    def text(self, topic: str, max_results: int = 5):
+        delay, fail = self.profile.draw()
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("Injected search failure")
+        slug = re.sub(r"\W+", "-", topic.casefold()).strip("-") or "topic"
+        return [{"href": f"https://{slug}-{i}.bench.invalid/article"} for i in range(max_results)]
+
+
+def page_transport(profile: FakeProfile) -> httpx.MockTransport:
+    """HTTP transport serving generated article pages after a simulated network delay"""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        delay, fail = profile.draw()
+        await asyncio.sleep(delay)
+        if fail:
+            return httpx.Response(503, text="Service Unavailable")
+        rng = random.Random(str(request.url))
+        body = "".join(f"<p>{_words(rng, 60)}</p>" for _ in range(30))
+        html = f"<html><body><nav>Home | About</nav><h1>{request.url.host}</h1>{body}<footer>Contact</footer></body></html>"
+        return httpx.Response(200, text=html, headers={"Content-Type": "text/html"})
+
+    return httpx.MockTransport(handler)
+
+
+class FakeRenderPool:
+    """In-process replacement for the WeasyPrint render pool writing a minimal PDF"""
+
+    def __init__(self, profile: FakeProfile):
+        self.profile = profile
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    async def render(self, html_content: str, filepath: str) -> str:
+        delay, fail = self.profile.draw()
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("Injected render failure")
+        with open(filepath, "wb") as f:
+            f.write(minimal_pdf(padding=len(html_content) // 4))
+        return filepath
+
+
+def minimal_pdf(pages: int = 1, padding: int = 0) -> bytes:
+    """A structurally valid PDF (classic xref table) of ``pages`` blank pages, padded with a comment"""
+    kids = " ".join(f"{3 + i} 0 R" for i in range(pages))
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode()]
+    objects += [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>"] * pages
+    out = bytearray(b"%PDF-1.7\n% benchmark placeholder " + b"0" * padding + b"\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
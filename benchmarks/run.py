@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Offline pipeline benchmark.
+
+Drives EbookWorkflow (or the FastAPI job or batch API) at increasing concurrency with the
+model, DuckDuckGo and page fetching replaced by deterministic fakes, and writes
+throughput, per-stage latency percentiles and peak memory to a JSON file.
+
+    python -m benchmarks.run --concurrency 1,2,4,8
+    python -m benchmarks.run --mode api --model-latency 2 --model-failure-rate 0.05
+    python -m benchmarks.run --mode batch --concurrency 20 --workers 8
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from functools import partial
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Stages reported by StageReporter with a duration, in pipeline order
+STAGES = ("search", "scrape", "analysis", "image", "images", "format", "preview", "render", "verify")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ebook pipeline against deterministic fakes")
+    parser.add_argument("--mode", choices=("workflow", "api", "batch"), default="workflow",
+                        help="call EbookWorkflow directly, submit jobs through the FastAPI app, "
+                             "or submit each level as one batch")
+    parser.add_argument("--concurrency", default="1,2,4", help="comma-separated concurrent job counts")
+    parser.add_argument("--workers", type=int,
+                        help="job queue workers in api and batch modes (default: the largest level)")
+    parser.add_argument("--rounds", type=int, default=1, help="batches of concurrent jobs per level")
+    parser.add_argument("--chapters", type=int, default=6)
+    parser.add_argument("--images-per-chapter", type=int, default=1)
+    parser.add_argument("--model-latency", type=float, default=0.5, help="mean seconds per model call")
+    parser.add_argument("--model-failure-rate", type=float, default=0.0)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--fetch-latency", type=float, default=0.2)
+    parser.add_argument("--fetch-failure-rate", type=float, default=0.0)
+    parser.add_argument("--real-render", action="store_true",
+                        help="render with the WeasyPrint pool instead of a fake renderer")
+    parser.add_argument("--render-latency", type=float, default=0.5, help="mean seconds per fake render")
+    parser.add_argument("--render-failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>-<mode>.json)")
+    parser.add_argument("--compare", help="earlier result file to print deltas against")
+    parser.add_argument("--keep-pdfs", action="store_true", help="keep the PDFs and previews written to backend/static")
+    return parser.parse_args(argv)
+
+
+def percentile(values, fraction: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return round(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower), 4)
+
+
+def summarize(values) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p99": percentile(values, 0.99),
+        "max": round(max(values), 4) if values else None,
+    }
+
+
+def stage_durations(events) -> dict:
+    durations = {}
+    for event in events:
+        if event.get("event") == "finished" and "duration" in event and event["stage"] in STAGES:
+            durations.setdefault(event["stage"], []).append(event["duration"])
+    return durations
+
+
+def time_to_preview(events):
+    """Seconds from the start of the run until the HTML preview was published"""
+    for event in events:
+        if event.get("stage") == "preview" and event.get("event") == "finished":
+            return event["elapsed"]
+    return None
+
+
+def peak_rss() -> dict:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def install_fakes(args, stack: AsyncExitStack):
+    """Patch the model, search, HTTP and (optionally) rendering with deterministic fakes"""
+    import httpx
+    import google.generativeai as genai
+    from benchmarks import fakes
+    import duckduckgo_search
+    from backend.agents import pdf_agent, search_agent
+
+    model = fakes.FakeModel(
+        fakes.FakeProfile(args.model_latency, args.model_failure_rate, args.seed),
+        chapters=args.chapters,
+        images_per_chapter=args.images_per_chapter,
+    )
+    fakes.FakeDDGS.profile = fakes.FakeProfile(args.search_latency, args.search_failure_rate, args.seed + 1)
+    transport = fakes.page_transport(fakes.FakeProfile(args.fetch_latency, args.fetch_failure_rate, args.seed + 2))
+
+    stack.enter_context(mock.patch.object(genai, "configure", lambda **kwargs: None))
+    stack.enter_context(mock.patch.object(genai, "GenerativeModel", lambda *a, **k: model))
+    stack.enter_context(mock.patch.object(duckduckgo_search, "DDGS", fakes.FakeDDGS))
+    stack.enter_context(mock.patch.object(search_agent.httpx, "AsyncClient", partial(httpx.AsyncClient, transport=transport)))
+    if not args.real_render:
+        pool = fakes.FakeRenderPool(fakes.FakeProfile(args.render_latency, args.render_failure_rate, args.seed + 3))
+        stack.enter_context(mock.patch.object(pdf_agent, "get_render_pool", lambda: pool))
+    return model, pdf_agent.get_render_pool
+
+
+async def run_workflow_jobs(topics) -> list:
+    from backend.agents.events import StageReporter
+    from backend.agents.workflow import EbookWorkflow
+
+    async def one(topic):
+        reporter = StageReporter()
+        workflow = EbookWorkflow("benchmark")
+        start = time.monotonic()
+        try:
+            result = await workflow.run(topic, reporter=reporter)
+            error = None
+        except Exception as e:
+            result, error = None, str(e)
+        finally:
+            await workflow.aclose()
+        return {"latency": time.monotonic() - start, "result": result, "error": error, "events": reporter.events}
+
+    return await asyncio.gather(*(one(topic) for topic in topics))
+
+
+async def run_api_jobs(client, job_queue, topics) -> list:
+    async def one(topic):
+        response = await client.post("/api/jobs", json={"topic": topic})
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while True:
+            job = (await client.get(f"/api/jobs/{job_id}")).json()
+            if job["status"] in ("succeeded", "failed"):
+                break
+            await asyncio.sleep(0.05)
+        reporter = job_queue.reporter(job_id)
+        return {
+            "latency": job["finished_at"] - job["created_at"],
+            "result": job["result"],
+            "error": job["error"],
+            "events": reporter.events if reporter else [],
+        }
+
+    return await asyncio.gather(*(one(topic) for topic in topics))
+
+
+async def run_batch_jobs(client, job_queue, topics) -> list:
+    response = await client.post(
+        "/api/batches",
+        json={"topics": [{"topic": topic} for topic in topics], "context": "Benchmark course"},
+    )
+    response.raise_for_status()
+    batch_id = response.json()["batch_id"]
+    while not (await client.get(f"/api/batches/{batch_id}")).json()["finished"]:
+        await asyncio.sleep(0.05)
+    batch = job_queue.store.get_batch(batch_id)
+    runs = []
+    for job in batch["jobs"]:
+        reporter = job_queue.reporter(job["job_id"])
+        runs.append({
+            "latency": job["finished_at"] - job["created_at"],
+            "result": job["result"],
+            "error": job["error"],
+            "events": reporter.events if reporter else [],
+        })
+    return runs
+
+
+def level_report(concurrency: int, runs: list, wall: float) -> dict:
+    succeeded = [run for run in runs if run["error"] is None]
+    stages = {}
+    for run in runs:
+        for stage, durations in stage_durations(run["events"]).items():
+            stages.setdefault(stage, []).extend(durations)
+    return {
+        "concurrency": concurrency,
+        "jobs": len(runs),
+        "succeeded": len(succeeded),
+        "failed": len(runs) - len(succeeded),
+        "errors": sorted({run["error"] for run in runs if run["error"]}),
+        "wall_seconds": round(wall, 3),
+        "throughput_jobs_per_minute": round(len(succeeded) / wall * 60, 3) if wall else None,
+        "job_latency": summarize([run["latency"] for run in succeeded]),
+        "time_to_preview": summarize([t for t in (time_to_preview(run["events"]) for run in succeeded) if t is not None]),
+        "stages": {stage: summarize(stages[stage]) for stage in STAGES if stage in stages},
+        "pdf_render": summarize(stages.get("render", [])),
+        "peak_rss": peak_rss(),
+    }
+
+
+async def benchmark(args) -> list:
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    reports = []
+    async with AsyncExitStack() as stack:
+        model, get_render_pool = install_fakes(args, stack)
+        if args.mode in ("api", "batch"):
+            import httpx
+            from backend import main
+            stack.enter_context(mock.patch.object(main, "get_render_pool", get_render_pool))
+            main.job_queue.workers = args.workers or max(levels)
+            main.job_queue.research_slots = max(1, main.job_queue.workers // 2)
+            await stack.enter_async_context(main.app.router.lifespan_context(main.app))
+            client = await stack.enter_async_context(
+                httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark")
+            )
+            runner = partial(run_batch_jobs if args.mode == "batch" else run_api_jobs, client, main.job_queue)
+        else:
+            runner = run_workflow_jobs
+
+        for concurrency in levels:
+            for round_index in range(args.rounds):
+                topics = [f"Benchmark topic {concurrency}-{round_index}-{i}" for i in range(concurrency)]
+                calls_before = model.calls
+                start = time.monotonic()
+                runs = await runner(topics)
+                wall = time.monotonic() - start
+                report = level_report(concurrency, runs, wall)
+                report["round"] = round_index
+                report["model_calls"] = model.calls - calls_before
+                reports.append(report)
+                print(
+                    f"concurrency={concurrency} round={round_index}: {report['succeeded']}/{report['jobs']} ok, "
+                    f"{report['throughput_jobs_per_minute']} jobs/min, "
+                    f"p50={report['job_latency']['p50']}s p99={report['job_latency']['p99']}s, "
+                    f"preview p50={report['time_to_preview']['p50']}s"
+                )
+                if not args.keep_pdfs:
+                    for run in runs:
+                        for path in ((run["result"] or {}).get("pdf_path"), (run["result"] or {}).get("preview_path")):
+                            if path:
+                                try:
+                                    os.remove(os.path.join(ROOT, "backend", path))
+                                except OSError:
+                                    pass
+    return reports
+
+
+def compare(current: dict, previous: dict):
+    previous_levels = {(r["concurrency"], r.get("round", 0)): r for r in previous["levels"]}
+    print(f"\nCompared with {previous.get('started_at')} ({previous.get('git_commit')}):")
+    for report in current["levels"]:
+        before = previous_levels.get((report["concurrency"], report.get("round", 0)))
+        if before is None:
+            continue
+        line = [f"concurrency={report['concurrency']}"]
+        for label, now, then in (
+            ("jobs/min", report["throughput_jobs_per_minute"], before["throughput_jobs_per_minute"]),
+            ("p50", report["job_latency"]["p50"], before["job_latency"]["p50"]),
+            ("p99", report["job_latency"]["p99"], before["job_latency"]["p99"]),
+        ):
+            if now is not None and then:
+                line.append(f"{label} {then} -> {now} ({(now - then) / then:+.1%})")
+        print("  " + ", ".join(line))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    # Keep benchmark state out of the real caches, checkpoints, job database and artifact index;
+    # the scratch tree is removed once the run is over
+    scratch = tempfile.mkdtemp(prefix="ebook-bench-")
+    os.environ["EBOOK_RESEARCH_CACHE_PATH"] = os.path.join(scratch, "research.sqlite3")
+    os.environ["EBOOK_SVG_CACHE_DIR"] = os.path.join(scratch, "svg")
+    os.environ["EBOOK_CHECKPOINT_DIR"] = os.path.join(scratch, "checkpoints")
+    os.environ["EBOOK_JOB_DB_PATH"] = os.path.join(scratch, "jobs.sqlite3")
+    os.environ["EBOOK_ARTIFACT_DB_PATH"] = os.path.join(scratch, "artifacts.sqlite3")
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+    try:
+        # The agents and the server configure logging at import; keep benchmark runs quiet
+        # and out of the server's log file
+        import backend.agents.workflow  # noqa: F401
+        if args.mode in ("api", "batch"):
+            import backend.main  # noqa: F401
+        root_logger = logging.getLogger()
+        for handler in [h for h in root_logger.handlers if isinstance(h, logging.FileHandler)]:
+            root_logger.removeHandler(handler)
+        root_logger.setLevel(logging.WARNING)
+
+        started_at = datetime.now(timezone.utc)
+        levels = asyncio.run(benchmark(args))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    result = {
+        "started_at": started_at.isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "levels": levels,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{started_at.strftime('%Y%m%dT%H%M%SZ')}-{args.mode}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
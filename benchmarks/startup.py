@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: import time of the server entry points and the cost of the
+first request's workflow construction, each measured in a fresh interpreter.
+
+    python -m benchmarks.startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each probe prints one number of seconds
+PROBES = {
+    "import_backend_main": "import backend.main",
+    "import_workflow": "import backend.agents.workflow",
+    "first_workflow_cold": (
+        "from backend.agents.workflow import get_workflow\n"
+        "start = time.perf_counter()\n"
+        "get_workflow('benchmark')\n"
+    ),
+    "first_workflow_after_warm_up": (
+        "from backend.agents.workflow import get_workflow\n"
+        "from backend.agents.clients import warm_up\n"
+        "warm_up()\n"
+        "start = time.perf_counter()\n"
+        "get_workflow('benchmark')\n"
+    ),
+}
+
+TEMPLATE = """
+import logging, time
+logging.disable(logging.CRITICAL)
+start = time.perf_counter()
+{body}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(body: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", TEMPLATE.format(body=body)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env=dict(os.environ, PYTHONWARNINGS="ignore"),
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure server cold start")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, body in PROBES.items():
+        samples = [measure(body) for _ in range(args.repeat)]
+        results[name] = {"median_seconds": round(statistics.median(samples), 4), "samples": [round(s, 4) for s in samples]}
+        print(f"{name}: {results[name]['median_seconds']}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
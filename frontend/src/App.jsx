@@ -1,4 +1,4 @@
-import { useState } from 'react'
+import { useRef, useState } from 'react'
 import './App.css'
 
 function App() {
@@ -7,9 +7,11 @@ function App() {
   const [currentStep, setCurrentStep] = useState(0)
   const [logs, setLogs] = useState([])
   const [result, setResult] = useState(null)
+  const [previewPath, setPreviewPath] = useState(null)
   const [error, setError] = useState(null)
   const [showServerLogs, setShowServerLogs] = useState(false)
   const [serverLogs, setServerLogs] = useState([])
+  const logCursor = useRef(null)
 
   const steps = [
     'Web Search',
@@ -20,15 +22,33 @@ function App() {
     'Verification'
   ]
 
+  // Pipeline stages reported by the server, mapped to the step list above
+  const stageSteps = {
+    search: 0,
+    analysis: 1,
+    images: 2,
+    format: 3,
+    render: 4,
+    verify: 5
+  }
+
   const addLog = (message) => {
     setLogs(prev => [...prev, `${new Date().toLocaleTimeString()}: ${message}`])
   }
 
   const fetchServerLogs = async () => {
     try {
-      const response = await fetch('/api/logs?lines=50')
+      // Only fetch lines written since the last call; after a rotation the server
+      // continues from the start of the new file, so those lines are appended too
+      const params = new URLSearchParams({ lines: '50' })
+      if (logCursor.current) {
+        params.set('cursor', logCursor.current)
+      }
+      const response = await fetch(`/api/logs?${params}`)
       const data = await response.json()
-      setServerLogs(data.logs || [])
+      const fresh = !logCursor.current
+      logCursor.current = data.cursor || null
+      setServerLogs(prev => (fresh ? (data.logs || []) : [...prev, ...(data.logs || [])]).slice(-200))
     } catch (err) {
       console.error('Failed to fetch server logs:', err)
     }
@@ -51,20 +71,10 @@ function App() {
     setCurrentStep(0)
     setLogs([])
     setResult(null)
+    setPreviewPath(null)
     setError(null)
     addLog('Starting ebook generation...')
 
-    // Simulate progress
-    const progressInterval = setInterval(() => {
-      setCurrentStep(prev => {
-        if (prev < steps.length - 1) {
-          addLog(`Step ${prev + 1}: ${steps[prev]} completed`)
-          return prev + 1
-        }
-        return prev
-      })
-    }, 3000)
-
     // Poll server logs during generation
     const logInterval = setInterval(async () => {
       if (showServerLogs) {
@@ -73,29 +83,64 @@ function App() {
     }, 2000)
 
     try {
-      // Add timeout to fetch
-      const controller = new AbortController()
-      const timeoutId = setTimeout(() => controller.abort(), 600000) // 10 min timeout
-
-      const response = await fetch('/api/generate', {
+      // Submit the job; a worker picks it up and streams its progress back
+      const response = await fetch('/api/jobs', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ topic }),
-        signal: controller.signal
+        body: JSON.stringify({ topic })
       })
 
-      clearTimeout(timeoutId)
-      clearInterval(progressInterval)
-      clearInterval(logInterval)
-
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({ detail: 'Unknown error' }))
         throw new Error(errorData.detail || 'Failed to generate ebook')
       }
 
-      const data = await response.json()
+      const { job_id: jobId } = await response.json()
+      addLog(`Job ${jobId} queued`)
+
+      // Follow per-stage progress over server-sent events until the job finishes
+      const job = await new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/jobs/${jobId}/events`)
+        source.onmessage = (message) => {
+          const event = JSON.parse(message.data)
+          if (event.stage === 'job') {
+            if (event.event === 'succeeded' || event.event === 'failed') {
+              source.close()
+              resolve({ status: event.event, result: event.result, error: event.error })
+            }
+            return
+          }
+          if (event.stage === 'preview' && event.event === 'finished' && event.preview_path) {
+            // The book is readable as HTML while the PDF is still rendering
+            setPreviewPath(event.preview_url || `/${event.preview_path}`)
+            addLog('📖 Preview ready, PDF on its way')
+          }
+          if (event.stage in stageSteps && event.event === 'started') {
+            setCurrentStep(stageSteps[event.stage])
+          }
+          if (event.event === 'finished' && event.duration !== undefined) {
+            const label = event.url || event.description || event.stage
+            addLog(`${label} done in ${event.duration.toFixed(1)}s`)
+          } else if (event.event === 'failed') {
+            addLog(`⚠️ ${event.url || event.description || event.stage} failed`)
+          }
+        }
+        source.onerror = () => {
+          if (source.readyState === EventSource.CLOSED) {
+            reject(new Error('Lost connection to the progress stream'))
+          }
+        }
+      })
+
+      clearInterval(logInterval)
+
+      if (job.status !== 'succeeded') {
+        throw new Error(job.error || 'Failed to generate ebook')
+      }
+
+      const data = job.result
       setResult(data)
       setCurrentStep(steps.length)
       addLog('✅ Ebook generated successfully!')
@@ -105,11 +150,8 @@ function App() {
         await fetchServerLogs()
       }
     } catch (err) {
-      clearInterval(progressInterval)
       clearInterval(logInterval)
-      const errorMessage = err.name === 'AbortError' 
-        ? 'Request timed out. The ebook generation is taking longer than expected.'
-        : err.message
+      const errorMessage = err.message
       setError(errorMessage)
       addLog(`❌ Error: ${errorMessage}`)
     } finally {
@@ -208,12 +250,27 @@ function App() {
           </div>
         )}
 
+        {previewPath && !result && (
+          <div className="result-section">
+            <h3>📖 Preview ready</h3>
+            <p>Read the book now; the PDF is still rendering</p>
+            <a
+              href={`http://localhost:8000${previewPath}`}
+              target="_blank"
+              rel="noopener noreferrer"
+              className="download-btn"
+            >
+              📖 Open preview
+            </a>
+          </div>
+        )}
+
         {result && (
           <div className="result-section">
             <h3>✨ Success!</h3>
             <p>Your ebook is ready</p>
             <a 
-              href={`http://localhost:8000/static/${result.filename}`}
+              href={`http://localhost:8000${result.download_url || `/static/${result.filename}`}`}
               download={result.filename}
               target="_blank"
               rel="noopener noreferrer"
@@ -6,7 +6,8 @@ import asyncio
 import sys
 import os
 
-sys.path.insert(0, '/run/media/lulu/New Volume/Code/Capstone Project- Book Writer/Ag_3')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 from dotenv import load_dotenv
 from backend.agents.workflow import EbookWorkflow
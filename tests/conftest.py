@@ -0,0 +1,37 @@
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# Stores and caches live in a scratch tree so tests never touch backend/data or backend/cache
+SCRATCH = tempfile.mkdtemp(prefix="ebook-tests-")
+for name, value in {
+    "EBOOK_RESEARCH_CACHE_PATH": "research.sqlite3",
+    "EBOOK_SVG_CACHE_DIR": "svg",
+    "EBOOK_CHECKPOINT_DIR": "checkpoints",
+    "EBOOK_JOB_DB_PATH": "jobs.sqlite3",
+    "EBOOK_ARTIFACT_DB_PATH": "artifacts.sqlite3",
+}.items():
+    os.environ[name] = os.path.join(SCRATCH, value)
+
+import pytest
+from backend.agents import clients
+
+API_KEY = "test-key"
+
+
+@pytest.fixture
+def fake_model():
+    """Registers a stand-in model client for API_KEY so agents never configure Gemini"""
+    model = object()
+    clients._models[(API_KEY, clients.MODEL_NAME)] = model
+    yield model
+    clients._models.pop((API_KEY, clients.MODEL_NAME), None)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH, ignore_errors=True)
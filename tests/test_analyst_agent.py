@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from backend.agents.analyst_agent import SectionStreamParser
+
+HEADING = '## The \\"Light\\" Reactions {part 1}'
+FENCE = '```json\\n{\\"sections\\": [{\\"title\\": \\"x\\"}]}\\n```'
+BOOK = json.dumps({
+    "title": "Photosynthesis [sections] {draft}",
+    "author": "A \\ B",
+    "sections": [
+        {"title": "Chloroplasts", "content": "Membranes and stroma.\n\n## Thylakoids\nStacked discs.", "tags": ["a", "b"]},
+        {"title": "Light", "content": "Intro"},
+        {"title": "Calvin Cycle", "content": "Fixes CO2 with {braces} and [brackets]."},
+    ],
+}, indent=2)
+# Put a heading and a fence (with JSON-looking text inside it) in the middle section's content
+BOOK = BOOK.replace('"content": "Intro"', f'"content": "Intro\\n\\n{HEADING}\\n\\n{FENCE}\\nDone."')
+EXPECTED = json.loads(BOOK)["sections"]
+
+
+def feed(chunks):
+    parser = SectionStreamParser()
+    sections = []
+    for chunk in chunks:
+        sections.extend(parser.feed(chunk))
+    return sections
+
+
+def split_at(text, *positions):
+    bounds = [0, *positions, len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def middle_of(fragment):
+    return BOOK.index(fragment) + len(fragment) // 2
+
+
+@pytest.mark.parametrize("chunks", [
+    [BOOK],
+    list(BOOK),
+    [BOOK[i:i + 7] for i in range(0, len(BOOK), 7)],
+    [BOOK[i:i + 64] for i in range(0, len(BOOK), 64)],
+    split_at(BOOK, middle_of(HEADING)),
+    split_at(BOOK, BOOK.index(HEADING) + 1, BOOK.index(HEADING) + 2),  # between "#" and "#"
+    split_at(BOOK, middle_of(FENCE)),
+    split_at(BOOK, BOOK.index(FENCE) + 1, BOOK.index(FENCE) + 2),  # inside the backticks
+    split_at(BOOK, BOOK.index('\\"sections') + 1),  # between the backslash and the escaped quote
+], ids=["whole", "per-character", "7-chars", "64-chars", "mid-heading", "heading-hashes",
+        "mid-fence", "fence-backticks", "mid-escape"])
+def test_every_chunk_split_yields_the_same_sections(chunks):
+    assert "".join(chunks) == BOOK
+    assert feed(chunks) == EXPECTED
+
+
+def test_each_section_is_emitted_once_its_object_closes():
+    parser = SectionStreamParser()
+    end_of_first = BOOK.index("}", BOOK.index("Stacked discs.")) + 1
+    assert parser.feed(BOOK[:end_of_first - 1]) == []
+    assert parser.feed(BOOK[end_of_first - 1:end_of_first]) == EXPECTED[:1]
+    assert parser.feed(BOOK[end_of_first:]) == EXPECTED[1:]
+
+
+def test_nothing_after_the_sections_array_is_parsed():
+    trailing = BOOK[:-1] + ', "appendix": [{"title": "Not a section"}]}'
+    assert feed([trailing]) == EXPECTED
@@ -0,0 +1,44 @@
+import time
+
+import pytest
+from backend.agents.artifact_store import PDF, ArtifactStore
+from benchmarks.fakes import minimal_pdf
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "artifacts.sqlite3"))
+
+
+def test_reindexing_a_rewritten_file_keeps_its_id_and_creation_time(store, tmp_path):
+    path = tmp_path / "Photosynthesis_0000abcd.pdf"
+    path.write_bytes(minimal_pdf(3))
+    first = store.add(str(path), "Photosynthesis", PDF, job_id="job-1")
+    newer = tmp_path / "Photosynthesis_0000ef01.pdf"
+    time.sleep(0.01)
+    newer.write_bytes(minimal_pdf(1))
+    second_book = store.add(str(newer), "Photosynthesis", PDF)
+
+    time.sleep(0.01)
+    path.write_bytes(minimal_pdf(5))
+    updated = store.add(str(path), "Photosynthesis", PDF, job_id="job-1")
+
+    assert updated["id"] == first["id"]
+    assert updated["created_at"] == first["created_at"]
+    assert updated["last_accessed"] > first["last_accessed"]
+    assert updated["sha256"] != first["sha256"]
+    assert updated["pages"] == 5 and updated["job_id"] == "job-1"
+    # Regenerating a book does not move it ahead of books created after it
+    assert [book["id"] for book in store.find("Photosynthesis")] == [second_book["id"], first["id"]]
+
+
+def test_source_is_kept_with_the_artifact_and_removed_with_it(store, tmp_path):
+    path = tmp_path / "Photosynthesis_0000abcd.pdf"
+    path.write_bytes(minimal_pdf(1))
+    book = store.add(str(path), "Photosynthesis", PDF)
+    store.save_source(book["id"], {"topic": "Photosynthesis", "sections": []})
+    assert store.load_source(book["id"])["topic"] == "Photosynthesis"
+
+    store.remove(book["id"])
+    assert store.load_source(book["id"]) is None
+    assert not path.exists()
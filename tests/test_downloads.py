@@ -0,0 +1,112 @@
+import hashlib
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from backend.downloads import (
+    REVALIDATE, SANDBOXED_HTML_HEADERS, RangeNotSatisfiable, SandboxedStaticFiles, parse_range, serve_file,
+)
+
+CONTENT = bytes(range(256)) * 4  # 1024 bytes
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+ETAG = f'"{SHA256}"'
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "book.pdf"
+    path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.api_route("/book", methods=["GET", "HEAD"])
+    async def book(request: Request):
+        return serve_file(request, str(path), SHA256, "application/pdf", filename="book.pdf", cache_control=REVALIDATE)
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=0-1,5-9", None),  # multiple ranges: send the whole file
+    ("bytes=abc-", None),
+    ("bytes=50-10", None),
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1024) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=-0"])
+def test_parse_range_past_the_end_is_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1024)
+
+
+def test_full_download_carries_validators(client):
+    response = client.get("/book")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == ETAG
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-disposition"] == 'attachment; filename="book.pdf"'
+
+
+def test_range_request_gets_partial_content(client):
+    response = client.get("/book", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == "bytes 10-19/1024"
+    assert response.headers["content-length"] == "10"
+
+
+def test_range_past_the_end_is_416(client):
+    response = client.get("/book", headers={"Range": "bytes=2000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+@pytest.mark.parametrize("if_none_match", [ETAG, f"W/{ETAG}", f'"other", {ETAG}', "*"])
+def test_matching_etag_is_304(client, if_none_match):
+    response = client.get("/book", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_if_range_only_honours_the_range_for_the_current_version(client):
+    current = client.get("/book", headers={"Range": "bytes=0-9", "If-Range": ETAG})
+    assert current.status_code == 206
+    assert current.content == CONTENT[:10]
+
+    stale = client.get("/book", headers={"Range": "bytes=0-9", "If-Range": '"an-older-version"'})
+    assert stale.status_code == 200
+    assert stale.content == CONTENT
+
+
+def test_head_sends_headers_only(client):
+    response = client.head("/book", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "10"
+    assert response.content == b""
+
+
+def test_static_html_is_sandboxed_and_other_files_are_not(tmp_path):
+    (tmp_path / "preview.html").write_text("<script>alert(1)</script>")
+    (tmp_path / "book.pdf").write_bytes(b"%PDF-1.4")
+    app = FastAPI()
+    app.mount("/static", SandboxedStaticFiles(directory=str(tmp_path)), name="static")
+    client = TestClient(app)
+
+    html = client.get("/static/preview.html")
+    assert html.status_code == 200
+    for name, value in SANDBOXED_HTML_HEADERS.items():
+        assert html.headers[name] == value
+
+    pdf = client.get("/static/book.pdf")
+    assert pdf.status_code == 200
+    assert "content-security-policy" not in pdf.headers
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from backend.agents import image_agent
+from backend.agents.image_agent import ImageAgent
+from backend.agents.model_scheduler import ANALYST_PRIORITY, ModelScheduler
+from backend.agents.svg_cache import SVGCache
+
+from conftest import API_KEY
+
+SVG = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 600 400"><rect width="10" height="10"/></svg>'
+
+
+class SVGModel:
+    async def generate_content_async(self, prompt, **kwargs):
+        return SimpleNamespace(text=SVG, usage_metadata=None)
+
+
+@pytest.fixture
+def agent(fake_model, tmp_path):
+    scheduler = ModelScheduler(max_concurrency=1, max_retries=0)
+    agent = ImageAgent(API_KEY, svg_cache=SVGCache(str(tmp_path / "svg")), scheduler=scheduler)
+    agent.model = SVGModel()
+    return agent
+
+
+def test_diagram_starved_by_chapter_text_is_dropped_at_the_deadline(agent, monkeypatch):
+    monkeypatch.setattr(image_agent, "IMAGE_TIMEOUT", 0.2)
+
+    async def scenario():
+        # Chapter text holds the only model slot for longer than the diagram deadline
+        chapter = asyncio.ensure_future(agent.scheduler.run(lambda: asyncio.sleep(5), ANALYST_PRIORITY))
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        figure = await agent._generate_figure("a flow chart", asyncio.Semaphore(1))
+        elapsed = time.monotonic() - start
+        waiting = agent.scheduler.waiting()
+        chapter.cancel()
+        return figure, elapsed, waiting
+
+    figure, elapsed, waiting = asyncio.run(scenario())
+    assert figure == ""
+    assert elapsed < 1
+    assert waiting == 0  # the abandoned call left the scheduler queue
+
+
+def test_diagram_waiting_for_a_batch_slot_is_dropped_at_the_deadline(agent, monkeypatch):
+    monkeypatch.setattr(image_agent, "IMAGE_TIMEOUT", 0.2)
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(1)
+        await semaphore.acquire()  # another diagram of the book holds the only slot
+        start = time.monotonic()
+        figure = await agent._generate_figure("a flow chart", semaphore)
+        return figure, time.monotonic() - start
+
+    figure, elapsed = asyncio.run(scenario())
+    assert figure == ""
+    assert elapsed < 1
+
+
+def test_diagram_is_drawn_when_the_scheduler_has_room(agent):
+    figure = asyncio.run(agent._generate_figure("a flow chart", asyncio.Semaphore(1)))
+    assert "<svg" in figure
+
+
+def test_optimizer_failure_drops_the_diagram(agent, monkeypatch):
+    def broken_optimizer(svg_code):
+        raise ValueError("could not convert string to float: '1e'")
+
+    monkeypatch.setattr(image_agent, "optimize_svg", broken_optimizer)
+    figure = asyncio.run(agent._generate_figure("a flow chart", asyncio.Semaphore(1)))
+    assert figure == ""
+    assert agent.svg_cache.stats()["entries"] == 0
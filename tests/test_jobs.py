@@ -0,0 +1,126 @@
+import asyncio
+import os
+import time
+
+from backend.agents.singleflight import GenerationCoalescer
+from backend import jobs
+from backend.jobs import BOOK, CHAPTER, SUCCEEDED, JobQueue, JobStore
+
+
+def test_chapter_jobs_reach_the_runner_with_their_parameters(tmp_path):
+    seen = []
+
+    async def runner(job, reporter):
+        seen.append((job["kind"], job["topic"], job["params"]))
+        reporter.emit("research", "resumed")
+        return {"status": "success"}
+
+    async def scenario():
+        queue = JobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), runner, workers=1)
+        await queue.start()
+        book = await queue.submit("Photosynthesis")
+        chapter = await queue.submit("Photosynthesis", 0, CHAPTER, {"book_id": "b1", "index": 2})
+        await queue._queue.join()
+        await queue.stop()
+        return queue.store.get(book["job_id"]), queue.store.get(chapter["job_id"])
+
+    book, chapter = asyncio.run(scenario())
+    assert seen == [(BOOK, "Photosynthesis", None), (CHAPTER, "Photosynthesis", {"book_id": "b1", "index": 2})]
+    assert book["status"] == chapter["status"] == SUCCEEDED
+
+
+def test_a_job_joining_a_reporterless_run_gives_back_its_research_slot(tmp_path):
+    coalescer = GenerationCoalescer()
+    started = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def generate():
+            await release.wait()
+            return {"status": "success"}
+
+        async def runner(job, reporter):
+            started.append(job["topic"])
+            if job["topic"] == "Other":
+                release.set()
+                return {"status": "success"}
+            return await coalescer.run(job["topic"], generate, reporter=reporter)
+
+        # An /api/generate call leads the run without a reporter, so no search events reach the job
+        leader = asyncio.ensure_future(coalescer.run("Photosynthesis", generate))
+        await asyncio.sleep(0)
+        queue = JobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), runner, workers=2, research_slots=1)
+        await queue.start()
+        await queue.submit("Photosynthesis")
+        await queue.submit("Other")
+        await asyncio.wait_for(queue._queue.join(), 1)
+        await queue.stop()
+        await leader
+
+    asyncio.run(scenario())
+    assert started == ["Photosynthesis", "Other"]
+
+
+def test_runs_with_different_context_are_not_coalesced():
+    coalescer = GenerationCoalescer()
+    calls = []
+
+    async def generate():
+        calls.append(None)
+        await asyncio.sleep(0)
+        return {"status": "success"}
+
+    async def scenario():
+        await asyncio.gather(
+            coalescer.run("Photosynthesis", generate, context="Biology 101"),
+            coalescer.run("photosynthesis ", generate, context="Biology  101"),
+            coalescer.run("Photosynthesis", generate, context="Botany"),
+        )
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_recent_results_are_pruned_when_new_ones_finish():
+    coalescer = GenerationCoalescer(reuse_window=60, max_recent=2)
+
+    async def generate():
+        return {"status": "success", "pdf_path": "book.pdf"}
+
+    async def scenario():
+        for topic in ("Photosynthesis", "Respiration", "Osmosis"):
+            await coalescer.run(topic, generate)
+
+    asyncio.run(scenario())
+    assert [topic for topic, _ in coalescer._recent] == ["respiration", "osmosis"]
+
+    # Entries past the reuse window go on the next insert, without waiting for a lookup
+    coalescer.reuse_window = 0.01
+    time.sleep(0.02)
+    asyncio.run(coalescer.run("Diffusion", generate))
+    assert [topic for topic, _ in coalescer._recent] == ["diffusion"]
+
+
+def test_queue_opens_its_store_on_start_and_persists_previews(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(jobs, "JOB_DB_PATH", path)
+
+    async def runner(job, reporter):
+        reporter.emit("research", "resumed")
+        reporter.emit("preview", "finished", preview_path="static/previews/p.html")
+        return {"status": "success"}
+
+    async def scenario():
+        queue = JobQueue(None, runner, workers=1)
+        await queue.start()
+        job = await queue.submit("Photosynthesis")
+        await queue._queue.join()
+        await queue.stop()
+        return queue.store.get(job["job_id"])
+
+    assert not os.path.exists(path)
+    job = asyncio.run(scenario())
+    assert os.path.exists(path)
+    assert job["status"] == SUCCEEDED
+    assert job["preview_path"] == "static/previews/p.html"
@@ -0,0 +1,47 @@
+import os
+
+from backend.log_tail import tail_log
+
+
+def write_lines(path, start, count, mode="a"):
+    with open(path, mode) as f:
+        for i in range(start, start + count):
+            f.write(f"line {i}\n")
+
+
+def read_all(path, cursor, lines=10):
+    """Follows ``more`` until the reader has caught up, like a client polling in a loop"""
+    received = []
+    while True:
+        page = tail_log(path, cursor=cursor, lines=lines)
+        received += page["logs"]
+        cursor = page["cursor"]
+        if not page["more"]:
+            return received, cursor
+
+
+def test_no_lines_are_lost_across_rotation(tmp_path):
+    path = str(tmp_path / "app.log")
+    write_lines(path, 0, 5, mode="w")
+    page = tail_log(path, lines=3)
+    assert page["logs"] == ["line 2", "line 3", "line 4"]
+
+    # Rotate: the old file moves aside and a new one collects more than one page
+    os.rename(path, path + ".1")
+    write_lines(path, 5, 25, mode="w")
+    received, cursor = read_all(path, page["cursor"])
+
+    assert received == [f"line {i}" for i in range(5, 30)]
+    assert tail_log(path, cursor=cursor)["logs"] == []
+
+
+def test_truncated_log_restarts_from_the_beginning(tmp_path):
+    path = str(tmp_path / "app.log")
+    write_lines(path, 0, 50, mode="w")
+    cursor = tail_log(path)["cursor"]
+
+    write_lines(path, 100, 3, mode="w")
+    page = tail_log(path, cursor=cursor)
+
+    assert page["rotated"]
+    assert page["logs"] == ["line 100", "line 101", "line 102"]
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from backend.agents import model_scheduler
+from backend.agents.model_scheduler import ANALYST_PRIORITY, IMAGE_PRIORITY, ModelScheduler, TokenBucket, is_retryable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class QuotaError(Exception):
+    code = 429
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_scheduler.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_refills_continuously_up_to_capacity(clock):
+    bucket = TokenBucket(per_minute=60)  # one unit per second
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+
+    clock.now += 600
+    assert bucket.wait_time(60) == 0
+    assert bucket.tokens == 60  # never above capacity
+
+
+def test_bucket_requests_above_capacity_wait_for_a_full_bucket(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(30)
+    assert bucket.wait_time(500) == pytest.approx(30.0)
+
+
+def test_bucket_adjust_charges_and_refunds(clock):
+    bucket = TokenBucket(per_minute=100)
+    bucket.take(50)
+    bucket.adjust(20)  # the call used more than estimated
+    assert bucket.tokens == 30
+    bucket.adjust(-500)  # refunds never exceed capacity
+    assert bucket.tokens == 100
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(per_minute=0)
+    bucket.take(10 ** 9)
+    assert bucket.wait_time(10 ** 9) == 0
+
+
+def test_waiting_calls_are_admitted_by_priority_then_arrival():
+    scheduler = ModelScheduler(requests_per_minute=0, tokens_per_minute=0, max_concurrency=1)
+    order = []
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(scheduler.run(release.wait))
+        await asyncio.sleep(0)
+
+        async def call(name, priority):
+            async def record():
+                order.append(name)
+
+            await scheduler.run(record, priority)
+
+        waiting = [
+            asyncio.ensure_future(call("image 1", IMAGE_PRIORITY)),
+            asyncio.ensure_future(call("chapter 1", ANALYST_PRIORITY)),
+            asyncio.ensure_future(call("image 2", IMAGE_PRIORITY)),
+            asyncio.ensure_future(call("chapter 2", ANALYST_PRIORITY)),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.waiting() == 4
+        release.set()
+        await asyncio.gather(holder, *waiting)
+
+    asyncio.run(scenario())
+    assert order == ["chapter 1", "chapter 2", "image 1", "image 2"]
+
+
+def test_retryable_errors_back_off_and_halve_the_limit(monkeypatch):
+    delays = []
+    monkeypatch.setattr(model_scheduler.random, "uniform", lambda low, high: delays.append(high) or 0)
+    scheduler = ModelScheduler(requests_per_minute=0, tokens_per_minute=0, max_concurrency=8,
+                               max_retries=3, backoff_base=0.5, backoff_max=30)
+    attempts = []
+
+    async def flaky():
+        attempts.append(None)
+        if len(attempts) < 3:
+            raise QuotaError("quota exceeded")
+        return "ok"
+
+    assert scheduler.limit == 4
+    assert asyncio.run(scheduler.run(flaky)) == "ok"
+    assert len(attempts) == 3
+    assert delays == [0.5, 1.0]  # full jitter over an exponentially growing cap
+    # Halved once per overload episode (the two failures were within one backoff window), then grown
+    assert scheduler.limit == pytest.approx(2 + 1 / 2)
+
+
+def test_other_errors_are_not_retried():
+    scheduler = ModelScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=3)
+    attempts = []
+
+    async def broken():
+        attempts.append(None)
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.run(broken))
+    assert len(attempts) == 1
+    assert not is_retryable(ValueError())
+    assert is_retryable(QuotaError())
+
+
+def test_successes_grow_the_limit_up_to_the_maximum():
+    scheduler = ModelScheduler(requests_per_minute=0, tokens_per_minute=0, max_concurrency=3)
+
+    async def scenario():
+        for _ in range(50):
+            await scheduler.run(lambda: asyncio.sleep(0))
+
+    asyncio.run(scenario())
+    assert scheduler.limit == 3
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.agents import render_pool
+from backend.agents.render_pool import RenderPool, RenderTimeout
+
+# html -> seconds the fake render takes
+DURATIONS = {}
+
+
+def fake_render(fragments, filepath):
+    time.sleep(DURATIONS[fragments[0][1]])
+    return filepath, 0
+
+
+class ThreadRenderPool(RenderPool):
+    """Runs renders on threads instead of WeasyPrint processes and records recycles"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.recycled = []
+
+    def _get_executor(self, worker):
+        with self._lock:
+            if self._executors[worker] is None:
+                self._executors[worker] = ThreadPoolExecutor(max_workers=1)
+            return self._executors[worker]
+
+    def _recycle(self, worker, executor):
+        self.recycled.append(worker)
+        super()._recycle(worker, executor)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(render_pool, "_render", fake_render)
+    DURATIONS.clear()
+    pool = ThreadRenderPool(workers=1, queue_size=4, timeout=0.3)
+    yield pool
+    pool.shutdown()
+
+
+def test_time_queued_for_a_worker_does_not_count_against_the_timeout(pool):
+    DURATIONS.update({"<p>first</p>": 0.2, "<p>second</p>": 0.2})
+
+    async def scenario():
+        return await asyncio.gather(pool.render("<p>first</p>", "first.pdf"), pool.render("<p>second</p>", "second.pdf"))
+
+    assert asyncio.run(scenario()) == ["first.pdf", "second.pdf"]
+    assert pool.recycled == []
+
+
+def test_a_render_running_past_the_timeout_recycles_its_worker(pool):
+    DURATIONS.update({"<p>stuck</p>": 0.5})
+
+    with pytest.raises(RenderTimeout):
+        asyncio.run(pool.render("<p>stuck</p>", "stuck.pdf"))
+    assert pool.recycled == [0]
+
+
+def test_renders_of_one_book_never_queue_on_its_busy_worker(monkeypatch):
+    running = {}
+    overlaps = []
+
+    def tracking_render(fragments, filepath):
+        worker = threading.current_thread().name
+        if running.get(worker):
+            overlaps.append(worker)
+        running[worker] = True
+        time.sleep(0.2)
+        running[worker] = False
+        return filepath, 0
+
+    monkeypatch.setattr(render_pool, "_render", tracking_render)
+    pool = ThreadRenderPool(workers=2, queue_size=4, timeout=0.3)
+
+    async def scenario():
+        # Same title page, so every render prefers the same worker; a slow one holds it
+        renders = [pool.render("<p>same book</p>", f"book-{i}.pdf") for i in range(4)]
+        return await asyncio.gather(*renders)
+
+    try:
+        assert asyncio.run(scenario()) == [f"book-{i}.pdf" for i in range(4)]
+    finally:
+        pool.shutdown()
+    assert pool.recycled == []
+    assert overlaps == []
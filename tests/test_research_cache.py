@@ -0,0 +1,123 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.agents import research_cache
+from backend.agents.research_cache import PAGE_CACHE_TTL, SEARCH_CACHE_TTL, ResearchCache, normalize_query
+from backend.agents.search_agent import SearchAgent
+
+URL = "https://a.example/plants"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(research_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResearchCache(str(tmp_path / "research.sqlite3"))
+
+
+class ConditionalClient:
+    """Answers with ``status`` and records the headers of each request"""
+
+    def __init__(self, status, content=b"", headers=None):
+        self.status = status
+        self.content = content
+        self.headers = headers or {}
+        self.sent = []
+
+    async def get(self, url, headers=None):
+        self.sent.append(headers or {})
+        return httpx.Response(self.status, content=self.content, headers=self.headers)
+
+
+def fetch(agent, client):
+    async def scenario():
+        agent._fetch_slots = asyncio.Semaphore(1)
+        return await agent._fetch_text(client, URL)
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("query", ["Photosynthesis in plants", "  photosynthesis   IN\tPlants ", "PHOTOSYNTHESIS\nin plants"])
+def test_queries_differing_in_case_and_whitespace_share_a_key(query):
+    assert normalize_query(query) == "photosynthesis in plants"
+
+
+def test_search_results_are_keyed_by_normalized_query_and_result_count(cache, clock):
+    cache.put_search("Photosynthesis  in Plants", 5, ["https://a.example/"])
+    assert cache.get_search("photosynthesis in plants ", 5) == (["https://a.example/"], True)
+    assert cache.get_search("photosynthesis in plants", 10) == (None, False)
+    assert cache.get_search("photosynthesis", 5) == (None, False)
+    assert (cache.search_hits, cache.search_misses) == (1, 2)
+
+
+def test_expired_search_results_are_still_returned_as_stale(cache, clock):
+    cache.put_search("photosynthesis", 5, ["https://a.example/"])
+    clock.now += SEARCH_CACHE_TTL - 1
+    assert cache.get_search("photosynthesis", 5) == (["https://a.example/"], True)
+    clock.now += 2
+    assert cache.get_search("photosynthesis", 5) == (["https://a.example/"], False)
+    assert (cache.search_hits, cache.search_misses) == (1, 1)
+
+
+def test_pages_go_stale_after_the_ttl_and_keep_their_validators(cache, clock):
+    cache.put_page(URL, "Plants turn light into sugar.", etag='"v1"', last_modified="Mon, 05 Oct 2026 10:00:00 GMT")
+    assert cache.get_page(URL).fresh
+
+    clock.now += PAGE_CACHE_TTL + 1
+    page = cache.get_page(URL)
+    assert not page.fresh
+    assert page.text == "Plants turn light into sugar."
+    assert page.validators() == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 05 Oct 2026 10:00:00 GMT"}
+    assert (cache.page_hits, cache.page_stale) == (1, 1)
+    assert cache.get_page("https://a.example/other") is None
+
+
+def test_page_without_validators_sends_an_unconditional_request(cache, clock):
+    cache.put_page(URL, "text")
+    assert cache.get_page(URL).validators() == {}
+
+
+def test_304_reuses_the_cached_text_and_refreshes_it(tmp_path, clock):
+    cache = ResearchCache(str(tmp_path / "research.sqlite3"))
+    cache.put_page(URL, "Plants turn light into sugar.", etag='"v1"')
+    clock.now += PAGE_CACHE_TTL + 1
+    agent = SearchAgent(cache)
+    client = ConditionalClient(304)
+
+    assert fetch(agent, client) == "Plants turn light into sugar."
+    assert client.sent == [{"If-None-Match": '"v1"'}]
+    assert cache.page_revalidations == 1
+    assert cache.get_page(URL).fresh
+
+    # Fresh again, so the next fetch does not go to the network at all
+    assert fetch(agent, client) == "Plants turn light into sugar."
+    assert len(client.sent) == 1
+
+
+def test_changed_page_replaces_the_cached_text_and_validators(tmp_path, clock):
+    cache = ResearchCache(str(tmp_path / "research.sqlite3"))
+    cache.put_page(URL, "Old text.", etag='"v1"')
+    clock.now += PAGE_CACHE_TTL + 1
+    agent = SearchAgent(cache)
+    client = ConditionalClient(200, b"<p>New text.</p>", headers={"ETag": '"v2"'})
+
+    assert fetch(agent, client) == "New text."
+    page = cache.get_page(URL)
+    assert page.fresh
+    assert (page.text, page.etag) == ("New text.", '"v2"')
+    assert cache.page_revalidations == 0
@@ -0,0 +1,30 @@
+from backend.agents.research_packer import estimate_tokens, pack_chapter_research, pack_research, split_sources
+
+CHLOROPHYLL = "Chlorophyll molecules in the thylakoid membrane absorb red and blue light to excite electrons. " * 3
+CALVIN = "The Calvin cycle fixes carbon dioxide into sugar using ATP and NADPH in the stroma of the chloroplast. " * 3
+
+
+def packed_book_research() -> str:
+    sources = [
+        ("https://a.example/light", "\n".join(f"{CHLOROPHYLL} Paragraph {i}." for i in range(20))),
+        ("https://b.example/calvin", "\n".join(f"{CALVIN} Paragraph {i}." for i in range(20))),
+    ]
+    packed, _ = pack_research("photosynthesis", sources, token_budget=100_000)
+    return packed
+
+
+def test_split_sources_recovers_the_packed_pages():
+    sources = split_sources(packed_book_research())
+    assert [url for url, _ in sources] == ["https://a.example/light", "https://b.example/calvin"]
+    assert "Chlorophyll" in sources[0][1] and "Calvin" in sources[1][1]
+
+
+def test_split_sources_keeps_text_without_headers():
+    assert split_sources("Fallback notes about the topic.") == [("", "Fallback notes about the topic.")]
+
+
+def test_chapter_research_fits_its_budget_and_favours_the_chapter():
+    research = pack_chapter_research(packed_book_research(), "photosynthesis Calvin cycle carbon fixation", token_budget=300)
+    assert estimate_tokens(research) <= 320  # the budget plus source headers
+    assert "Calvin" in research
+    assert "Chlorophyll" not in research
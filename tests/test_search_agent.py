@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import httpx
+
+from backend.agents import search_agent
+from backend.agents.research_cache import ResearchCache
+from backend.agents.search_agent import SearchAgent
+
+
+class RecordingClient:
+    """Answers every GET at once and records when each request was sent"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.sent = {}
+
+    async def get(self, url, headers=None):
+        self.sent[url] = time.monotonic() - self.started
+        return httpx.Response(200, content=b"<p>Plants turn light into sugar.</p>")
+
+
+def test_host_politeness_does_not_hold_a_global_fetch_slot(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_agent, "PER_HOST_DELAY", 0.5)
+    agent = SearchAgent(ResearchCache(str(tmp_path / "research.sqlite3")))
+    client = RecordingClient()
+
+    async def scenario():
+        agent._fetch_slots = asyncio.Semaphore(1)
+        urls = ["https://a.example/1", "https://a.example/2", "https://b.example/1"]
+        return await asyncio.gather(*(agent._fetch_text(client, url) for url in urls))
+
+    texts = asyncio.run(scenario())
+    assert texts == ["Plants turn light into sugar."] * 3
+    # b.example is fetched while a.example is still being spaced out, not after it
+    assert client.sent["https://b.example/1"] < 0.25
+    assert client.sent["https://a.example/2"] - client.sent["https://a.example/1"] >= 0.45
+
+
+def test_a_slow_search_is_bounded_by_the_research_deadline(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_agent, "RESEARCH_DEADLINE", 0.2)
+    agent = SearchAgent(ResearchCache(str(tmp_path / "research.sqlite3")))
+
+    async def stuck_search(query, num_results):
+        await asyncio.sleep(5)
+        return ["https://late.example/"]
+
+    monkeypatch.setattr(agent, "_search", stuck_search)
+
+    async def scenario():
+        start = time.monotonic()
+        research = await agent.search_and_scrape("photosynthesis", context="Biology 101")
+        elapsed = time.monotonic() - start
+        await agent.aclose()
+        return research, elapsed
+
+    research, elapsed = asyncio.run(scenario())
+    assert elapsed < 1
+    assert research == agent._generate_fallback_content("photosynthesis")
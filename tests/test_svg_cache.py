@@ -0,0 +1,56 @@
+import os
+
+from backend.agents.svg_cache import SVGCache
+
+
+def svg(label: str, size: int = 100) -> str:
+    body = f"<svg><text>{label}</text></svg>"
+    return body + " " * (size - len(body))
+
+
+def test_entries_are_files_named_by_the_key_digest(tmp_path):
+    cache = SVGCache(str(tmp_path), max_bytes=1000)
+    cache.put("2:a flow chart", svg("flow"))
+
+    digest = SVGCache.digest("2:a flow chart")
+    assert len(digest) == 64 and digest != SVGCache.digest("2:a flow chart ")
+    assert os.listdir(tmp_path) == [f"{digest}.svg"]
+    assert cache.get("2:a flow chart") == svg("flow")
+    assert cache.get("2:another chart") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_past_the_byte_budget(tmp_path):
+    cache = SVGCache(str(tmp_path), max_bytes=300)
+    for key in ("a", "b", "c"):
+        cache.put(key, svg(key))
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("d", svg("d"))
+
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in ("a", "c", "d")] == [True, True, True]
+    assert not os.path.exists(os.path.join(str(tmp_path), f"{SVGCache.digest('b')}.svg"))
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["bytes"] == 300 and stats["evictions"] == 1
+
+
+def test_entries_larger_than_the_cache_are_not_stored(tmp_path):
+    cache = SVGCache(str(tmp_path), max_bytes=50)
+    cache.put("big", svg("big", 100))
+    assert cache.get("big") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_recency_survives_a_restart(tmp_path):
+    cache = SVGCache(str(tmp_path), max_bytes=300)
+    for key in ("a", "b", "c"):
+        cache.put(key, svg(key))
+    # Recency is persisted through modification times
+    for offset, key in enumerate(("b", "c", "a")):
+        os.utime(os.path.join(str(tmp_path), f"{SVGCache.digest(key)}.svg"), (1000 + offset, 1000 + offset))
+
+    reopened = SVGCache(str(tmp_path), max_bytes=300)
+    assert reopened.stats()["entries"] == 3
+    reopened.put("d", svg("d"))
+    assert reopened.get("b") is None
+    assert reopened.get("a") is not None
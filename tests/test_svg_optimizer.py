@@ -0,0 +1,76 @@
+from backend.agents.svg_optimizer import optimize_svg
+
+SVG = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 600 400">{}</svg>'
+
+
+def test_stray_ampersands_are_escaped_and_the_svg_is_still_sanitized():
+    svg = SVG.format('<script>alert(1)</script><image href="http://evil/x.png"/><text>A & B &amp; C</text>')
+    optimized, stats = optimize_svg(svg)
+    assert stats["repaired"]
+    assert "<text>A &amp; B &amp; C</text>" in optimized
+    assert "script" not in optimized and "evil" not in optimized
+
+
+def test_unparseable_svg_is_rejected_not_passed_through():
+    optimized, stats = optimize_svg(SVG.format('<script>alert(1)</script><g><text>unclosed</text>'))
+    assert optimized == ""
+    assert stats["rejected"] == "unparseable"
+
+
+def test_svg_without_the_svg_namespace_is_rejected():
+    optimized, stats = optimize_svg('<svg><script>alert(1)</script><text>A & B</text></svg>')
+    assert optimized == ""
+    assert stats["rejected"] == "root element is not svg"
+
+
+def test_scripts_handlers_and_external_references_are_stripped():
+    svg = SVG.format(
+        '<metadata>editor</metadata><script>alert(1)</script>'
+        '<rect width="10" height="10" onclick="steal()" opacity="1"/>'
+        '<image href="https://evil.example/x.png"/><image href="data:image/png;base64,AAAA"/>'
+        '<use href="#shape"/><foreignObject><div>html</div></foreignObject>'
+    )
+    optimized, _ = optimize_svg(svg)
+    for removed in ("metadata", "script", "onclick", "opacity", "evil.example", "foreignObject"):
+        assert removed not in optimized
+    assert 'href="data:image/png;base64,AAAA"' in optimized
+    assert 'href="#shape"' in optimized
+
+
+def test_coordinates_are_rounded_without_merging_packed_numbers():
+    svg = SVG.format('<path d="M10.123456 20.98765L.5.25"/><circle cx="3.14159" cy="2" r="1e1"/>')
+    optimized, _ = optimize_svg(svg, precision=2)
+    assert 'd="M10.12 20.99L0.5 0.25"' in optimized
+    assert 'cx="3.14" cy="2" r="10"' in optimized
+
+
+def test_oversized_svg_is_simplified_to_whole_units_then_rejected():
+    path = '<path d="{}"/>'.format(" ".join(f"L{i}.123 {i}.456" for i in range(200)))
+    optimized, stats = optimize_svg(SVG.format(path), max_bytes=2500)
+    assert stats["simplified"] and optimized
+    assert "L10 10" in optimized
+
+    optimized, stats = optimize_svg(SVG.format(path), max_bytes=1000)
+    assert optimized == ""
+    assert "exceeds the budget" in stats["rejected"]
+
+
+def test_duplicate_definitions_are_merged_and_references_renamed():
+    gradient = '<linearGradient id="{}"><stop offset="0" stop-color="#00f"/></linearGradient>'
+    svg = SVG.format(
+        f'<defs>{gradient.format("blue")}</defs>'
+        f'<defs>{gradient.format("blue2")}</defs>'
+        '<rect fill="url(#blue2)" width="1" height="1"/><use href="#blue2"/>'
+    )
+    optimized, _ = optimize_svg(svg)
+    assert optimized.count("<defs>") == 1
+    assert optimized.count("<linearGradient") == 1
+    assert 'fill="url(#blue)"' in optimized
+    assert 'href="#blue"' in optimized
+    assert "blue2" not in optimized
+
+
+def test_too_many_nodes_are_rejected():
+    optimized, stats = optimize_svg(SVG.format("<g/>" * 20), max_nodes=10)
+    assert optimized == ""
+    assert stats["rejected"] == "21 nodes exceeds the budget of 10"
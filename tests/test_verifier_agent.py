@@ -0,0 +1,130 @@
+import re
+import zlib
+
+from backend.agents.verifier_agent import inspect_pdf
+from benchmarks.fakes import minimal_pdf
+
+
+def check(tmp_path, data, min_pages=1):
+    path = tmp_path / "book.pdf"
+    path.write_bytes(data)
+    return inspect_pdf(str(path), min_pages)
+
+
+def startxref(data):
+    return int(re.findall(rb"startxref\s+(\d+)", data)[-1])
+
+
+def append_update(data, objects, prev=None):
+    """An incremental update: new or replaced objects, an xref section for just them, and a /Prev trailer"""
+    out = bytearray(data)
+    offsets = {}
+    for number, body in objects.items():
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n"
+    for number, offset in sorted(offsets.items()):
+        out += b"%d 1\n%010d 00000 n \n" % (number, offset)
+    out += b"trailer\n<< /Size 6 /Root 1 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n" % (
+        startxref(data) if prev is None else prev, xref)
+    return bytes(out)
+
+
+def with_xref_stream(data):
+    """The same document with its xref table replaced by a compressed xref stream"""
+    table = startxref(data)
+    offsets = [int(offset) for offset in re.findall(rb"(\d{10}) 00000 n", data[table:])]
+    number = len(offsets) + 1
+    rows = b"\x00\x00\x00\xff" + b"".join(b"\x01" + offset.to_bytes(2, "big") + b"\x00" for offset in offsets)
+    rows += b"\x01" + table.to_bytes(2, "big") + b"\x00"
+    stream = zlib.compress(rows)
+    out = bytearray(data[:table])
+    out += b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 2 1] /Root 1 0 R /Filter /FlateDecode /Length %d >>\nstream\n" % (
+        number, number + 1, len(stream))
+    out += stream + b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % table
+    return bytes(out)
+
+
+def test_valid_pdf_passes(tmp_path):
+    report = check(tmp_path, minimal_pdf(pages=3))
+    assert report["ok"], report["errors"]
+    assert report["version"] == "1.7"
+    assert report["xref"] == "table"
+    assert report["objects"] == 5
+    assert report["pages"] == 3
+
+
+def test_truncated_file_fails(tmp_path):
+    data = minimal_pdf()
+    report = check(tmp_path, data[:len(data) - 40])
+    assert not report["ok"]
+    assert "No %%EOF marker at the end; the file is probably truncated" in report["errors"]
+    assert "No startxref at the end of the file" in report["errors"]
+
+
+def test_empty_and_missing_files_fail(tmp_path):
+    assert check(tmp_path, b"")["errors"] == ["File is empty"]
+    assert inspect_pdf(str(tmp_path / "missing.pdf"))["errors"] == ["File does not exist"]
+
+
+def test_corrupted_startxref_fails(tmp_path):
+    data = minimal_pdf()
+    past_the_end = data.replace(b"startxref\n%d" % startxref(data), b"startxref\n999999")
+    report = check(tmp_path, past_the_end)
+    assert not report["ok"]
+    assert "past the end of the file" in report["errors"][0]
+
+    into_an_object = data.replace(b"startxref\n%d" % startxref(data), b"startxref\n20")
+    report = check(tmp_path, into_an_object)
+    assert report["errors"] == ["No object starts at byte 20"]
+
+
+def test_bad_object_offset_fails(tmp_path):
+    data = minimal_pdf()
+    offset = data.index(b"2 0 obj")
+    report = check(tmp_path, data.replace(b"%010d 00000 n" % offset, b"%010d 00000 n" % (offset + 3)))
+    assert not report["ok"]
+    assert report["errors"] == [f"Object 2 is not at byte {offset + 3} as the xref says"]
+
+
+def test_xref_stream_is_followed(tmp_path):
+    report = check(tmp_path, with_xref_stream(minimal_pdf(pages=2)))
+    assert report["ok"], report["errors"]
+    assert report["xref"] == "stream"
+    assert report["pages"] == 2
+
+
+def test_too_few_pages_fails(tmp_path):
+    report = check(tmp_path, minimal_pdf(pages=2), min_pages=3)
+    assert not report["ok"]
+    assert report["pages"] == 2
+    assert report["errors"] == ["Document has 2 pages, expected at least 3"]
+
+
+def test_incremental_update_is_read_through_prev(tmp_path):
+    # The update replaces the page tree and adds a page; the catalog is only in the original xref
+    update = append_update(minimal_pdf(), {
+        2: b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>",
+        4: b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>",
+    })
+    report = check(tmp_path, update)
+    assert report["ok"], report["errors"]
+    assert report["objects"] == 4
+    assert report["pages"] == 2
+
+
+def test_objects_only_the_older_xref_knows_are_checked(tmp_path):
+    data = minimal_pdf()
+    offset = data.index(b"3 0 obj")
+    broken = data.replace(b"%010d 00000 n" % offset, b"%010d 00000 n" % (offset + 3))
+    report = check(tmp_path, append_update(broken, {2: b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>"}))
+    assert report["errors"] == [f"Object 3 is not at byte {offset + 3} as the xref says"]
+
+
+def test_prev_cycle_is_reported(tmp_path):
+    data = minimal_pdf()
+    # The update's /Prev points back at its own xref section
+    size = len(data) + len(b"2 0 obj\n<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n")
+    report = check(tmp_path, append_update(data, {2: b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>"}, prev=size))
+    assert report["errors"] == [f"Xref /Prev chain loops back to byte {size}"]
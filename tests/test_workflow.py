@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+import pytest
+from backend.agents.artifact_store import PDF, ArtifactStore
+from backend.agents.checkpoints import CheckpointStore
+from backend.agents.workflow import EbookWorkflow
+from benchmarks.fakes import minimal_pdf
+
+from conftest import API_KEY
+
+
+@pytest.fixture
+def workflow(fake_model, tmp_path):
+    workflow = EbookWorkflow(API_KEY)
+    workflow.checkpoints = CheckpointStore(str(tmp_path / "checkpoints"))
+    workflow.artifacts = ArtifactStore(str(tmp_path / "artifacts.sqlite3"))
+    yield workflow
+    asyncio.run(workflow.aclose())
+
+
+def test_failed_run_without_job_id_leaves_no_checkpoints(workflow, monkeypatch):
+    async def search_and_scrape(topic, reporter=None, context=None):
+        return "research about the topic"
+
+    async def analyze_and_structure(topic, raw_data, reporter=None, on_section=None):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(workflow.search_agent, "search_and_scrape", search_and_scrape)
+    monkeypatch.setattr(workflow.analyst_agent, "analyze_and_structure", analyze_and_structure)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(workflow.run("Photosynthesis"))
+
+    assert os.listdir(workflow.checkpoints.directory) == []
+
+
+def test_failed_run_with_job_id_keeps_checkpoints_for_resume(workflow, monkeypatch):
+    async def search_and_scrape(topic, reporter=None, context=None):
+        return "research about the topic"
+
+    async def analyze_and_structure(topic, raw_data, reporter=None, on_section=None):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(workflow.search_agent, "search_and_scrape", search_and_scrape)
+    monkeypatch.setattr(workflow.analyst_agent, "analyze_and_structure", analyze_and_structure)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(workflow.run("Photosynthesis", job_id="job-1"))
+
+    assert workflow.checkpoints.load("job-1", "research") == "research about the topic"
+
+
+def test_regenerated_chapter_is_written_from_the_stored_research(workflow, monkeypatch, tmp_path):
+    path = tmp_path / "Photosynthesis_0000abcd.pdf"
+    path.write_bytes(minimal_pdf(3))
+    book = workflow.artifacts.add(str(path), "Photosynthesis", PDF)
+    sections = [{"title": f"Chapter {i}", "summary": "", "content": f"Text {i}"} for i in range(3)]
+    asyncio.run(workflow._save_source(book["id"], "Photosynthesis", None, "stored research",
+                                      {"title": "T", "author": "A", "sections": sections}))
+    seen = {}
+
+    async def search_and_scrape(topic, reporter=None, context=None):
+        raise AssertionError("regeneration must not search again")
+
+    async def rewrite_chapter(topic, raw_data, sections, index, reporter=None):
+        seen["research"] = raw_data
+        return {"title": sections[index]["title"], "summary": "", "content": "New text"}
+
+    async def generate_images(book_data, reporter=None):
+        return book_data
+
+    async def create_pdf(html_content, topic, filepath=None):
+        with open(filepath, "wb") as f:
+            f.write(minimal_pdf(4))
+        return filepath
+
+    monkeypatch.setattr(workflow.search_agent, "search_and_scrape", search_and_scrape)
+    monkeypatch.setattr(workflow.analyst_agent, "rewrite_chapter", rewrite_chapter)
+    monkeypatch.setattr(workflow.image_agent, "generate_images", generate_images)
+    monkeypatch.setattr(workflow.pdf_agent, "create_pdf", create_pdf)
+
+    result = asyncio.run(workflow.regenerate_chapter(book["id"], 1))
+
+    assert seen["research"] == "stored research"
+    assert result["book_id"] == book["id"] and result["pages"] == 4
+    source = workflow.artifacts.load_source(book["id"])
+    assert source["research"] == "stored research"
+    assert source["sections"][1]["content"] == "New text"